@@ -0,0 +1,116 @@
+import csv
+import gzip
+import heapq
+import io
+import os
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from config import get_config
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+
+INVENTORY_COLUMNS = ['product_id', 'product_name', 'current_stock', 'ideal_stock_level', 'status',
+                     'priority', 'action', 'expiry_date', 'days_left', 'trend']
+EXPIRY_COLUMNS = ['product_id', 'product_name', 'current_stock', 'expiry_date', 'days_left']
+
+# Templates are parsed and compiled once per process and cached by the environment
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(['html']),
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+
+
+def render(template_name, **context):
+    return _env.get_template(template_name).render(**context)
+
+
+def top_n(items, key, limit=None):
+    """Return the `limit` most urgent items (smallest key first) and how many were left out"""
+    # alerts.inline_limit: products listed inline per section; the rest go to the CSV attachment
+    limit = get_config()['alerts']['inline_limit'] if limit is None else limit
+    if len(items) <= limit:
+        return sorted(items, key=key), 0
+    return heapq.nsmallest(limit, items, key=key), len(items) - limit
+
+
+def stock_ratio(item):
+    ideal = item.get('ideal_stock_level') or 0
+    return float(item.get('current_stock') or 0) / ideal if ideal else 0.0
+
+
+def stock_urgency(item):
+    """Largest deviation from the ideal stock level first"""
+    return -abs(stock_ratio(item) - 1.0)
+
+
+def expiry_urgency(item):
+    """Soonest (or longest expired) ISO expiry date first; undated items last"""
+    return item.get('expiry_date') or '9999-12-31'
+
+
+def csv_gz_attachment(items, columns, filename):
+    """Gzip-compressed CSV of `items` as a MIME attachment"""
+    from email.mime.application import MIMEApplication
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename=filename[:-3], mode='wb', fileobj=buffer, mtime=0) as gz:
+        text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+        writer = csv.DictWriter(text, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(items)
+        text.flush()
+        text.detach()
+    part = MIMEApplication(buffer.getvalue(), _subtype='gzip')
+    part.add_header('Content-Disposition', 'attachment', filename=filename)
+    return part
+
+
+def build_message(subject, sender, recipients, html, attachments=()):
+    """HTML message, switching to multipart/mixed when there are attachments"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart('mixed' if attachments else 'alternative')
+    msg['From'] = sender
+    msg['To'] = recipients if isinstance(recipients, str) else ", ".join(recipients)
+    msg['Subject'] = subject
+    msg.attach(MIMEText(html, 'html'))
+    for attachment in attachments:
+        msg.attach(attachment)
+    return msg
+
+
+def render_inventory_alert(critical, understock, overstock, analysis_time, limit=None):
+    """Render the stock alert digest; returns (html, attachments)"""
+    attachment_name = 'inventory_alert_products.csv.gz'
+    sections = []
+    for title, css, items, show_action in (
+            ('🚨 Critical Understock', 'critical', critical, True),
+            ('⚠️ Understock', 'warning', understock, False),
+            ('📦 Overstock', 'info', overstock, False)):
+        shown, hidden = top_n(items, stock_urgency, limit)
+        sections.append({'title': title, 'css': css, 'items': shown, 'hidden': hidden,
+                         'total': len(items), 'show_action': show_action})
+
+    html = render('inventory_alert.html', sections=sections, analysis_time=analysis_time,
+                  attachment_name=attachment_name)
+    attachments = []
+    if any(section['hidden'] for section in sections):
+        attachments.append(csv_gz_attachment(critical + understock + overstock, INVENTORY_COLUMNS, attachment_name))
+    return html, attachments
+
+
+def render_expiry_alert(expiry_items, analysis_time, limit=None):
+    """Render the expiry alert digest; returns (html, attachments)"""
+    attachment_name = 'expiry_alert_products.csv.gz'
+    shown, hidden = top_n(expiry_items, expiry_urgency, limit)
+    html = render('expiry_alert.html', items=shown, hidden=hidden, analysis_time=analysis_time,
+                  attachment_name=attachment_name)
+    attachments = []
+    if hidden:
+        attachments.append(csv_gz_attachment(expiry_items, EXPIRY_COLUMNS, attachment_name))
+    return html, attachments
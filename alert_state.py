@@ -0,0 +1,112 @@
+import time
+
+from config import get_config
+from storage import read_json, update_json
+
+ALERT_STATE_FILE = 'alert_state.json'
+
+
+def stock_alert_type(item):
+    status = item.get('status', '')
+    if 'understock' in status:
+        return 'understock'
+    if 'overstock' in status:
+        return 'overstock'
+    return None
+
+
+def stock_severity(item):
+    return 2 if 'critical' in item.get('status', '') else 1
+
+
+def expiry_alert_type(item):
+    return 'expiry'
+
+
+def expiry_severity(item):
+    days_left = str(item.get('days_left', '')).strip()
+    if days_left == 'Expired':
+        return 4
+    if days_left in ('Expires Today', '0'):
+        return 3
+    if days_left.isdigit() and int(days_left) <= get_config()['thresholds']['expiry_soon_days']:
+        return 2
+    return 1
+
+
+class AlertStateStore:
+    """Remembers when each condition was last emailed.
+
+    A condition is a product at a store (and, for expiry alerts, a lot) with an alert type;
+    rows without a store or lot keep the original `product_id|alert type` key."""
+
+    def __init__(self, path=ALERT_STATE_FILE, renotify_hours=None):
+        self.path = path
+        # unchanged conditions are re-sent only after alerts.renotify_hours
+        if renotify_hours is None:
+            renotify_hours = get_config()['alerts']['renotify_hours']
+        self.renotify_seconds = renotify_hours * 3600
+        self.state = read_json(self.path, {})
+        self._changed = {}
+        self._removed = set()
+
+    def save(self):
+        """Merge this store's changes into the file under lock, keeping other workers' updates"""
+        def merge(state):
+            for key in self._removed:
+                state.pop(key, None)
+            state.update(self._changed)
+
+        self.state = update_json(self.path, merge, default={})
+        self._changed = {}
+        self._removed = set()
+
+    @staticmethod
+    def location(item):
+        """(product_id, store) of a recommendation"""
+        store = item.get('store')
+        return str(item.get('product_id')), '' if store is None else str(store)
+
+    @classmethod
+    def key(cls, item, alert_type):
+        product_id, store = cls.location(item)
+        lot = item.get('lot') if alert_type == 'expiry' else None
+        lot = '' if lot is None else str(lot)
+        if not store and not lot:
+            return f"{product_id}|{alert_type}"
+        return f"{product_id}|{store}|{lot}|{alert_type}"
+
+    @staticmethod
+    def _key_location(key):
+        parts = key.split('|')
+        return (parts[0], '') if len(parts) < 4 else (parts[0], parts[1])
+
+    def is_due(self, item, alert_type, severity, now=None):
+        """New, escalated, or last sent longer ago than the re-notify interval"""
+        entry = self.state.get(self.key(item, alert_type))
+        if entry is None:
+            return True
+        now = time.time() if now is None else now
+        return severity > entry['severity'] or now - entry['notified_at'] >= self.renotify_seconds
+
+    def filter_due(self, items, alert_type_fn, severity_fn, now=None):
+        return [item for item in items if self.is_due(item, alert_type_fn(item), severity_fn(item), now)]
+
+    def mark_notified(self, items, alert_type_fn, severity_fn, now=None):
+        now = time.time() if now is None else now
+        for item in items:
+            key = self.key(item, alert_type_fn(item))
+            self.state[key] = self._changed[key] = {
+                'severity': severity_fn(item),
+                'notified_at': now,
+            }
+            self._removed.discard(key)
+
+    def resolve(self, items, active_keys):
+        """Forget conditions that cleared at these products' stores so they alert again if they come back"""
+        locations = {self.location(item) for item in items}
+        for key in list(self.state):
+            if self._key_location(key) in locations and key not in active_keys:
+                del self.state[key]
+                self._changed.pop(key, None)
+                self._removed.add(key)
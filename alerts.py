@@ -0,0 +1,214 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from alert_emails import render_inventory_alert, render_expiry_alert, build_message
+from alert_state import (AlertStateStore, stock_alert_type, stock_severity, expiry_alert_type,
+                         expiry_severity)
+from config import ConfigError, get_config
+from fanout import FanoutDispatcher, load_recipients, group_audiences, select_items, TO_PLACEHOLDER
+from logs import get_logger, smtp_debug_level
+from metrics import EMAILS, timed
+
+logger = get_logger('inventorypro.alerts')
+
+# Queued alert runs are sent one at a time in the background, so requests never wait for SMTP
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_receiver_email():
+    try:
+        return get_config()['receiver_email']
+    except Exception:
+        return None
+
+
+def smtp_settings():
+    """The smtp settings, or ConfigError when no sender account is configured"""
+    smtp = get_config()['smtp']
+    if not smtp['sender_email']:
+        raise ConfigError("smtp.sender_email is not set: add it to config.json or set INVENTORY_SMTP_SENDER")
+    if smtp['sender_password'] is None:
+        raise ConfigError("smtp.sender_password is not set: add it to config.json or set INVENTORY_SMTP_PASSWORD "
+                          "(\"\" for a relay without login)")
+    return smtp
+
+
+def sender_email():
+    return smtp_settings()['sender_email']
+
+
+def smtp_connect():
+    """Open an authenticated SMTP session"""
+    import smtplib
+
+    smtp = smtp_settings()
+    server = smtplib.SMTP(smtp['server'], smtp['port'])
+    server.set_debuglevel(smtp_debug_level())
+    if smtp['use_tls']:
+        server.starttls()
+    if smtp['sender_password']:
+        server.login(smtp['sender_email'], smtp['sender_password'])
+    return server
+
+
+def split_stock_alerts(recommendations):
+    critical = [r for r in recommendations if 'critical' in r['status']]
+    understock = [r for r in recommendations if r['status'] == 'understock']
+    overstock = [r for r in recommendations if r['status'] == 'overstock']
+    return critical, understock, overstock
+
+
+def inventory_alert_message(recommendations, receiver_email):
+    subject = "🚨 InventoryPro Alert - Critical Stock Changes"
+    analysis_time = time.strftime('%Y-%m-%d %H:%M:%S')
+    html_content, attachments = render_inventory_alert(*split_stock_alerts(recommendations), analysis_time)
+    return build_message(subject, sender_email(), receiver_email, html_content, attachments)
+
+
+def expiry_alert_message(expiry_items, receiver_email):
+    subject = "⏰ InventoryPro Alert - Products Expiring Soon"
+    analysis_time = time.strftime('%Y-%m-%d %H:%M:%S')
+    html_content, attachments = render_expiry_alert(expiry_items, analysis_time)
+    return build_message(subject, sender_email(), receiver_email, html_content, attachments)
+
+
+def send_inventory_alert(recommendations, receiver_email):
+    try:
+        if not any(split_stock_alerts(recommendations)):
+            logger.info("No inventory alerts to send.")
+            return True
+
+        msg = inventory_alert_message(recommendations, receiver_email)
+        with timed('smtp'):
+            server = smtp_connect()
+            server.sendmail(sender_email(), receiver_email, msg.as_string())
+            server.quit()
+        EMAILS.inc(alert='inventory', outcome='sent')
+        logger.info("✅ Inventory alert email sent to %s", receiver_email)
+        return True
+    except Exception as e:
+        EMAILS.inc(alert='inventory', outcome='failed')
+        logger.error("❌ Error sending inventory alert email: %s", e)
+        return False
+
+
+def send_expiry_alert(expiry_items, receiver_email):
+    try:
+        if not expiry_items:
+            logger.info("No expiry alerts to send.")
+            return True
+
+        msg = expiry_alert_message(expiry_items, receiver_email)
+        with timed('smtp'):
+            server = smtp_connect()
+            server.sendmail(sender_email(), receiver_email, msg.as_string())
+            server.quit()
+        EMAILS.inc(alert='expiry', outcome='sent')
+        logger.info("✅ Expiry alert email sent to %s", receiver_email)
+        return True
+    except Exception as e:
+        EMAILS.inc(alert='expiry', outcome='failed')
+        logger.error("❌ Error sending expiry alert email: %s", e)
+        return False
+
+
+def expiry_alert_items(recommendations, days=None):
+    """Expired products and those expiring within `days`, soonest first"""
+    if days is None:
+        days = get_config()['thresholds']['expiry_alert_days']
+    from inventory_system import ExpiryIndex
+
+    index = ExpiryIndex.from_records(recommendations, 'expiry_date', formats=['%Y-%m-%d'])
+    return [recommendations[i] for i in index.between(None, days)]
+
+
+def get_recipients():
+    """All alert recipients: recipients.json plus the receiver_email.txt address"""
+    return load_recipients(fallback_email=get_receiver_email())
+
+
+def send_combined_alerts(recommendations, recipients):
+    """Send inventory and expiry alerts for new or escalated conditions only.
+
+    Content is rendered once per distinct audience (alert types + stores) and
+    fanned out to its recipients through the rate-limited dispatcher.
+    Returns the list of alerts sent, or None when every condition was already
+    notified within the re-notify interval (nothing to send).
+    """
+    alerts_sent = []
+    state = AlertStateStore()
+
+    stock_items = [r for r in recommendations if stock_alert_type(r)]
+    expiry_items = expiry_alert_items(recommendations)
+    active = {state.key(r, stock_alert_type(r)) for r in stock_items}
+    active.update(state.key(r, expiry_alert_type(r)) for r in expiry_items)
+    state.resolve(recommendations, active)
+
+    due_stock = state.filter_due(stock_items, stock_alert_type, stock_severity)
+    due_expiry = state.filter_due(expiry_items, expiry_alert_type, expiry_severity)
+    logger.info("📦 %d of %d stock conditions and 📅 %d of %d expiry conditions are new or escalated",
+                len(due_stock), len(stock_items), len(due_expiry), len(expiry_items))
+    if not due_stock and not due_expiry:
+        return None
+
+    # fail before rendering anything when there is no account to send from
+    smtp_settings()
+    jobs, job_items = [], []
+    for audience, emails in group_audiences(recipients).items():
+        try:
+            stock = select_items(due_stock, audience, stock_alert_type)
+            if stock:
+                jobs.append(('inventory', emails, inventory_alert_message(stock, TO_PLACEHOLDER).as_string()))
+                job_items.append(stock)
+            expiry = select_items(due_expiry, audience, expiry_alert_type)
+            if expiry:
+                jobs.append(('expiry', emails, expiry_alert_message(expiry, TO_PLACEHOLDER).as_string()))
+                job_items.append(expiry)
+        except Exception as e:
+            logger.error("Error rendering alerts for %s: %s", emails, e)
+
+    # only items that reached at least one recipient count as notified; the rest stay due
+    sent = FanoutDispatcher(smtp_connect, sender_email()).dispatch(jobs)
+    delivered = {'inventory': [], 'expiry': []}
+    recipients_sent = {'inventory': 0, 'expiry': 0}
+    for (kind, _, _), items, count in zip(jobs, job_items, sent):
+        recipients_sent[kind] += count
+        if count:
+            delivered[kind].extend(items)
+    if delivered['inventory']:
+        state.mark_notified(delivered['inventory'], stock_alert_type, stock_severity)
+        alerts_sent.append(f"📦 Inventory Alert ({recipients_sent['inventory']} recipients)")
+    if delivered['expiry']:
+        state.mark_notified(delivered['expiry'], expiry_alert_type, expiry_severity)
+        alerts_sent.append(f"⏰ Expiry Alert ({recipients_sent['expiry']} recipients)")
+
+    try:
+        state.save()
+    except Exception as e:
+        logger.error("Error saving alert state: %s", e)
+
+    return alerts_sent
+
+
+def _alert_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alerts')
+        return _queue
+
+
+def _send_queued(recommendations, recipients):
+    try:
+        return send_combined_alerts(recommendations, recipients)
+    except Exception as e:
+        logger.error("❌ Queued alerts failed: %s", e)
+        return []
+
+
+def queue_combined_alerts(recommendations, recipients):
+    """Run send_combined_alerts in the background alert queue; returns its Future"""
+    logger.info("📨 Alerts queued for %d recipients", len(recipients))
+    return _alert_queue().submit(_send_queued, recommendations, recipients)
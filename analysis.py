@@ -0,0 +1,324 @@
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime
+
+from config import get_config
+from ingestion import EXPIRY_FORMATS, canonical_frame
+from logs import get_logger, Diagnostics
+from metrics import ROWS_PROCESSED, PARSE_FAILURES
+from progress import NullProgress
+from results_format import encode_results, COLUMNAR_SUFFIX
+from reorder import annotate_orders
+from running_stats import ProductStatsStore, stock_trend
+from storage import update_json, read_json, atomic_write, save_analysis
+
+logger = get_logger('inventorypro.analysis')
+
+HASHES_FILE = 'file_hashes.json'
+LATEST_RESULTS_FILE = 'latest_results.txt'
+# An unlinked hash claim older than this belongs to a worker that died mid-analysis
+CLAIM_TIMEOUT_SECONDS = 3600
+
+
+def calculate_file_hash(filepath):
+    """Calculate SHA-256 hash of a file"""
+    sha256_hash = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for byte_block in iter(lambda: f.read(4096), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+
+def _analyzed(entry, now):
+    """An upload counts as analyzed once it is linked to its results; an unlinked entry is an
+    in-flight claim until CLAIM_TIMEOUT_SECONDS, after which its worker is presumed dead"""
+    if entry.get('results_file'):
+        return True
+    return bool(entry.get('pending')) and now - entry.get('timestamp', 0) < CLAIM_TIMEOUT_SECONDS
+
+
+def is_duplicate_file(file_hash):
+    """Check if a file with this hash has been uploaded (and analyzed) before"""
+    entry = read_json(HASHES_FILE, {}).get(file_hash)
+    return entry is not None and _analyzed(entry, time.time())
+
+
+def save_file_hash(file_hash, filename, timestamp):
+    """Claim a file hash to prevent duplicate uploads.
+
+    Check and insert happen under one lock, so of two workers receiving the same
+    file only one gets True; the other should treat it as a duplicate. The claim
+    stays pending until link_file_hash, and must be dropped with release_file_hash
+    if the analysis fails.
+    """
+    claimed = []
+
+    def claim(hashes):
+        entry = hashes.get(file_hash)
+        if entry is None or not _analyzed(entry, timestamp):
+            hashes[file_hash] = {'filename': filename, 'timestamp': timestamp, 'pending': True}
+            claimed.append(True)
+
+    try:
+        update_json(HASHES_FILE, claim, default={})
+        return bool(claimed)
+    except Exception as e:
+        logger.error("Error saving file hash: %s", e)
+        return True
+
+
+def link_file_hash(file_hash, results_file):
+    """Remember which analysis an upload produced, so retention can forget the hash with it"""
+    def link(hashes):
+        if file_hash in hashes:
+            hashes[file_hash]['results_file'] = os.path.basename(results_file)
+            hashes[file_hash].pop('pending', None)
+
+    try:
+        update_json(HASHES_FILE, link, default={})
+    except Exception as e:
+        logger.error("Error saving file hash: %s", e)
+
+
+def release_file_hash(file_hash):
+    """Drop the claim of an upload whose analysis failed, so the same file can be retried"""
+    def release(hashes):
+        if file_hash in hashes and not hashes[file_hash].get('results_file'):
+            del hashes[file_hash]
+
+    try:
+        update_json(HASHES_FILE, release, default={})
+    except Exception as e:
+        logger.error("Error releasing file hash: %s", e)
+
+
+def category_multiplier(product_name, config):
+    """Ideal-stock multiplier for a new product, from the configured name keywords"""
+    name_lower = product_name.lower()
+    for rule in config['category_multipliers']:
+        if any(word in name_lower for word in rule['keywords']):
+            return rule['multiplier']
+    return config['default_multiplier']
+
+
+def analyze_data(df, progress=None):
+    """AI-powered analysis with FIXED expiry date handling"""
+    import pandas as pd
+
+    progress = progress or NullProgress()
+    every = progress.every
+    # frames from load_inventory are already canonical; others have their aliases resolved here, once
+    df = canonical_frame(df)
+    has_expiry = 'expiry_date' in df.columns
+    extra_columns = [column for column in ('store', 'lot') if column in df.columns]
+    purchasing_columns = [column for column in ('unit_cost', 'min_order_qty') if column in df.columns]
+    total_rows = len(df)
+    results = []
+    expiry_alerts = []
+    config = get_config()
+    thresholds = config['thresholds']
+
+    product_stats = ProductStatsStore()
+    is_first_upload = len(product_stats) == 0
+    diagnostics = Diagnostics()
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    for n, (idx, row) in enumerate(df.iterrows(), 1):
+        if n % every == 0:
+            progress.rows('analyzed', n, total_rows)
+        try:
+            current_stock = float(row['current_stock'])
+            product_id = str(row['product_id'])
+            product_name = str(row['product_name'])
+
+            # AI calculates ideal stock based on product type and history
+            if is_first_upload:
+                ideal_stock = int(current_stock * category_multiplier(product_name, config))
+                trend = "New Product"
+            else:
+                stats = product_stats.get(product_id)
+                if stats:
+                    ideal_stock, trend = stock_trend(stats)
+                else:
+                    ideal_stock = int(current_stock * category_multiplier(product_name, config))
+                    trend = "New Product"
+
+            # Calculate status
+            ratio = current_stock / ideal_stock if ideal_stock > 0 else 0
+            if ratio < thresholds['critical_understock']:
+                status = "critical_understock"
+                priority = "CRITICAL"
+                action = f"URGENT: Order {int(ideal_stock - current_stock)} units now"
+            elif ratio < thresholds['understock']:
+                status = "understock"
+                priority = "HIGH"
+                action = f"Reorder {int(ideal_stock - current_stock)} units soon"
+            elif ratio > thresholds['critical_overstock']:
+                status = "critical_overstock"
+                priority = "CRITICAL"
+                action = f"Reduce {int(current_stock - ideal_stock)} units"
+            elif ratio > thresholds['overstock']:
+                status = "overstock"
+                priority = "MEDIUM"
+                action = f"Consider reducing {int(current_stock - ideal_stock)} units"
+            else:
+                status = "optimal"
+                priority = "LOW"
+                action = "Stock level is good"
+
+            # 🔧 FIXED EXPIRY LOGIC - Always uses current date
+            expiry_date_str = ""
+            days_left_text = ""
+            expiry_obj = None
+            
+            raw_date = row['expiry_date'] if has_expiry else None
+            if isinstance(raw_date, datetime) and pd.notnull(raw_date):
+                # already parsed when the file was loaded
+                expiry_obj = raw_date.date()
+                expiry_date_str = expiry_obj.strftime('%Y-%m-%d')
+            elif raw_date is not None and pd.notnull(raw_date):
+                raw_date = str(raw_date).strip()
+                if raw_date not in ['nan', 'None', '', 'NaT']:
+                    expiry_date_str = raw_date
+
+            if expiry_date_str:
+                # Try multiple date formats
+                for fmt in EXPIRY_FORMATS:
+                    if expiry_obj:
+                        break
+                    try:
+                        expiry_obj = datetime.strptime(expiry_date_str, fmt).date()
+                    except:
+                        continue
+                
+                if expiry_obj:
+                    # 🚀 KEY FIX: Always use current system date
+                    today = datetime.now().date()
+                    delta_days = (expiry_obj - today).days
+                    
+                    if debug:
+                        logger.debug("🔍 %s: Expiry=%s, Today=%s, Delta=%s", product_name, expiry_obj, today, delta_days)
+                    
+                    if delta_days < 0:
+                        days_left_text = "Expired"
+                        expiry_alerts.append({
+                            'product_id': product_id,
+                            'product_name': product_name,
+                            'current_stock': int(current_stock),
+                            'expiry_date': expiry_obj.strftime('%Y-%m-%d'),
+                            'days_left': days_left_text
+                        })
+                    elif delta_days == 0:
+                        days_left_text = "Expires Today"
+                        expiry_alerts.append({
+                            'product_id': product_id,
+                            'product_name': product_name,
+                            'current_stock': int(current_stock),
+                            'expiry_date': expiry_obj.strftime('%Y-%m-%d'),
+                            'days_left': days_left_text
+                        })
+                    else:
+                        days_left_text = str(delta_days)
+                        if delta_days <= thresholds['expiry_alert_days']:
+                            expiry_alerts.append({
+                                'product_id': product_id,
+                                'product_name': product_name,
+                                'current_stock': int(current_stock),
+                                'expiry_date': expiry_obj.strftime('%Y-%m-%d'),
+                                'days_left': days_left_text
+                            })
+                    
+                    # Store standardized date
+                    expiry_date_str = expiry_obj.strftime('%Y-%m-%d')
+                else:
+                    PARSE_FAILURES.inc(kind='expiry_date')
+                    diagnostics.record('unparseable expiry dates', f"{product_id}='{expiry_date_str}'")
+                    days_left_text = ""
+                    expiry_date_str = ""
+            else:
+                days_left_text = ""
+
+            recommendation = {
+                'product_id': product_id,
+                'product_name': product_name,
+                'current_stock': int(current_stock),
+                'ideal_stock_level': int(ideal_stock),
+                'status': status,
+                'priority': priority,
+                'action': action,
+                'expiry_date': expiry_date_str,
+                'days_left': days_left_text,
+                'trend': trend
+            }
+            for column in extra_columns:
+                recommendation[column] = str(row[column]) if pd.notnull(row[column]) else ''
+            for column in purchasing_columns:
+                recommendation[column] = round(float(row[column]), 4) if pd.notnull(row[column]) else None
+            results.append(recommendation)
+            product_stats.record(product_id, current_stock)
+        except Exception as e:
+            PARSE_FAILURES.inc(kind='row')
+            diagnostics.record('processing errors', f"row {idx}: {e}")
+
+    # Fold this upload's stock levels into the running statistics: one locked update per upload
+    try:
+        product_stats.save()
+    except Exception as e:
+        logger.error("Error saving product statistics: %s", e)
+
+    progress.rows('analyzed', total_rows, total_rows)
+    ROWS_PROCESSED.inc(len(results))
+    diagnostics.log_summary(logger, 'Analysis')
+    logger.info("✅ Analysis complete! %d rows, %d expiring items", len(results), len(expiry_alerts))
+    return results, expiry_alerts
+
+
+def days_left_number(text):
+    """Days until expiry from a recommendation's days_left text (-1 once expired), or None
+    when the product has no expiry date"""
+    text = str(text or '').strip()
+    if text == 'Expired':
+        return -1
+    if text == 'Expires Today':
+        return 0
+    return int(text) if text.lstrip('-').isdigit() else None
+
+
+def summarize(recommendations):
+    return {
+        'total_products': len(recommendations),
+        'critical_count': len([r for r in recommendations if 'critical' in r['status']]),
+        'understock_count': len([r for r in recommendations if r['status'] == 'understock']),
+        'overstock_count': len([r for r in recommendations if r['status'] == 'overstock']),
+        'optimal_count': len([r for r in recommendations if r['status'] == 'optimal'])
+    }
+
+
+def build_results(recommendations, chart, filename, gallery=None):
+    """The saved analysis document"""
+    results = {
+        'recommendations': recommendations,
+        'chart': chart,
+        'gallery': gallery or {},
+        'summary': summarize(recommendations),
+        'filename': filename,
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    # with a purchasing budget or capacity configured, understocked items get an optimised order_quantity
+    try:
+        reorder_plan = annotate_orders(recommendations)
+        if reorder_plan:
+            results['reorder_plan'] = reorder_plan
+    except Exception as e:
+        logger.error("❌ Reorder planning failed: %s", e)
+    return results
+
+
+def save_results_file(results_folder, results):
+    """Publish results under a new analysis id and point latest_results.txt at it; returns the path"""
+    analysis_id, results_file = save_analysis(results_folder, encode_results(results), COLUMNAR_SUFFIX)
+    atomic_write(LATEST_RESULTS_FILE, analysis_id)
+    logger.info("✅ Results saved to: %s", results_file)
+    return results_file
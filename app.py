@@ -1,57 +1,67 @@
+import time
+
+# Cold-start clock: reported once the module has finished loading
+IMPORT_STARTED = time.perf_counter()
+
 import re
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, g, Response
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed, FileRequired
-from wtforms import StringField
+from wtforms import StringField, HiddenField
 from wtforms.validators import DataRequired, Email
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import os, io, base64, time, json
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import os, time, json
 from werkzeug.utils import secure_filename
-from threading import Thread
 import json
 import os
-import hashlib
+import secrets
+from metrics import REGISTRY, CONTENT_TYPE, COLD_START_SECONDS, REQUEST_SECONDS, PARSE_FAILURES, EMAILS, CACHE_LOOKUPS, timed
+from logs import get_logger
+from alert_state import ALERT_STATE_FILE
+from running_stats import STATS_FILE
+from expiry_scheduler import ExpiryScheduler
+from config import config_service, get_config
+from storage import (update_json, read_json, atomic_write, list_analysis_files, analysis_id_from_filename,
+                     analysis_timestamp, find_analysis_file)
+from results_format import load_results_file
+from http_cache import template_version, asset_fingerprint, conditional_page, cache_static, compress_response
+from retention import RetentionManager, remove_analyses
+from progress import new_job_id, valid_job_id, reporter_for, event_stream
+from profiling import PROFILE_HEADER, PSTATS_SUFFIX, profiler_for, list_profiles, load_profile
+from exports import (parse_filters, filter_recommendations, iter_export_rows, csv_stream, gzip_stream, xlsx_stream,
+                     xlsx_available)
+from ingestion import load_inventory, upload_extensions
+from simulate import settings_from_request, simulate_analysis
+from reorder import plan_orders, PLAN_COLUMNS
+from transfers import load_locations, match_transfers
+from analysis import (calculate_file_hash, save_file_hash, link_file_hash, release_file_hash, analyze_data,
+                      build_results, save_results_file)
+from charts import render_charts
+from alerts import (get_receiver_email, sender_email, smtp_connect, send_inventory_alert, get_recipients,
+                    send_combined_alerts, queue_combined_alerts)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'simple-secret-key-for-forms'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['RESULTS_FOLDER'] = 'static/results'
 
-# Email config - replace with your email and app password
-SENDER_EMAIL = "jatindadwal56@gmail.com"
-SENDER_PASSWORD = "qekrgjxielyfyadc"  # Use your Gmail App Password here
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+logger = get_logger('inventorypro')
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
 
+# Part of every page ETag: a deploy with changed templates invalidates cached pages
+PAGE_VERSION = template_version(os.path.join(app.root_path, app.template_folder))
+
 # Forms
 class FileUploadForm(FlaskForm):
-    file = FileField('CSV File', validators=[FileRequired(), FileAllowed(['csv'])])
+    file = FileField('Inventory File', validators=[FileRequired(), FileAllowed(upload_extensions())])
+    job_id = HiddenField()
 
 class EmailForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
 
-def get_receiver_email():
-    try:
-        with open('receiver_email.txt') as f:
-            email = f.read().strip()
-            return email if email else None
-    except Exception:
-        return None
-
-def send_email_async(func, *args):
-    Thread(target=func, args=args).start()
-
 def add_upload_history(filename, product_count, upload_time):
     entry = {
         "filename": filename,
@@ -59,16 +69,9 @@ def add_upload_history(filename, product_count, upload_time):
         "uploaded_at": upload_time
     }
     try:
-        if os.path.exists('upload_history.json'):
-            with open('upload_history.json', 'r') as f:
-                history = json.load(f)
-        else:
-            history = []
-        history.insert(0, entry)
-        with open('upload_history.json', 'w') as f:
-            json.dump(history, f)
+        update_json('upload_history.json', lambda history: history.insert(0, entry), default=[])
     except Exception as e:
-        print("Upload history log error:", e)
+        logger.error("Upload history log error: %s", e)
 
 def load_history():
     try:
@@ -77,392 +80,53 @@ def load_history():
     except:
         return []
 
-def calculate_file_hash(filepath):
-    """Calculate SHA-256 hash of a file"""
-    sha256_hash = hashlib.sha256()
-    with open(filepath, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
-
-def is_duplicate_file(file_hash):
-    """Check if a file with this hash has been uploaded before"""
-    try:
-        with open('file_hashes.json', 'r') as f:
-            hashes = json.load(f)
-            return file_hash in hashes
-    except:
-        return False
-
-def save_file_hash(file_hash, filename, timestamp):
-    """Save file hash to prevent duplicate uploads"""
-    try:
-        if os.path.exists('file_hashes.json'):
-            with open('file_hashes.json', 'r') as f:
-                hashes = json.load(f)
-        else:
-            hashes = {}
-        
-        hashes[file_hash] = {
-            'filename': filename,
-            'timestamp': timestamp
-        }
-        
-        with open('file_hashes.json', 'w') as f:
-            json.dump(hashes, f)
-    except Exception as e:
-        print(f"Error saving file hash: {e}")
-
 def save_results(results):
-    """Save analysis results to a JSON file"""
+    """Save analysis results to a JSON file under a new analysis id"""
     try:
-        timestamp = str(int(time.time()))
-        results_file = os.path.join(app.config['RESULTS_FOLDER'], f'results_{timestamp}.json')
-        
-        os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
-        
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
-        
-        with open('latest_results.txt', 'w') as f:
-            f.write(timestamp)
-            
-        print(f"✅ Results saved to: {results_file}")
+        results_file = save_results_file(app.config['RESULTS_FOLDER'], results)
+        expiry_scheduler.wake()
         return results_file
         
     except Exception as e:
-        print(f"❌ Error saving results: {e}")
+        logger.error("❌ Error saving results: %s", e)
         return None
 
+def latest_results_file():
+    """Path of the most recent analysis results file, or None"""
+    results_folder = app.config['RESULTS_FOLDER']
+    if not os.path.exists(results_folder):
+        return None
+        
+    result_files = list_analysis_files(results_folder)
+    if not result_files:
+        return None
+    return os.path.join(results_folder, result_files[0])
+
 def load_results():
     """Load the most recent analysis results"""
     try:
-        results_folder = app.config['RESULTS_FOLDER']
-        if not os.path.exists(results_folder):
-            return None
-            
-        result_files = [f for f in os.listdir(results_folder) if f.startswith('results_') and f.endswith('.json')]
-        if not result_files:
+        latest_file = latest_results_file()
+        if not latest_file:
             return None
-            
-        latest_file = max(result_files, key=lambda x: int(x.split('_')[1].split('.')[0]))
-        with open(os.path.join(results_folder, latest_file), 'r') as f:
-            return json.load(f)
+        return load_results_file(latest_file)
     except Exception as e:
-        print(f"Error loading results: {e}")
+        logger.error("Error loading results: %s", e)
         return None
 
-def get_inventory_alert_email_html(critical, understock, overstock, analysis_time):
-    """Generate beautiful HTML for inventory alert emails"""
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-      <meta charset="UTF-8">
-      <style>
-        body {{
-          background: #f8fafc;
-          font-family: 'Segoe UI', Arial, sans-serif;
-          margin: 0;
-          padding: 20px;
-        }}
-        .container {{
-          background: #ffffff;
-          border-radius: 16px;
-          box-shadow: 0 4px 25px rgba(96,130,182,0.15);
-          max-width: 600px;
-          margin: 0 auto;
-          overflow: hidden;
-        }}
-        .header {{
-          text-align: center;
-          padding: 30px 20px;
-          background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-          color: white;
-        }}
-        .header h1 {{
-          margin: 0;
-          font-size: 28px;
-          font-weight: 700;
-        }}
-        .content {{
-          padding: 30px;
-        }}
-        .alert-section {{
-          margin: 25px 0;
-          border-radius: 12px;
-          padding: 20px;
-          border-left: 5px solid;
-        }}
-        .critical {{
-          background: #fff5f5;
-          border-left-color: #dc3545;
-        }}
-        .warning {{
-          background: #fffbf0;
-          border-left-color: #fd7e14;
-        }}
-        .info {{
-          background: #f0f9ff;
-          border-left-color: #0ea5e9;
-        }}
-        .section-title {{
-          font-size: 18px;
-          font-weight: 600;
-          margin-bottom: 15px;
-          color: #1f2937;
-        }}
-        .item {{
-          padding: 12px 0;
-          border-bottom: 1px solid rgba(0,0,0,0.05);
-        }}
-        .product-name {{
-          font-weight: 600;
-          color: #1f2937;
-        }}
-        .footer {{
-          text-align: center;
-          padding: 20px;
-          background: #f8fafc;
-          color: #6b7280;
-          font-size: 14px;
-        }}
-      </style>
-    </head>
-    <body>
-      <div class="container">
-        <div class="header">
-          <h1>📦 InventoryPro Alert</h1>
-          <p>Critical stock changes detected</p>
-        </div>
-        <div class="content">
-          {f'''
-          <div class="alert-section critical">
-            <div class="section-title">🚨 Critical Understock ({len(critical)} items)</div>
-            {''.join([f'<div class="item"><div class="product-name">{item["product_name"]}</div><div>{item["action"]}</div></div>' for item in critical])}
-          </div>
-          ''' if critical else ''}
-          
-          {f'''
-          <div class="alert-section warning">
-            <div class="section-title">⚠️ Understock ({len(understock)} items)</div>
-            {''.join([f'<div class="item"><div class="product-name">{item["product_name"]}</div><div>Current: <strong>{item["current_stock"]}</strong> | Ideal: <strong>{item["ideal_stock_level"]}</strong></div></div>' for item in understock])}
-          </div>
-          ''' if understock else ''}
-          
-          {f'''
-          <div class="alert-section info">
-            <div class="section-title">📦 Overstock ({len(overstock)} items)</div>
-            {''.join([f'<div class="item"><div class="product-name">{item["product_name"]}</div><div>Current: <strong>{item["current_stock"]}</strong> | Ideal: <strong>{item["ideal_stock_level"]}</strong></div></div>' for item in overstock])}
-          </div>
-          ''' if overstock else ''}
-        </div>
-        <div class="footer">
-          Generated by <strong>InventoryPro</strong> on {analysis_time}
-        </div>
-      </div>
-    </body>
-    </html>
-    """
-
-def get_expiry_alert_email_html(expiry_items, analysis_time):
-    """Generate beautiful HTML for expiry alert emails"""
-    expiry_html = ""
-    for item in expiry_items:
-        expired_class = "expired" if item.get('days_left') in ['Expired', 'Expires Today', '0'] else "expiring"
-        if item.get('days_left') == 'Expired':
-            status_html = '<span style="color:#dc2626;font-weight:bold;">EXPIRED</span>'
-        elif item.get('days_left') in ['Expires Today', '0']:
-            status_html = '<span style="color:#dc2626;font-weight:bold;">EXPIRES TODAY</span>'
-        else:
-            status_html = f'<span style="color:#f59e0b;font-weight:bold;">{item["days_left"]} days remaining</span>'
-        
-        expiry_html += f'''
-        <div class="expiry-item {expired_class}">
-          <div class="product-name">{item.get('product_name', 'Unknown Product')}</div>
-          <div>Expiry Date: <strong>{item.get('expiry_date', 'N/A')}</strong></div>
-          <div>{status_html}</div>
-          <div>Stock: <strong>{item.get('current_stock', 0)} units</strong></div>
-        </div>'''
-    
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-      <meta charset="UTF-8">
-      <style>
-        body {{
-          background: #f8fafc;
-          font-family: 'Segoe UI', Arial, sans-serif;
-          margin: 0;
-          padding: 20px;
-        }}
-        .container {{
-          background: #ffffff;
-          border-radius: 16px;
-          box-shadow: 0 4px 25px rgba(96,130,182,0.15);
-          max-width: 600px;
-          margin: 0 auto;
-          overflow: hidden;
-        }}
-        .header {{
-          text-align: center;
-          padding: 30px 20px;
-          background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-          color: white;
-        }}
-        .header h1 {{
-          margin: 0;
-          font-size: 28px;
-          font-weight: 700;
-        }}
-        .content {{
-          padding: 30px;
-        }}
-        .expiry-item {{
-          padding: 20px;
-          margin: 15px 0;
-          border-radius: 12px;
-          border-left: 5px solid;
-        }}
-        .expired {{
-          background: #fef2f2;
-          border-left-color: #dc2626;
-        }}
-        .expiring {{
-          background: #fffbeb;
-          border-left-color: #f59e0b;
-        }}
-        .product-name {{
-          font-size: 18px;
-          font-weight: 600;
-          color: #1f2937;
-          margin-bottom: 8px;
-        }}
-        .footer {{
-          text-align: center;
-          padding: 20px;
-          background: #f8fafc;
-          color: #6b7280;
-          font-size: 14px;
-        }}
-      </style>
-    </head>
-    <body>
-      <div class="container">
-        <div class="header">
-          <h1>⏰ InventoryPro Expiry Alert</h1>
-          <p>Products expiring soon</p>
-        </div>
-        <div class="content">
-          {expiry_html}
-        </div>
-        <div class="footer">
-          Generated by <strong>InventoryPro</strong> on {analysis_time}
-        </div>
-      </div>
-    </body>
-    </html>
-    """
-
-def send_inventory_alert(recommendations, receiver_email):
-    try:
-        critical = [r for r in recommendations if 'critical' in r['status']]
-        understock = [r for r in recommendations if r['status'] == 'understock']
-        overstock = [r for r in recommendations if r['status'] == 'overstock']
-
-        if not critical and not understock and not overstock:
-            print("No inventory alerts to send.")
-            return True
-
-        subject = "🚨 InventoryPro Alert - Critical Stock Changes"
-        analysis_time = time.strftime('%Y-%m-%d %H:%M:%S')
-        
-        html_content = get_inventory_alert_email_html(critical, understock, overstock, analysis_time)
-
-        msg = MIMEMultipart('alternative')
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = receiver_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(html_content, 'html'))
+def alert_expiry_crossings(items):
+    """Alert on products whose expiry status changed since the analysis was saved"""
+    recipients = get_recipients()
+    if recipients:
+        queue_combined_alerts(items, recipients)
 
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.set_debuglevel(1)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, receiver_email, msg.as_string())
-        server.quit()
-        print(f"✅ Beautiful inventory alert email sent to {receiver_email}")
-        return True
-    except Exception as e:
-        print(f"❌ Error sending inventory alert email: {e}")
-        return False
-
-def send_expiry_alert(expiry_items, receiver_email):
-    try:
-        if not expiry_items:
-            print("No expiry alerts to send.")
-            return True
-            
-        subject = "⏰ InventoryPro Alert - Products Expiring Soon"
-        analysis_time = time.strftime('%Y-%m-%d %H:%M:%S')
-        
-        html_content = get_expiry_alert_email_html(expiry_items, analysis_time)
-
-        msg = MIMEMultipart('alternative')
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = receiver_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(html_content, 'html'))
-
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.set_debuglevel(1)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, receiver_email, msg.as_string())
-        server.quit()
-        print(f"✅ Beautiful expiry alert email sent to {receiver_email}")
-        return True
-    except Exception as e:
-        print(f"❌ Error sending expiry alert email: {e}")
-        return False
-
-def send_combined_alerts(recommendations, receiver_email):
-    """Send both inventory and expiry alerts"""
-    alerts_sent = []
-    
-    try:
-        success_inv = send_inventory_alert(recommendations, receiver_email)
-        if success_inv:
-            alerts_sent.append("📦 Inventory Alert")
-    except Exception as e:
-        print(f"Error sending inventory alert: {e}")
-    
-    try:
-        expiry_items = []
-        for item in recommendations:
-            expiry_date = item.get('expiry_date', '').strip()
-            days_left = item.get('days_left', '').strip()
-            
-            if (days_left in ['Expired', 'Expires Today'] or 
-                days_left == '0' or 
-                (days_left.isdigit() and int(days_left) <= 30)):
-                expiry_items.append(item)
-        
-        print(f"📅 Found {len(expiry_items)} expiring/expired items")
-        
-        if expiry_items:
-            success_exp = send_expiry_alert(expiry_items, receiver_email)
-            if success_exp:
-                alerts_sent.append("⏰ Expiry Alert")
-    except Exception as e:
-        print(f"Error sending expiry alert: {e}")
-    
-    return alerts_sent
+# one worker per host wins the scheduler's leader lock; it follows the latest analysis itself
+expiry_scheduler = ExpiryScheduler(on_due=alert_expiry_crossings, latest=latest_results_file)
 
 @app.route('/test-simple-email')
 def test_simple_email():
     """Test route to debug email sending"""
+    from email.mime.text import MIMEText
+
     try:
         receiver_email = get_receiver_email()
         if not receiver_email:
@@ -470,237 +134,20 @@ def test_simple_email():
         
         message = MIMEText("Test email from InventoryPro", "plain")
         message["Subject"] = "Test Email"
-        message["From"] = SENDER_EMAIL
+        message["From"] = sender_email()
         message["To"] = receiver_email
         
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.set_debuglevel(1)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, receiver_email, message.as_string())
-        server.quit()
+        with timed('smtp'):
+            server = smtp_connect()
+            server.sendmail(sender_email(), receiver_email, message.as_string())
+            server.quit()
+        EMAILS.inc(alert='test', outcome='sent')
         
         return f"✅ Test email sent successfully to {receiver_email}!"
     except Exception as e:
+        EMAILS.inc(alert='test', outcome='failed')
         return f"❌ Email failed: {str(e)}"
 
-def create_chart(recommendations):
-    try:
-        plt.figure(figsize=(12, 6))
-        data = recommendations[:8]
-        products = [item['product_name'][:12] for item in data]
-        current = [item['current_stock'] for item in data]
-        ideal = [item.get('ideal_stock_level', item.get('ideal_stock', 0)) for item in data]
-
-        x = range(len(products))
-        width = 0.35
-        plt.bar([i - width/2 for i in x], current, width, label='Current Stock', color='#FF6B6B', alpha=0.8)
-        plt.bar([i + width/2 for i in x], ideal, width, label='Ideal Stock', color='#4ECDC4', alpha=0.8)
-        plt.xlabel('Products', fontweight='bold')
-        plt.ylabel('Stock Quantity', fontweight='bold')
-        plt.title('Current vs Ideal Stock Levels', fontsize=16, fontweight='bold')
-        plt.xticks(x, products, rotation=45, ha='right')
-        plt.legend()
-        plt.grid(axis='y', alpha=0.3)
-        plt.tight_layout()
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        image_data = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        return f"data:image/png;base64,{image_data}"
-    except Exception as e:
-        print(f"Chart error: {e}")
-        plt.close()
-        return None
-
-def analyze_data(df):
-    """AI-powered analysis with FIXED expiry date handling"""
-    results = []
-    expiry_alerts = []
-
-    try:
-        with open('inventory_history.json', 'r') as f:
-            historical_data = json.load(f)
-    except Exception:
-        historical_data = []
-    is_first_upload = len(historical_data) == 0
-
-    for idx, row in df.iterrows():
-        try:
-            current_stock = float(row['current_stock'])
-            product_id = str(row['product_id'])
-            product_name = str(row['product_name'])
-
-            # AI calculates ideal stock based on product type and history
-            if is_first_upload:
-                name_lower = product_name.lower()
-                if any(word in name_lower for word in ['milk', 'bread', 'egg', 'yogurt']):
-                    ideal_stock = int(current_stock * 2.0)
-                elif any(word in name_lower for word in ['rice', 'oil', 'sugar', 'flour']):
-                    ideal_stock = int(current_stock * 1.8)
-                elif any(word in name_lower for word in ['fruit', 'vegetable', 'meat', 'fish', 'cheese']):
-                    ideal_stock = int(current_stock * 1.3)
-                else:
-                    ideal_stock = int(current_stock * 1.5)
-                trend = "New Product"
-            else:
-                prev_history = [rec for rec in historical_data if rec['product_id'] == product_id]
-                if prev_history:
-                    avg_stock = sum([rec['current_stock'] for rec in prev_history]) / len(prev_history)
-                    recent_stocks = [rec['current_stock'] for rec in prev_history[-3:]]
-                    older_stocks = [rec['current_stock'] for rec in prev_history[:-3]]
-                    recent_avg = sum(recent_stocks) / len(recent_stocks) if recent_stocks else avg_stock
-                    older_avg = sum(older_stocks) / len(older_stocks) if older_stocks else avg_stock
-                    if recent_avg > older_avg * 1.1:
-                        ideal_stock = int(avg_stock * 1.4)
-                        trend = "Growing ↗"
-                    elif recent_avg < older_avg * 0.9:
-                        ideal_stock = int(avg_stock * 1.1)
-                        trend = "Declining ↘"
-                    else:
-                        ideal_stock = int(avg_stock * 1.2)
-                        trend = "Stable →"
-                else:
-                    name_lower = product_name.lower()
-                    if any(word in name_lower for word in ['milk', 'bread', 'egg', 'yogurt']):
-                        ideal_stock = int(current_stock * 2.0)
-                    elif any(word in name_lower for word in ['rice', 'oil', 'sugar', 'flour']):
-                        ideal_stock = int(current_stock * 1.8)
-                    elif any(word in name_lower for word in ['fruit', 'vegetable', 'meat', 'fish', 'cheese']):
-                        ideal_stock = int(current_stock * 1.3)
-                    else:
-                        ideal_stock = int(current_stock * 1.5)
-                    trend = "New Product"
-
-            # Calculate status
-            ratio = current_stock / ideal_stock if ideal_stock > 0 else 0
-            if ratio < 0.3:
-                status = "critical_understock"
-                priority = "CRITICAL"
-                action = f"URGENT: Order {int(ideal_stock - current_stock)} units now"
-            elif ratio < 0.7:
-                status = "understock"
-                priority = "HIGH"
-                action = f"Reorder {int(ideal_stock - current_stock)} units soon"
-            elif ratio > 2.0:
-                status = "critical_overstock"
-                priority = "CRITICAL"
-                action = f"Reduce {int(current_stock - ideal_stock)} units"
-            elif ratio > 1.3:
-                status = "overstock"
-                priority = "MEDIUM"
-                action = f"Consider reducing {int(current_stock - ideal_stock)} units"
-            else:
-                status = "optimal"
-                priority = "LOW"
-                action = "Stock level is good"
-
-            # 🔧 FIXED EXPIRY LOGIC - Always uses current date
-            expiry_date_str = ""
-            days_left_text = ""
-            
-            # Find expiry date from any column
-            for col in ['expiry_date', 'Expiry', 'expiry']:
-                if col in df.columns and pd.notnull(row[col]):
-                    raw_date = str(row[col]).strip()
-                    if raw_date and raw_date not in ['nan', 'None', '', 'NaT']:
-                        expiry_date_str = raw_date
-                        print(f"📅 Raw expiry date for {product_name}: '{expiry_date_str}'")
-                        break
-
-            if expiry_date_str:
-                # Try multiple date formats
-                date_formats = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%m/%d/%Y']
-                expiry_obj = None
-                
-                for fmt in date_formats:
-                    try:
-                        expiry_obj = datetime.strptime(expiry_date_str, fmt).date()
-                        break
-                    except:
-                        continue
-                
-                if expiry_obj:
-                    # 🚀 KEY FIX: Always use current system date
-                    today = datetime.now().date()
-                    delta_days = (expiry_obj - today).days
-                    
-                    print(f"🔍 {product_name}: Expiry={expiry_obj}, Today={today}, Delta={delta_days}")
-                    
-                    if delta_days < 0:
-                        days_left_text = "Expired"
-                        print(f"✅ {product_name} marked as EXPIRED")
-                        expiry_alerts.append({
-                            'product_id': product_id,
-                            'product_name': product_name,
-                            'current_stock': int(current_stock),
-                            'expiry_date': expiry_obj.strftime('%Y-%m-%d'),
-                            'days_left': days_left_text
-                        })
-                    elif delta_days == 0:
-                        days_left_text = "Expires Today"
-                        print(f"✅ {product_name} marked as EXPIRES TODAY")
-                        expiry_alerts.append({
-                            'product_id': product_id,
-                            'product_name': product_name,
-                            'current_stock': int(current_stock),
-                            'expiry_date': expiry_obj.strftime('%Y-%m-%d'),
-                            'days_left': days_left_text
-                        })
-                    else:
-                        days_left_text = str(delta_days)
-                        if delta_days <= 30:
-                            expiry_alerts.append({
-                                'product_id': product_id,
-                                'product_name': product_name,
-                                'current_stock': int(current_stock),
-                                'expiry_date': expiry_obj.strftime('%Y-%m-%d'),
-                                'days_left': days_left_text
-                            })
-                    
-                    # Store standardized date
-                    expiry_date_str = expiry_obj.strftime('%Y-%m-%d')
-                else:
-                    print(f"❌ Could not parse expiry date '{expiry_date_str}' for {product_name}")
-                    days_left_text = ""
-                    expiry_date_str = ""
-            else:
-                days_left_text = ""
-
-            results.append({
-                'product_id': product_id,
-                'product_name': product_name,
-                'current_stock': int(current_stock),
-                'ideal_stock_level': int(ideal_stock),
-                'status': status,
-                'priority': priority,
-                'action': action,
-                'expiry_date': expiry_date_str,
-                'days_left': days_left_text,
-                'trend': trend
-            })
-        except Exception as e:
-            print(f"Error processing row {idx}: {e}")
-
-        # Save historical data
-        try:
-            historical_data.append({
-                'product_id': product_id,
-                'product_name': product_name,
-                'current_stock': current_stock,
-                'upload_timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-            })
-            if len(historical_data) > 100:
-                historical_data = historical_data[-100:]
-            with open('inventory_history.json', 'w') as f:
-                json.dump(historical_data, f)
-        except Exception as e:
-            print(f"Error saving history: {e}")
-
-    print(f"✅ Analysis complete! Found {len(expiry_alerts)} expiring items")
-    return results, expiry_alerts
-
 def get_all_analyses():
     """Get list of all previous analyses"""
     try:
@@ -709,18 +156,16 @@ def get_all_analyses():
             os.makedirs(results_folder, exist_ok=True)
             return []
             
-        files = [f for f in os.listdir(results_folder) if f.startswith('results_') and f.endswith('.json')]
-        files.sort(reverse=True)
+        files = list_analysis_files(results_folder)
         
         analyses = []
         for filename in files:
             try:
                 filepath = os.path.join(results_folder, filename)
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
+                data = load_results_file(filepath, columns=['status'])
                 
-                timestamp_part = filename.split('_')[1].split('.')[0]
-                readable_date = datetime.fromtimestamp(int(timestamp_part)).strftime('%Y-%m-%d %H:%M:%S')
+                timestamp_part = analysis_timestamp(analysis_id_from_filename(filename))
+                readable_date = datetime.fromtimestamp(timestamp_part).strftime('%Y-%m-%d %H:%M:%S')
 
                 analyses.append({
                     'filename': filename,
@@ -730,18 +175,18 @@ def get_all_analyses():
                     'source_file': data.get('filename', 'Unknown')
                 })
             except Exception as e:
-                print(f"Error reading {filename}: {e}")
+                logger.error("Error reading %s: %s", filename, e)
                 
         return analyses
     except Exception as e:
-        print(f"Error getting analyses: {e}")
+        logger.error("Error getting analyses: %s", e)
         return []
 
 @app.route('/previous-analyses')
 def previous_analyses():
     """Show list of all previous analyses"""
-    analyses = get_all_analyses()
-    return render_template('previous_analyses.html', analyses=analyses)
+    return conditional_page(lambda: render_template('previous_analyses.html', analyses=get_all_analyses()),
+                            [app.config['RESULTS_FOLDER']], extra=[PAGE_VERSION])
 
 @app.route('/previous-analyses/<filename>')
 def view_previous_analysis(filename):
@@ -749,9 +194,10 @@ def view_previous_analysis(filename):
     try:
         filepath = os.path.join(app.config['RESULTS_FOLDER'], filename)
         if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-            return render_template('results.html', result=data, is_previous=True)
+            return conditional_page(
+                lambda: render_results(load_results_file(filepath), analysis_id_from_filename(filename),
+                                       is_previous=True),
+                [filepath], extra=[PAGE_VERSION])
         else:
             flash('Analysis not found!', 'error')
             return redirect(url_for('previous_analyses'))
@@ -765,7 +211,7 @@ def delete_analysis(filename):
     try:
         filepath = os.path.join(app.config['RESULTS_FOLDER'], filename)
         if os.path.exists(filepath):
-            os.remove(filepath)
+            remove_analyses([filepath])
             flash('✅ Analysis deleted successfully!', 'success')
         else:
             flash('❌ Analysis file not found!', 'error')
@@ -783,15 +229,13 @@ def clear_all_analyses():
         # Clear analysis results
         results_folder = app.config['RESULTS_FOLDER']
         if os.path.exists(results_folder):
-            files = [f for f in os.listdir(results_folder) if f.startswith('results_') and f.endswith('.json')]
-            for file in files:
-                os.remove(os.path.join(results_folder, file))
-                files_deleted += len(files)
+            files = list_analysis_files(results_folder)
+            files_deleted += remove_analyses([os.path.join(results_folder, file) for file in files])
         
         # 🔧 KEY FIX: Clear file hash cache to allow re-uploads
         if os.path.exists('file_hashes.json'):
             os.remove('file_hashes.json')
-            print("✅ Cleared duplicate detection cache")
+            logger.info("✅ Cleared duplicate detection cache")
         
         # Clear latest results pointer
         if os.path.exists('latest_results.txt'):
@@ -813,23 +257,17 @@ def send_alert(filename):
             flash('❌ Analysis not found!', 'error')
             return redirect(url_for('previous_analyses'))
         
-        with open(filepath, 'r') as f:
-            data = json.load(f)
+        data = load_results_file(filepath)
         
         recommendations = data.get('recommendations', [])
-        receiver_email = get_receiver_email()
+        recipients = get_recipients()
         
-        if not receiver_email:
+        if not recipients:
             flash('⚠️ Email not configured!', 'warning')
             return redirect(url_for('previous_analyses'))
         
-        alerts_sent = send_combined_alerts(recommendations, receiver_email)
-        
-        if alerts_sent:
-            alerts_text = " & ".join(alerts_sent)
-            flash(f'✅ {alerts_text} sent successfully!', 'success')
-        else:
-            flash('⚠️ No alerts sent - check email configuration.', 'warning')
+        queue_combined_alerts(recommendations, recipients)
+        flash(f'📨 Alerts queued for {len(recipients)} recipient(s); only new or escalated conditions are sent.', 'success')
             
         return redirect(url_for('previous_analyses'))
         
@@ -847,19 +285,14 @@ def send_current_alert():
             return redirect(url_for('results'))
         
         recommendations = result_data.get('recommendations', [])
-        receiver_email = get_receiver_email()
+        recipients = get_recipients()
         
-        if not receiver_email:
+        if not recipients:
             flash('⚠️ Email not configured!', 'warning')
             return redirect(url_for('results'))
         
-        alerts_sent = send_combined_alerts(recommendations, receiver_email)
-        
-        if alerts_sent:
-            alerts_text = " & ".join(alerts_sent)
-            flash(f'✅ {alerts_text} sent successfully!', 'success')
-        else:
-            flash('❌ Failed to send alerts. Check email configuration.', 'error')
+        queue_combined_alerts(recommendations, recipients)
+        flash(f'📨 Alerts queued for {len(recipients)} recipient(s); only new or escalated conditions are sent.', 'success')
             
         return redirect(url_for('results'))
         
@@ -867,6 +300,87 @@ def send_current_alert():
         flash(f'❌ Error: {str(e)}', 'error')
         return redirect(url_for('results'))
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                endpoint=request.endpoint or 'unknown',
+                                method=request.method,
+                                status=response.status_code)
+    return response
+
+@app.after_request
+def cache_and_compress(response):
+    return compress_response(cache_static(response, app.static_folder))
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """url_for('static', filename='css/style.css') -> /static/css/style.css?v=<content hash>"""
+    if endpoint == 'static' and 'filename' in values:
+        fingerprint = asset_fingerprint(app.static_folder, values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+@app.route('/metrics')
+def metrics():
+    """Expose pipeline and route metrics in Prometheus text format"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def is_admin_request():
+    """X-Admin-Token must match config admin_token. Without a configured token there is no admin
+    access: behind a reverse proxy every request comes from localhost, so the address proves nothing."""
+    token = get_config().get('admin_token')
+    return bool(token) and secrets.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+@app.route('/admin/reload-config', methods=['POST'])
+def reload_config():
+    """Reload config.json now and signal the other worker processes to do the same"""
+    if not is_admin_request():
+        return {'status': 'forbidden'}, 403
+    try:
+        config_service.reload()
+    except Exception as e:
+        # rejected edit: the previous configuration stays in use
+        return {'status': 'invalid', 'config_file': config_service.path, 'error': str(e)}, 400
+    try:
+        config_service.touch()
+        return {'status': 'reloaded', 'config_file': config_service.path}
+    except Exception as e:
+        logger.error("❌ Config reload failed: %s", e)
+        return {'status': 'error', 'error': str(e)}, 500
+
+@app.route('/admin/profiles')
+@app.route('/admin/profiles/<analysis_id>')
+def profiles(analysis_id=None):
+    """Saved upload profiles: timings, peak memory, hottest functions and allocation sites"""
+    if not is_admin_request():
+        return {'status': 'forbidden'}, 403
+    if analysis_id is None:
+        return render_template('profiles.html', profiles=list_profiles(app.config['RESULTS_FOLDER']))
+    results_file = find_analysis_file(app.config['RESULTS_FOLDER'], analysis_id)
+    profile = load_profile(results_file) if results_file else None
+    if not profile:
+        return {'error': 'profile not found'}, 404
+    return render_template('profiles.html', profile=profile, analysis_id=analysis_id)
+
+@app.route('/admin/profiles/<analysis_id>.pstats')
+def download_pstats(analysis_id):
+    """Raw cProfile stats, for pstats.Stats(path) or snakeviz"""
+    if not is_admin_request():
+        return {'status': 'forbidden'}, 403
+    results_file = find_analysis_file(app.config['RESULTS_FOLDER'], analysis_id)
+    if not results_file or not os.path.exists(results_file + PSTATS_SUFFIX):
+        return {'error': 'profile not found'}, 404
+    with open(results_file + PSTATS_SUFFIX, 'rb') as f:
+        data = f.read()
+    headers = {'Content-Disposition': f'attachment; filename="{analysis_id}.pstats"'}
+    return Response(data, mimetype='application/octet-stream', headers=headers)
+
 @app.route('/')
 def index():
     email = get_receiver_email()
@@ -876,75 +390,205 @@ def index():
 def upload_file():
     form = FileUploadForm()
     if form.validate_on_submit():
+        progress = reporter_for(form.job_id.data)
+        # admins can profile one upload with the X-Profile header or ?profile=1
+        profiler = profiler_for(bool(request.headers.get(PROFILE_HEADER) or request.args.get('profile'))
+                                and is_admin_request(), form.file.data.filename)
+        if not progress.start():
+            flash('⏳ This upload is already being analyzed.', 'info')
+            return redirect(url_for('results'))
         try:
             file = form.file.data
             filename = secure_filename(file.filename)
             timestamp = int(time.time())
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{timestamp}_{filename}")
-            file.save(filepath)
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{timestamp}_{os.getpid()}_{secrets.token_hex(4)}_{filename}")
+            with timed('save_upload'):
+                file.save(filepath)
             
-            file_hash = calculate_file_hash(filepath)
-            if is_duplicate_file(file_hash):
+            with timed('hash'):
+                file_hash = calculate_file_hash(filepath)
+                claimed = save_file_hash(file_hash, filename, timestamp)
+            if not claimed:
+                CACHE_LOOKUPS.inc(cache='upload_hash', result='hit')
                 os.remove(filepath)
+                progress.finish(duplicate=True)
                 flash('⚠️ This file has already been uploaded! Showing previous analysis.', 'warning')
                 return redirect(url_for('results'))
+            CACHE_LOOKUPS.inc(cache='upload_hash', result='miss')
             
-            save_file_hash(file_hash, filename, timestamp)
-            
-            df = pd.read_csv(filepath)
-            
-            recommendations, expiry_alerts = analyze_data(df)
-            chart = create_chart(recommendations)
+            try:
+                with timed('read_csv'), profiler.stage('read'):
+                    df = load_inventory(filepath)
+            except Exception:
+                PARSE_FAILURES.inc(kind='csv')
+                raise
+            progress.stage('parsed', rows=len(df))
             
-            summary = {
-                'total_products': len(recommendations),
-                'critical_count': len([r for r in recommendations if 'critical' in r['status']]),
-                'understock_count': len([r for r in recommendations if r['status'] == 'understock']),
-                'overstock_count': len([r for r in recommendations if r['status'] == 'overstock']),
-                'optimal_count': len([r for r in recommendations if r['status'] == 'optimal'])
-            }
+            with timed('analyze'), profiler.stage('analyze'):
+                recommendations, expiry_alerts = analyze_data(df, progress)
+            with timed('chart'), profiler.stage('chart'):
+                chart, gallery = render_charts(recommendations, serial=profiler.enabled)
+            progress.stage('chart')
             
-            results = {
-                'recommendations': recommendations,
-                'chart': chart,
-                'summary': summary,
-                'filename': filename,
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-            }
+            results = build_results(recommendations, chart, filename, gallery)
             
-            save_results(results)
+            with timed('save_results'):
+                results_file = save_results(results)
+            if results_file:
+                link_file_hash(file_hash, results_file)
+            else:
+                release_file_hash(file_hash)
+            progress.stage('saved')
             
-            receiver_email = get_receiver_email()
-            if receiver_email:
-                alerts_sent = send_combined_alerts(recommendations, receiver_email)
-                if alerts_sent:
-                    alerts_text = " & ".join(alerts_sent)
-                    flash(f'🤖 AI Analysis complete! {alerts_text} sent.', 'success')
+            recipients = get_recipients()
+            if recipients:
+                progress.stage('emails', recipients=len(recipients))
+                if profiler.enabled:
+                    # profiled uploads send in the request thread, where cProfile sees the rendering
+                    with profiler.stage('alerts'):
+                        send_combined_alerts(recommendations, recipients)
                 else:
-                    flash('🤖 AI Analysis complete! Check email configuration.', 'warning')
+                    queue_combined_alerts(recommendations, recipients)
+                flash(f'🤖 AI Analysis complete! Alerts queued for {len(recipients)} recipient(s).', 'success')
             else:
                 flash('🤖 AI Analysis complete! Configure email to receive alerts.', 'info')
             
+            profiler.save(results_file)
             os.remove(filepath)
+            progress.finish()
             return redirect(url_for('results'))
             
         except Exception as e:
+            progress.finish(ok=False, error=str(e))
             flash(f'Error: {str(e)}', 'error')
+            if locals().get('claimed'):
+                release_file_hash(file_hash)
             if 'filepath' in locals() and os.path.exists(filepath):
                 os.remove(filepath)
     
+    form.job_id.data = new_job_id()
     return render_template('upload.html', form=form, history=load_history())
 
+@app.route('/progress/<job_id>')
+def progress_events(job_id):
+    """Server-Sent Events stream of an upload's analysis progress"""
+    if not valid_job_id(job_id):
+        return {'error': 'invalid job id'}, 404
+    return Response(event_stream(job_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/results')
 def results():
-    result_data = load_results()
-    if not result_data:
+    latest_file = latest_results_file()
+    if not latest_file:
         flash("No results!", "danger")
         return redirect(url_for('index'))
-    return render_template('results.html', result=result_data)
+
+    def render():
+        try:
+            result_data = load_results_file(latest_file)
+        except Exception as e:
+            logger.error("Error loading results: %s", e)
+            flash("No results!", "danger")
+            return redirect(url_for('index'))
+        return render_results(result_data, analysis_id_from_filename(os.path.basename(latest_file)))
+
+    # the folder's mtime changes when the latest analysis is deleted or superseded
+    return conditional_page(render, [latest_file, app.config['RESULTS_FOLDER']], extra=[PAGE_VERSION])
+
+def render_results(result_data, analysis_id, **context):
+    """Results page with the query-string filters applied to the product table"""
+    filters = parse_filters(request.args)
+    if filters:
+        result_data['recommendations'] = list(filter_recommendations(result_data['recommendations'], filters))
+    return render_template('results.html', result=result_data, analysis_id=analysis_id,
+                           filters=filters, query=request.query_string.decode(), **context)
+
+@app.route('/api/analyses/<analysis_id>/export.<fmt>')
+def export_analysis(analysis_id, fmt):
+    """Stream an analysis as CSV or Excel, honouring the results-view filters"""
+    if analysis_id == 'latest':
+        results_file = latest_results_file()
+    else:
+        results_file = find_analysis_file(app.config['RESULTS_FOLDER'], analysis_id)
+    if not results_file or fmt not in ('csv', 'xlsx'):
+        return {'error': 'analysis or format not found'}, 404
+    if fmt == 'xlsx' and not xlsx_available():
+        return {'error': 'Excel export needs openpyxl (pip install openpyxl)'}, 501
+
+    rows = iter_export_rows(results_file, parse_filters(request.args))
+    download_name = f"{analysis_id_from_filename(os.path.basename(results_file))}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="inventory_{download_name}"'}
+    if fmt == 'xlsx':
+        body = xlsx_stream(rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        body = csv_stream(rows)
+        mimetype = 'text/csv'
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            body = gzip_stream(body)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+@app.route('/api/analyses/<analysis_id>/simulate', methods=['POST'])
+def simulate_thresholds(analysis_id):
+    """What-if evaluation of a grid of thresholds against a saved analysis"""
+    if analysis_id == 'latest':
+        results_file = latest_results_file()
+    else:
+        results_file = find_analysis_file(app.config['RESULTS_FOLDER'], analysis_id)
+    if not results_file:
+        return {'error': 'analysis not found'}, 404
+    try:
+        settings = settings_from_request(request.get_json(silent=True) or {})
+        return {'analysis_id': analysis_id_from_filename(os.path.basename(results_file)),
+                'results': simulate_analysis(results_file, settings)}
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+@app.route('/api/analyses/<analysis_id>/reorder-plan')
+def reorder_plan(analysis_id):
+    """Order quantities for an analysis under the purchasing budget/capacity (overridable per request)"""
+    if analysis_id == 'latest':
+        results_file = latest_results_file()
+    else:
+        results_file = find_analysis_file(app.config['RESULTS_FOLDER'], analysis_id)
+    if not results_file:
+        return {'error': 'analysis not found'}, 404
+    try:
+        overrides = {key: float(request.args[key]) for key in ('budget', 'capacity_units', 'time_limit_seconds')
+                     if request.args.get(key, '').strip()}
+    except ValueError:
+        return {'error': 'budget, capacity_units and time_limit_seconds must be numbers'}, 400
+    if any(value < 0 for value in overrides.values()) or overrides.get('time_limit_seconds', 1) <= 0:
+        return {'error': 'budget, capacity_units and time_limit_seconds must be positive'}, 400
+    recommendations = load_results_file(results_file, columns=PLAN_COLUMNS)['recommendations']
+    plan = plan_orders(recommendations, **overrides)
+    return dict(plan, analysis_id=analysis_id_from_filename(os.path.basename(results_file)))
+
+@app.route('/api/analyses/<analysis_id>/transfers')
+def transfer_plan(analysis_id):
+    """Stock transfers between the stores of a multi-location analysis"""
+    if analysis_id == 'latest':
+        results_file = latest_results_file()
+    else:
+        results_file = find_analysis_file(app.config['RESULTS_FOLDER'], analysis_id)
+    if not results_file:
+        return {'error': 'analysis not found'}, 404
+    overrides = {}
+    if request.args.get('max_cost', '').strip():
+        try:
+            overrides['max_cost'] = float(request.args['max_cost'])
+        except ValueError:
+            return {'error': 'max_cost must be a number'}, 400
+    plan = match_transfers(load_locations(results_file), **overrides)
+    return dict(plan, analysis_id=analysis_id_from_filename(os.path.basename(results_file)))
 
 @app.route('/sample-data')
 def use_sample_data():
+    import pandas as pd
+
     try:
         sample_df = pd.DataFrame([
             {'product_id': 'P001', 'product_name': 'Fresh Apples', 'current_stock': 45, 'expiry_date': '21-08-2025'},
@@ -952,30 +596,13 @@ def use_sample_data():
         ])
         recommendations, expiry_alerts = analyze_data(sample_df)
 
-        chart = create_chart(recommendations)
-        summary = {
-            'total_products': len(recommendations),
-            'critical_count': len([r for r in recommendations if 'critical' in r['status']]),
-            'understock_count': len([r for r in recommendations if r['status'] == 'understock']),
-            'overstock_count': len([r for r in recommendations if r['status'] == 'overstock']),
-            'optimal_count': len([r for r in recommendations if r['status'] == 'optimal'])
-        }
-        results = {
-            'recommendations': recommendations,
-            'chart': chart,
-            'summary': summary,
-            'filename': 'sample_data.csv',
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        chart, gallery = render_charts(recommendations)
+        results = build_results(recommendations, chart, 'sample_data.csv', gallery)
         save_results(results)
-        receiver_email = get_receiver_email()
-        if receiver_email:
-            alerts_sent = send_combined_alerts(recommendations, receiver_email)
-            if alerts_sent:
-                alerts_text = " & ".join(alerts_sent)
-                flash(f'Sample data analyzed! {alerts_text} sent.', 'success')
-            else:
-                flash('Sample data analyzed! Check email configuration.', 'warning')
+        recipients = get_recipients()
+        if recipients:
+            queue_combined_alerts(recommendations, recipients)
+            flash(f'Sample data analyzed! Alerts queued for {len(recipients)} recipient(s).', 'success')
         else:
             flash('Sample data analyzed! Configure email to receive alerts.', 'info')
         return redirect(url_for('results'))
@@ -987,9 +614,12 @@ def use_sample_data():
 def set_email():
     form = EmailForm()
     if form.validate_on_submit():
-        with open('receiver_email.txt', 'w') as f:
-            f.write(form.email.data)
-        flash('Email saved!', 'success')
+        atomic_write('receiver_email.txt', form.email.data)
+        try:
+            config_service.reload()
+            flash('Email saved!', 'success')
+        except Exception as e:
+            flash(f'Email saved, but config.json is invalid and was not reloaded: {e}', 'warning')
         return redirect(url_for('index'))
     current_email = get_receiver_email()
     if current_email and not form.email.data:
@@ -1027,30 +657,36 @@ def clear_all_data():
         # 1. Clear analysis results
         results_folder = app.config['RESULTS_FOLDER']
         if os.path.exists(results_folder):
-            files = [f for f in os.listdir(results_folder) if f.startswith('results_') and f.endswith('.json')]
-            for file in files:
-                os.remove(os.path.join(results_folder, file))
-                files_deleted += len(files)
+            files = list_analysis_files(results_folder)
+            files_deleted += remove_analyses([os.path.join(results_folder, file) for file in files])
         
         # 2. Clear file hash cache (THIS IS KEY!)
         if os.path.exists('file_hashes.json'):
             os.remove('file_hashes.json')
-            print("✅ Cleared file hash cache")
+            logger.info("✅ Cleared file hash cache")
         
         # 3. Clear upload history
         if os.path.exists('upload_history.json'):
             os.remove('upload_history.json')
-            print("✅ Cleared upload history")
+            logger.info("✅ Cleared upload history")
         
-        # 4. Clear inventory history
+        # 4. Clear inventory history and the per-product statistics built from it
         if os.path.exists('inventory_history.json'):
             os.remove('inventory_history.json')
-            print("✅ Cleared inventory history")
+            logger.info("✅ Cleared inventory history")
+        if os.path.exists(STATS_FILE):
+            os.remove(STATS_FILE)
+            logger.info("✅ Cleared product statistics")
+        
+        # 5. Clear alert notification state
+        if os.path.exists(ALERT_STATE_FILE):
+            os.remove(ALERT_STATE_FILE)
+            logger.info("✅ Cleared alert state")
         
-        # 5. Clear latest results pointer
+        # 6. Clear latest results pointer
         if os.path.exists('latest_results.txt'):
             os.remove('latest_results.txt')
-            print("✅ Cleared latest results")
+            logger.info("✅ Cleared latest results")
         
         flash(f'✅ All data cleared successfully! ({files_deleted} files removed)', 'success')
         
@@ -1066,13 +702,14 @@ def debug_files():
         'file_hashes.json': os.path.exists('file_hashes.json'),
         'upload_history.json': os.path.exists('upload_history.json'),
         'inventory_history.json': os.path.exists('inventory_history.json'),
+        STATS_FILE: os.path.exists(STATS_FILE),
         'latest_results.txt': os.path.exists('latest_results.txt'),
+        ALERT_STATE_FILE: os.path.exists(ALERT_STATE_FILE),
         'results_folder': os.path.exists(app.config['RESULTS_FOLDER']),
     }
     
     if os.path.exists('file_hashes.json'):
-        with open('file_hashes.json', 'r') as f:
-            files_info['cached_hashes'] = len(json.load(f))
+        files_info['cached_hashes'] = len(read_json('file_hashes.json', {}))
     
     return f"<pre>{json.dumps(files_info, indent=2)}</pre>"
 
@@ -1092,5 +729,16 @@ def clear_results():
         pass
     return redirect(url_for('index'))
 
+retention_manager = RetentionManager(app.config['UPLOAD_FOLDER'], app.config['RESULTS_FOLDER'])
+
+if os.environ.get('INVENTORY_EXPIRY_SCHEDULER', '1') != '0':
+    expiry_scheduler.start()
+
+if os.environ.get('INVENTORY_RETENTION', '1') != '0':
+    retention_manager.start()
+
+COLD_START_SECONDS.set(time.perf_counter() - IMPORT_STARTED)
+logger.info("🚀 App loaded in %.0f ms", (time.perf_counter() - IMPORT_STARTED) * 1000)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,152 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from logs import get_logger
+
+logger = get_logger('inventorypro.batch')
+
+RESULTS_FOLDER = os.path.join('static', 'results')
+
+EXIT_OK = 0
+EXIT_SOME_FAILED = 1
+EXIT_NO_INPUT = 2
+EXIT_ALL_FAILED = 3
+
+
+def find_inputs(patterns):
+    """Inventory files named by paths, directories (non-recursive) or glob patterns, without duplicates"""
+    from ingestion import supported_suffixes
+
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(path for path in glob.glob(os.path.join(pattern, '*'))
+                             if path.lower().endswith(tuple(supported_suffixes())))
+        else:
+            matches = sorted(glob.glob(pattern)) or ([pattern] if os.path.isfile(pattern) else [])
+        for path in matches:
+            if os.path.abspath(path) not in {os.path.abspath(f) for f in files}:
+                files.append(path)
+    return files
+
+
+def analyze_file(path, results_folder=RESULTS_FOLDER, charts=False, force=False, profile=False):
+    """Run the upload pipeline on one file; returns a summary dict (never raises).
+
+    With `profile`, reading, analysis and charts run under cProfile and tracemalloc and the
+    profile is saved next to the results."""
+    from ingestion import load_inventory
+    from profiling import profiler_for
+    from analysis import calculate_file_hash, save_file_hash, link_file_hash, release_file_hash, analyze_data, \
+        build_results, save_results_file
+
+    started = time.time()
+    filename = os.path.basename(path)
+    claimed = False
+    try:
+        file_hash = calculate_file_hash(path)
+        claimed = save_file_hash(file_hash, filename, int(started))
+        if not claimed and not force:
+            return {'file': path, 'status': 'duplicate'}
+
+        profiler = profiler_for(profile, filename)
+        with profiler.stage('read'):
+            df = load_inventory(path)
+        with profiler.stage('analyze'):
+            recommendations, expiry_alerts = analyze_data(df)
+        chart, gallery = None, None
+        if charts:
+            from charts import render_charts
+            with profiler.stage('chart'):
+                chart, gallery = render_charts(recommendations, serial=profiler.enabled)
+        results = build_results(recommendations, chart, filename, gallery)
+        results_file = save_results_file(results_folder, results)
+        link_file_hash(file_hash, results_file)
+        profiler.save(results_file)
+        return {
+            'file': path,
+            'status': 'ok',
+            'results_file': results_file,
+            'products': len(recommendations),
+            'critical': results['summary']['critical_count'],
+            'expiring': len(expiry_alerts),
+            'seconds': round(time.time() - started, 3),
+        }
+    except Exception as e:
+        logger.error("❌ %s: %s", path, e)
+        if claimed:
+            release_file_hash(file_hash)
+        return {'file': path, 'status': 'failed', 'error': str(e)}
+
+
+def send_alerts(outcomes):
+    """Queue alerts for every successful analysis through the normal de-duplication path"""
+    from alerts import get_recipients, send_combined_alerts
+    from results_format import load_results_file
+
+    recipients = get_recipients()
+    if not recipients:
+        logger.warning("⚠️ No alert recipients configured; skipping alerts")
+        return
+    for outcome in outcomes:
+        if outcome['status'] == 'ok':
+            recommendations = load_results_file(outcome['results_file'])['recommendations']
+            outcome['alerts'] = send_combined_alerts(recommendations, recipients) or []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze inventory files without the web app.')
+    parser.add_argument('inputs', nargs='+', help='inventory files (CSV, Excel, JSON Lines, .gz), directories or glob patterns')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='parallel processes')
+    parser.add_argument('--data-dir', default='.', help="the web app's working directory (default: .)")
+    parser.add_argument('--charts', action='store_true', help='render charts (imports matplotlib)')
+    parser.add_argument('--alerts', action='store_true', help='email alerts for new or escalated conditions')
+    parser.add_argument('--force', action='store_true', help='analyze files that were already uploaded')
+    parser.add_argument('--json', action='store_true', help='print one JSON summary instead of text')
+    parser.add_argument('--profile', action='store_true',
+                        help='save a CPU and memory profile next to each analysis (slower)')
+    args = parser.parse_args(argv)
+
+    inputs = [os.path.abspath(path) for path in find_inputs(args.inputs)]
+    if not inputs:
+        print("No inventory files matched.", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    os.chdir(args.data_dir)
+    workers = max(1, min(args.workers, len(inputs)))
+    options = {'charts': args.charts, 'force': args.force, 'profile': args.profile}
+    if workers == 1:
+        outcomes = [analyze_file(path, **options) for path in inputs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(analyze_file, path, **options) for path in inputs]
+            outcomes = [future.result() for future in futures]
+
+    if args.alerts:
+        send_alerts(outcomes)
+
+    if args.json:
+        print(json.dumps(outcomes, indent=2))
+    else:
+        for outcome in outcomes:
+            if outcome['status'] == 'ok':
+                print(f"✅ {outcome['file']}: {outcome['products']} products, {outcome['critical']} critical, "
+                      f"{outcome['expiring']} expiring -> {outcome['results_file']}")
+            elif outcome['status'] == 'duplicate':
+                print(f"⏭️  {outcome['file']}: already analyzed (use --force to re-run)")
+            else:
+                print(f"❌ {outcome['file']}: {outcome['error']}")
+
+    failed = sum(1 for outcome in outcomes if outcome['status'] == 'failed')
+    if failed == len(outcomes):
+        return EXIT_ALL_FAILED
+    return EXIT_SOME_FAILED if failed else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import base64
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis import days_left_number
+from config import get_config
+from logs import get_logger
+
+logger = get_logger('inventorypro.charts')
+
+# Products shown in the current vs ideal chart
+TOP_N = 8
+# Threads rendering charts; each keeps its own figures, so none are shared between threads
+CHART_WORKERS = 4
+
+STATUS_COLORS = {
+    'critical_understock': '#dc3545',
+    'understock': '#ffc107',
+    'optimal': '#28a745',
+    'overstock': '#17a2b8',
+    'critical_overstock': '#6f42c1',
+}
+EXPIRY_BUCKETS = [('Expired', None, -1), ('0-7 days', 0, 7), ('8-30 days', 8, 30), ('31-90 days', 31, 90),
+                  ('90+ days', 91, None)]
+TREND_LABELS = ['Growing ↗', 'Stable →', 'Declining ↘', 'New Product']
+
+# Figure templates: size and title per chart kind
+TEMPLATES = {
+    'stock': ((12, 6), 'Most Urgent: Current vs Ideal Stock'),
+    'status': ((6, 4), 'Status Distribution'),
+    'expiry': ((6, 4), 'Expiry Timeline'),
+    'trend': ((6, 4), 'Demand Trends'),
+}
+
+_local = threading.local()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix='charts')
+        return _pool
+
+
+def _figure(kind):
+    """This thread's figure for a chart kind, cleared and set up from its template.
+
+    Charts are drawn on matplotlib.figure.Figure objects rather than through pyplot, whose
+    global current-figure state is not thread-safe; reusing one figure per kind and thread
+    skips rebuilding it on every analysis."""
+    figures = getattr(_local, 'figures', None)
+    if figures is None:
+        figures = _local.figures = {}
+    size, title = TEMPLATES[kind]
+    figure = figures.get(kind)
+    if figure is None:
+        # matplotlib is only imported when a chart is actually rendered
+        from matplotlib.figure import Figure
+        figure = figures[kind] = Figure(figsize=size, dpi=100)
+    else:
+        figure.clear()
+    axes = figure.add_subplot()
+    axes.set_title(title, fontsize=16 if kind == 'stock' else 12, fontweight='bold')
+    axes.grid(axis='y', alpha=0.3)
+    return figure, axes
+
+
+def _data_url(figure):
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def urgency_scores(recommendations, horizon=None):
+    """Per product: how far stock is from its ideal level plus how close the expiry is.
+
+    The stock term is 1 - min(current, ideal) / max(current, ideal), so a third of the ideal
+    level and three times it weigh the same and an empty shelf scores 1; the expiry term
+    rises from 0 at `horizon` days (default expiry_alert_days) to 1 today."""
+    import numpy as np
+
+    horizon = float(horizon or get_config()['thresholds']['expiry_alert_days'])
+    n = len(recommendations)
+    current = np.fromiter((item.get('current_stock') or 0 for item in recommendations), dtype=float, count=n)
+    ideal = np.fromiter((item.get('ideal_stock_level', item.get('ideal_stock', 0)) or 0 for item in recommendations),
+                        dtype=float, count=n)
+    # no expiry date (None) becomes NaN
+    days = np.array([days_left_number(item.get('days_left')) for item in recommendations], dtype=float)
+    larger = np.maximum(current, ideal)
+    deviation = 1 - np.divide(np.minimum(current, ideal), larger, out=np.ones(n), where=larger > 0)
+    expiry = np.nan_to_num(np.clip(1 - days / horizon, 0, None), nan=0.0)
+    return deviation + expiry
+
+
+def top_urgent(recommendations, n=TOP_N):
+    """The `n` most urgent recommendations, most urgent first.
+
+    argpartition finds them in linear time over the whole analysis; only those n are sorted."""
+    import numpy as np
+
+    scores = urgency_scores(recommendations)
+    top = np.arange(len(scores)) if len(scores) <= n else np.argpartition(-scores, n - 1)[:n]
+    # ties keep file order
+    top = top[np.lexsort((top, -scores[top]))]
+    return [recommendations[i] for i in top]
+
+
+def _stock_chart(recommendations):
+    data = top_urgent(recommendations)
+    figure, axes = _figure('stock')
+    products = [str(item['product_name'])[:12] for item in data]
+    current = [item['current_stock'] for item in data]
+    ideal = [item.get('ideal_stock_level', item.get('ideal_stock', 0)) for item in data]
+
+    x = range(len(products))
+    width = 0.35
+    axes.bar([i - width/2 for i in x], current, width, label='Current Stock', color='#FF6B6B', alpha=0.8)
+    axes.bar([i + width/2 for i in x], ideal, width, label='Ideal Stock', color='#4ECDC4', alpha=0.8)
+    axes.set_xlabel('Products', fontweight='bold')
+    axes.set_ylabel('Stock Quantity', fontweight='bold')
+    axes.set_xticks(list(x))
+    axes.set_xticklabels(products, rotation=45, ha='right')
+    axes.legend()
+    figure.tight_layout()
+    return _data_url(figure)
+
+
+def _status_chart(recommendations):
+    figure, axes = _figure('status')
+    counts = {status: 0 for status in STATUS_COLORS}
+    for item in recommendations:
+        if item.get('status') in counts:
+            counts[item['status']] += 1
+    labels = [status.replace('_', ' ').title() for status in counts]
+    axes.bar(labels, list(counts.values()), color=list(STATUS_COLORS.values()), alpha=0.85)
+    axes.set_ylabel('Products', fontweight='bold')
+    axes.tick_params(axis='x', labelrotation=30)
+    figure.tight_layout()
+    return _data_url(figure)
+
+
+def _expiry_chart(recommendations):
+    figure, axes = _figure('expiry')
+    counts = [0] * len(EXPIRY_BUCKETS)
+    for item in recommendations:
+        days = days_left_number(item.get('days_left'))
+        if days is None:
+            continue
+        for position, (_, low, high) in enumerate(EXPIRY_BUCKETS):
+            if (low is None or days >= low) and (high is None or days <= high):
+                counts[position] += 1
+                break
+    axes.bar([label for label, _, _ in EXPIRY_BUCKETS], counts,
+             color=['#6c757d', '#dc3545', '#ffc107', '#17a2b8', '#28a745'], alpha=0.85)
+    axes.set_ylabel('Products', fontweight='bold')
+    figure.tight_layout()
+    return _data_url(figure)
+
+
+def _trend_chart(recommendations):
+    figure, axes = _figure('trend')
+    counts = {label: 0 for label in TREND_LABELS}
+    for item in recommendations:
+        if item.get('trend') in counts:
+            counts[item['trend']] += 1
+    axes.barh(list(counts), list(counts.values()), color=['#28a745', '#17a2b8', '#dc3545', '#6c757d'], alpha=0.85)
+    axes.set_xlabel('Products', fontweight='bold')
+    axes.invert_yaxis()
+    figure.tight_layout()
+    return _data_url(figure)
+
+
+GALLERY = {'status': _status_chart, 'expiry': _expiry_chart, 'trend': _trend_chart}
+
+
+def _render(kind, draw, recommendations):
+    try:
+        return draw(recommendations)
+    except Exception as e:
+        logger.error("Chart error (%s): %s", kind, e)
+        return None
+
+
+def create_chart(recommendations):
+    """Current vs ideal stock bar chart of the most urgent products, as a data: URL"""
+    return _render('stock', _stock_chart, recommendations)
+
+
+def render_charts(recommendations, serial=False):
+    """(stock chart, {gallery chart: data URL}), all rendered concurrently in the chart pool,
+    or one after another in the calling thread with `serial` (so a profiler sees the work)"""
+    if serial:
+        gallery = {kind: _render(kind, draw, recommendations) for kind, draw in GALLERY.items()}
+        return _render('stock', _stock_chart, recommendations), {kind: url for kind, url in gallery.items() if url}
+    pool = _executor()
+    stock = pool.submit(_render, 'stock', _stock_chart, recommendations)
+    gallery = {kind: pool.submit(_render, kind, draw, recommendations) for kind, draw in GALLERY.items()}
+    gallery = {kind: future.result() for kind, future in gallery.items()}
+    return stock.result(), {kind: url for kind, url in gallery.items() if url}
@@ -0,0 +1,237 @@
+import copy
+import json
+import os
+import threading
+import time
+
+from logs import get_logger
+
+logger = get_logger('inventorypro.config')
+
+CONFIG_FILE = os.environ.get('INVENTORY_CONFIG', 'config.json')
+RECEIVER_EMAIL_FILE = 'receiver_email.txt'
+
+# How often (seconds) the config files' mtimes are checked for hot reload
+CHECK_INTERVAL = 2.0
+
+DEFAULTS = {
+    'receiver_email': None,
+    'admin_token': None,
+    'smtp': {
+        'server': 'smtp.gmail.com',
+        'port': 587,
+        'use_tls': True,
+        # no default account: set both in config.json (or INVENTORY_SMTP_SENDER / INVENTORY_SMTP_PASSWORD);
+        # a sender_password of "" sends through a relay without logging in
+        'sender_email': None,
+        'sender_password': None,
+        'rate_per_second': 2.0,
+        'burst': 10,
+        'workers': 4,
+    },
+    'thresholds': {
+        'critical_understock': 0.3,
+        'understock': 0.7,
+        'overstock': 1.3,
+        'critical_overstock': 2.0,
+        'expiry_alert_days': 30,
+        'expiry_soon_days': 7,
+    },
+    'category_multipliers': [
+        {'keywords': ['milk', 'bread', 'egg', 'yogurt'], 'multiplier': 2.0},
+        {'keywords': ['rice', 'oil', 'sugar', 'flour'], 'multiplier': 1.8},
+        {'keywords': ['fruit', 'vegetable', 'meat', 'fish', 'cheese'], 'multiplier': 1.3},
+    ],
+    'default_multiplier': 1.5,
+    'alerts': {
+        'renotify_hours': 24.0,
+        'inline_limit': 25,
+    },
+    'retention': {
+        'uploads': {'max_age_days': 1, 'max_count': None, 'max_bytes': None},
+        'results': {'max_age_days': None, 'max_count': 200, 'max_bytes': 500 * 1024 * 1024},
+    },
+    'purchasing': {
+        # None = unconstrained: every understocked product is ordered up to its ideal level
+        'budget': None,
+        'capacity_units': None,
+        'default_unit_cost': 1.0,
+        'default_min_order_qty': 0,
+        'priority_weights': {'critical_understock': 10.0, 'understock': 3.0},
+        'time_limit_seconds': 5.0,
+    },
+    'transfers': {
+        # per-unit cost (or distance) between stores: {"north": {"south": 12.5}}; a pair listed
+        # one way applies both ways, and unlisted pairs cost default_cost (None = not allowed)
+        'costs': {},
+        'default_cost': 1.0,
+        'max_cost': None,
+        # how strongly surplus near expiry is preferred over cheaper fresh surplus
+        'expiry_weight': 1.0,
+    },
+}
+
+# Environment variables that override individual settings: name -> (path, type)
+ENV_OVERRIDES = {
+    'INVENTORY_SMTP_SERVER': (('smtp', 'server'), str),
+    'INVENTORY_SMTP_PORT': (('smtp', 'port'), int),
+    'INVENTORY_SMTP_SENDER': (('smtp', 'sender_email'), str),
+    'INVENTORY_SMTP_PASSWORD': (('smtp', 'sender_password'), str),
+    'INVENTORY_SMTP_RATE': (('smtp', 'rate_per_second'), float),
+    'INVENTORY_SMTP_BURST': (('smtp', 'burst'), int),
+    'INVENTORY_SMTP_WORKERS': (('smtp', 'workers'), int),
+    'INVENTORY_EMAIL_INLINE_LIMIT': (('alerts', 'inline_limit'), int),
+    'INVENTORY_ALERT_RENOTIFY_HOURS': (('alerts', 'renotify_hours'), float),
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _merge(base, override):
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def validate_thresholds(t):
+    """Raise ConfigError unless the status cut-offs and expiry windows are consistently ordered"""
+    if not 0 <= t['critical_understock'] < t['understock'] <= 1 <= t['overstock'] < t['critical_overstock']:
+        raise ConfigError("thresholds must satisfy critical_understock < understock <= 1 <= overstock < critical_overstock")
+    if not 0 <= t['expiry_soon_days'] < t['expiry_alert_days']:
+        raise ConfigError("thresholds.expiry_soon_days must be smaller than expiry_alert_days")
+
+
+def validate(config):
+    """Raise ConfigError if the merged configuration is unusable"""
+    smtp = config['smtp']
+    if not 0 < int(smtp['port']) < 65536:
+        raise ConfigError(f"smtp.port out of range: {smtp['port']}")
+    if float(smtp['rate_per_second']) <= 0 or int(smtp['burst']) < 1 or int(smtp['workers']) < 1:
+        raise ConfigError("smtp.rate_per_second, smtp.burst and smtp.workers must be positive")
+    for email in (config['receiver_email'], smtp['sender_email']):
+        if email and '@' not in email:
+            raise ConfigError(f"invalid email address: {email}")
+
+    validate_thresholds(config['thresholds'])
+
+    for rule in config['category_multipliers']:
+        if not rule.get('keywords') or float(rule.get('multiplier', 0)) <= 0:
+            raise ConfigError(f"invalid category multiplier rule: {rule}")
+    if float(config['default_multiplier']) <= 0:
+        raise ConfigError("default_multiplier must be positive")
+
+    if int(config['alerts']['inline_limit']) < 1 or float(config['alerts']['renotify_hours']) < 0:
+        raise ConfigError("alerts.inline_limit must be >= 1 and alerts.renotify_hours >= 0")
+    purchasing = config['purchasing']
+    for key in ('budget', 'capacity_units'):
+        if purchasing[key] is not None and purchasing[key] < 0:
+            raise ConfigError(f"purchasing.{key} must not be negative")
+    if purchasing['default_unit_cost'] < 0 or purchasing['default_min_order_qty'] < 0 \
+            or purchasing['time_limit_seconds'] <= 0:
+        raise ConfigError("purchasing defaults must not be negative and time_limit_seconds must be positive")
+    transfers = config['transfers']
+    unit_costs = [cost for destinations in transfers['costs'].values() for cost in destinations.values()]
+    if any(cost is not None and cost < 0 for cost in unit_costs + [transfers['default_cost'], transfers['max_cost']]) \
+            or transfers['expiry_weight'] < 0:
+        raise ConfigError("transfers costs and expiry_weight must not be negative")
+    for store, policy in config['retention'].items():
+        for key in ('max_age_days', 'max_count', 'max_bytes'):
+            if policy.get(key) is not None and policy[key] < 0:
+                raise ConfigError(f"retention.{store}.{key} must not be negative")
+
+
+class ConfigService:
+    """Configuration loaded once, validated, and hot-reloaded when its files change.
+
+    config.json is the source of truth shared by all worker processes; each
+    process only stats the files every CHECK_INTERVAL seconds and reloads when
+    an mtime changed. receiver_email.txt (written by Email Settings) supplies
+    `receiver_email`, and a few INVENTORY_* environment variables override values.
+    """
+
+    def __init__(self, path=CONFIG_FILE, receiver_path=RECEIVER_EMAIL_FILE, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.receiver_path = receiver_path
+        self.check_interval = check_interval
+        self._config = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _mtimes(self):
+        signature = []
+        for path in (self.path, self.receiver_path):
+            try:
+                signature.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load(self):
+        config = copy.deepcopy(DEFAULTS)
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                _merge(config, json.load(f))
+        try:
+            with open(self.receiver_path) as f:
+                config['receiver_email'] = f.read().strip() or config['receiver_email']
+        except OSError:
+            pass
+        for name, (path, cast) in ENV_OVERRIDES.items():
+            if os.environ.get(name):
+                section = config
+                for key in path[:-1]:
+                    section = section[key]
+                section[path[-1]] = cast(os.environ[name])
+        validate(config)
+        return config
+
+    def reload(self):
+        """Re-read the config files now. An invalid config raises its error (ConfigError, or the
+        JSON parse error) and the previous values stay in use."""
+        with self._lock:
+            signature = self._mtimes()
+            try:
+                config = self._load()
+            except Exception as e:
+                if self._config is not None:
+                    logger.error("❌ Invalid configuration in %s, keeping previous values: %s", self.path, e)
+                    # the same broken file is not re-read on every check
+                    self._signature = signature
+                    self._checked_at = time.monotonic()
+                raise
+            self._config = config
+            logger.info("⚙️ Configuration loaded from %s", self.path)
+            self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._config
+
+    def get(self):
+        now = time.monotonic()
+        if self._config is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if self._config is None or self._mtimes() != self._signature:
+                try:
+                    return self.reload()
+                except Exception:
+                    # hot reload keeps serving the previous values; reload() logged the error
+                    if self._config is None:
+                        raise
+        return self._config
+
+    def touch(self):
+        """Bump config.json's mtime so every worker process reloads on its next check"""
+        if os.path.exists(self.path):
+            os.utime(self.path)
+
+
+config_service = ConfigService()
+
+
+def get_config():
+    return config_service.get()
@@ -0,0 +1,192 @@
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, date, timedelta
+
+from config import get_config
+from logs import get_logger
+from storage import locked, try_lock
+from results_format import load_results_file, write_results_file
+
+logger = get_logger('inventorypro.expiry_scheduler')
+
+
+# Upper bound on a single sleep: how soon analyses saved by other workers (and
+# wall-clock jumps) are picked up
+POLL_SECONDS = 60
+# Held by the one process per host that runs the scheduler
+LEADER_LOCK_FILE = 'expiry_scheduler.lock'
+LEADER_RETRY_SECONDS = 60
+# All the scheduler reads from an analysis
+TRACKED_COLUMNS = ['product_id', 'expiry_date', 'days_left']
+
+
+def days_left_text(delta_days):
+    if delta_days < 0:
+        return "Expired"
+    if delta_days == 0:
+        return "Expires Today"
+    return str(delta_days)
+
+
+def thresholds():
+    """Days-left values at which a product's expiry status changes:
+    enters the alert window (30), the expiring-soon window (7), expires today, expired"""
+    t = get_config()['thresholds']
+    return (t['expiry_alert_days'], t['expiry_soon_days'], 0, -1)
+
+
+def threshold_bucket(delta_days):
+    """How many thresholds a product with `delta_days` left has crossed"""
+    return sum(1 for days in thresholds() if delta_days <= days)
+
+
+def stored_bucket(days_left):
+    if days_left == 'Expired':
+        return threshold_bucket(-1)
+    if days_left == 'Expires Today':
+        return threshold_bucket(0)
+    if str(days_left).lstrip('-').isdigit():
+        return threshold_bucket(int(days_left))
+    return None
+
+
+def next_crossing(expiry, today):
+    """First day after `today` on which the product crosses a threshold, or None"""
+    for days in thresholds():
+        day = expiry - timedelta(days=days)
+        if day > today:
+            return day
+    return None
+
+
+class ExpiryScheduler:
+    """Keeps known expiry dates in a min-heap keyed by their next threshold crossing.
+
+    The worker thread sleeps until the earliest crossing, refreshes `days_left` for
+    just the rows that crossed, rewrites them in the tracked results file and hands
+    them to `on_due` for alerting. Nothing rescans the full catalog. Entries are keyed
+    by row position, since one product_id can have several rows (stores, lots).
+
+    Only one scheduler per host runs: the thread first takes a non-blocking flock on
+    `lock_path` (retrying while another worker holds it), and on every wake-up asks
+    `latest()` for the latest analysis, so uploads saved by any worker are tracked.
+    """
+
+    def __init__(self, on_due, latest=None, lock_path=LEADER_LOCK_FILE):
+        self.on_due = on_due
+        self.latest = latest
+        self.lock_path = lock_path
+        self._heap = []
+        self._results_file = None
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._woken = False
+        self._leader_lock = None
+        self._thread = None
+
+    def track(self, results_file, recommendations):
+        """Replace the tracked products with those of a newly saved analysis"""
+        today = date.today()
+        heap = []
+        for row, item in enumerate(recommendations):
+            try:
+                expiry = datetime.strptime(item.get('expiry_date', ''), '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                continue
+            if stored_bucket(item.get('days_left')) != threshold_bucket((expiry - today).days):
+                # saved status is already stale (e.g. results loaded at start-up): refresh now
+                crossing = today
+            else:
+                crossing = next_crossing(expiry, today)
+            if crossing is not None:
+                heap.append((crossing, row, str(item.get('product_id')), expiry))
+        heapq.heapify(heap)
+        with self._cond:
+            self._heap = heap
+            self._results_file = results_file
+            self._generation += 1
+            self._cond.notify()
+        logger.info("⏰ Tracking %d expiry dates from %s", len(heap), results_file)
+
+    def refresh(self):
+        """Track the latest analysis if it is not the one already tracked"""
+        results_file = self.latest() if self.latest else None
+        if results_file and results_file != self._results_file:
+            recommendations = load_results_file(results_file, TRACKED_COLUMNS)['recommendations']
+            self.track(results_file, recommendations)
+
+    def wake(self):
+        """Look for a new analysis now instead of at the next poll"""
+        with self._cond:
+            self._woken = True
+            self._cond.notify()
+
+    def lead(self):
+        """Try to become this host's scheduler; True while this process holds the leader lock"""
+        if self._leader_lock is None:
+            self._leader_lock = try_lock(self.lock_path)
+        return self._leader_lock is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='expiry-scheduler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self.lead():
+            time.sleep(LEADER_RETRY_SECONDS)
+        logger.info("⏰ Expiry scheduler running in process %d", os.getpid())
+        while True:
+            try:
+                self.refresh()
+                results_file, generation, due, today = self._next_due()
+                if due:
+                    self._process(results_file, generation, due, today)
+            except Exception as e:
+                logger.error("❌ Expiry re-evaluation failed: %s", e)
+
+    def _next_due(self):
+        """Sleep until the earliest crossing, the next poll or wake(); then pop what is due"""
+        with self._cond:
+            if not self._woken:
+                timeout = POLL_SECONDS
+                if self._heap:
+                    wake_at = datetime.combine(self._heap[0][0], datetime.min.time()).timestamp()
+                    timeout = min(max(wake_at - time.time(), 0), POLL_SECONDS)
+                if timeout:
+                    self._cond.wait(timeout=timeout)
+            self._woken = False
+            today = date.today()
+            due = []
+            while self._heap and self._heap[0][0] <= today:
+                due.append(heapq.heappop(self._heap))
+            return self._results_file, self._generation, due, today
+
+    def _process(self, results_file, generation, due, today):
+        days_by_row = {}
+        with self._cond:
+            if generation != self._generation:
+                # a newer analysis replaced the one these entries came from
+                return
+            for _, row, product_id, expiry in due:
+                days_by_row[row] = (product_id, (expiry - today).days)
+                crossing = next_crossing(expiry, today)
+                if crossing is not None:
+                    heapq.heappush(self._heap, (crossing, row, product_id, expiry))
+
+        with locked(results_file):
+            data = load_results_file(results_file)
+            recommendations = data.get('recommendations', [])
+            updated = []
+            for row, (product_id, delta) in sorted(days_by_row.items()):
+                # rows keep their order for the life of a results file; skip any that do not line up
+                if row < len(recommendations) and str(recommendations[row].get('product_id')) == product_id:
+                    recommendations[row]['days_left'] = days_left_text(delta)
+                    updated.append(recommendations[row])
+            write_results_file(results_file, data)
+
+        logger.info("⏰ %d products crossed an expiry threshold in %s", len(updated), results_file)
+        if updated:
+            self.on_due(updated)
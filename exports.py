@@ -0,0 +1,116 @@
+import csv
+import importlib.util
+import io
+import os
+import tempfile
+import zlib
+
+from results_format import iter_records
+
+EXPORT_COLUMNS = ['product_id', 'product_name', 'current_stock', 'ideal_stock_level', 'trend', 'status',
+                  'priority', 'action', 'expiry_date', 'days_left']
+
+# Rows buffered before a CSV chunk is yielded, and bytes per chunk when streaming a file
+ROWS_PER_CHUNK = 500
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+def parse_filters(args):
+    """Results-view filters from a query string:
+    status (repeatable; 'critical' matches both critical statuses), priority (repeatable),
+    q (product id/name substring) and expiring (days; includes expired products)"""
+    filters = {}
+    statuses = {s for s in args.getlist('status') if s}
+    priorities = {p.upper() for p in args.getlist('priority') if p}
+    if statuses:
+        filters['status'] = statuses
+    if priorities:
+        filters['priority'] = priorities
+    if args.get('q', '').strip():
+        filters['q'] = args.get('q').strip().lower()
+    if args.get('expiring', '').strip().isdigit():
+        filters['expiring'] = int(args.get('expiring'))
+    return filters
+
+
+def matches(row, filters):
+    status = row.get('status', '')
+    if 'status' in filters and status not in filters['status'] \
+            and not ('critical' in filters['status'] and 'critical' in status):
+        return False
+    if 'priority' in filters and row.get('priority') not in filters['priority']:
+        return False
+    if 'q' in filters and filters['q'] not in f"{row.get('product_id', '')} {row.get('product_name', '')}".lower():
+        return False
+    if 'expiring' in filters:
+        days_left = str(row.get('days_left', ''))
+        if days_left not in ('Expired', 'Expires Today') \
+                and not (days_left.isdigit() and int(days_left) <= filters['expiring']):
+            return False
+    return True
+
+
+def filter_recommendations(rows, filters):
+    """Lazily yield the rows that pass `filters`"""
+    return (row for row in rows if matches(row, filters)) if filters else iter(rows)
+
+
+def iter_export_rows(results_file, filters):
+    return filter_recommendations(iter_records(results_file, EXPORT_COLUMNS), filters)
+
+
+def csv_stream(rows, columns=EXPORT_COLUMNS):
+    """Yield the CSV as UTF-8 chunks of ROWS_PER_CHUNK rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress a byte stream chunk by chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def xlsx_available():
+    """Whether openpyxl is installed, checked without importing it"""
+    return importlib.util.find_spec('openpyxl') is not None
+
+
+def xlsx_stream(rows, columns=EXPORT_COLUMNS, sheet_title='Recommendations'):
+    """Write rows with openpyxl's write-only workbook to a temp file, then yield it in chunks.
+
+    The import only happens once the response has started, so check xlsx_available() first."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([row.get(column) for column in columns])
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
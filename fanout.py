@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import get_config
+from logs import get_logger
+from metrics import EMAILS, timed
+
+logger = get_logger('inventorypro.fanout')
+
+RECIPIENTS_FILE = 'recipients.json'
+ALL_ALERT_TYPES = ('understock', 'overstock', 'expiry')
+
+# Substituted per recipient into the message serialized once per audience
+TO_PLACEHOLDER = 'fanout-recipient@invalid'
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, at most `capacity` saved up"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+
+def shared_bucket(rate=None, burst=None):
+    """The process-wide bucket every dispatch draws from, so concurrent alert runs share one
+    relay quota (smtp.rate_per_second, smtp.burst); rebuilt when those settings change.
+    Worker processes each have their own bucket, so N workers may send N times the rate."""
+    global _bucket
+    smtp = get_config()['smtp']
+    rate, burst = rate or smtp['rate_per_second'], burst or smtp['burst']
+    with _bucket_lock:
+        if _bucket is None or (_bucket.rate, _bucket.capacity) != (rate, max(1, burst)):
+            _bucket = TokenBucket(rate, burst)
+        return _bucket
+
+
+def load_recipients(path=RECIPIENTS_FILE, fallback_email=None):
+    """Recipients from recipients.json, or the single receiver_email.txt address.
+
+    recipients.json: {"roles": {"buyer": ["understock", "overstock"]},
+                      "recipients": [{"email": "...", "role": "buyer", "stores": ["S1"]}]}
+    A recipient without a role gets every alert type; without stores, every store.
+    """
+    recipients = []
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+        roles = config.get('roles', {})
+        for entry in config.get('recipients', []):
+            email = str(entry.get('email', '')).strip()
+            if not email:
+                continue
+            alert_types = entry.get('alerts') or roles.get(entry.get('role'), ALL_ALERT_TYPES)
+            recipients.append({
+                'email': email,
+                'alerts': tuple(sorted(set(alert_types))),
+                'stores': tuple(sorted(str(store) for store in entry.get('stores', []))),
+            })
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error("Error reading %s: %s", path, e)
+
+    if fallback_email and fallback_email not in {r['email'] for r in recipients}:
+        recipients.append({'email': fallback_email, 'alerts': tuple(sorted(ALL_ALERT_TYPES)), 'stores': ()})
+    return recipients
+
+
+def group_audiences(recipients):
+    """Group recipients that would receive identical content: {(alerts, stores): [emails]}"""
+    audiences = {}
+    for recipient in recipients:
+        audiences.setdefault((recipient['alerts'], recipient['stores']), []).append(recipient['email'])
+    return audiences
+
+
+def select_items(items, audience, alert_type_fn):
+    """Items of an alert type this audience subscribes to, at its stores"""
+    alert_types, stores = audience
+    stores = set(stores)
+    return [item for item in items
+            if alert_type_fn(item) in alert_types
+            and (not stores or 'store' not in item or str(item['store']) in stores)]
+
+
+class FanoutDispatcher:
+    """Sends pre-serialized messages to many recipients through a bounded, rate-limited pool"""
+
+    def __init__(self, connect, sender, workers=None, rate=None, burst=None):
+        # defaults match the relay quota: smtp.rate_per_second, smtp.burst, smtp.workers
+        smtp = get_config()['smtp']
+        self.connect = connect
+        self.sender = sender
+        self.workers = workers or smtp['workers']
+        self.bucket = shared_bucket(rate, burst)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _server(self):
+        # one SMTP session per worker thread, reused for all of its messages
+        server = getattr(self._local, 'server', None)
+        if server is None:
+            server = self._local.server = self.connect()
+            with self._lock:
+                self._connections.append(server)
+        return server
+
+    def _send_one(self, kind, email, raw):
+        self.bucket.acquire()
+        try:
+            try:
+                self._server().sendmail(self.sender, [email], raw.replace(TO_PLACEHOLDER, email, 1))
+            except Exception:
+                # the pooled session may have timed out; reconnect once
+                self._local.server = None
+                self._server().sendmail(self.sender, [email], raw.replace(TO_PLACEHOLDER, email, 1))
+            EMAILS.inc(alert=kind, outcome='sent')
+            return kind, email, True
+        except Exception as e:
+            EMAILS.inc(alert=kind, outcome='failed')
+            logger.error("❌ Error sending %s alert to %s: %s", kind, email, e)
+            return kind, email, False
+
+    def dispatch(self, jobs):
+        """jobs: [(kind, [emails], raw_message)]; returns the number of successful sends of each job"""
+        tasks = [(job, email, raw) for job, (_, emails, raw) in enumerate(jobs) for email in emails]
+        sent = [0] * len(jobs)
+        if not tasks:
+            return sent
+        with timed('smtp'):
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+                results = pool.map(lambda task: self._send_one(jobs[task[0]][0], task[1], task[2]), tasks)
+                for (job, _, _), (_, _, ok) in zip(tasks, results):
+                    sent[job] += ok
+            for server in self._connections:
+                try:
+                    server.quit()
+                except Exception:
+                    pass
+            self._connections = []
+        totals = {}
+        for (kind, _, _), count in zip(jobs, sent):
+            totals[kind] = totals.get(kind, 0) + count
+        logger.info("📬 Fan-out complete: %s", ", ".join(f"{kind}={count}" for kind, count in totals.items()))
+        return sent
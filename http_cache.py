@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+
+from flask import Response, make_response, request, session
+
+# Text responses smaller than this are sent uncompressed; gzip would barely help
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+                      'application/javascript', 'application/json'}
+# Static files are read into memory to compress them only up to this size
+STATIC_COMPRESS_MAX_BYTES = 1024 * 1024
+
+# Static assets whose URLs carry a content fingerprint (?v=<hash>) and may be cached for a year
+FINGERPRINT_SUFFIXES = ('.css', '.js')
+FINGERPRINT_MAX_AGE = 365 * 24 * 3600
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def template_version(folder):
+    """Hash of the templates' contents, so cached pages are revalidated after a deploy"""
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(name.encode() + f.read())
+    return digest.hexdigest()[:12]
+
+
+def asset_fingerprint(static_folder, filename):
+    """Short content hash of a static asset (recomputed only when its mtime or size changes),
+    or None for files that are not fingerprinted"""
+    if not filename.endswith(FINGERPRINT_SUFFIXES):
+        return None
+    path = os.path.join(static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _fingerprints_lock:
+        cached = _fingerprints.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, 'rb') as f:
+        fingerprint = hashlib.sha1(f.read()).hexdigest()[:12]
+    with _fingerprints_lock:
+        _fingerprints[path] = (key, fingerprint)
+    return fingerprint
+
+
+def validators(paths, extra=()):
+    """(ETag, Last-Modified) of a page built from the files or folders in `paths`.
+
+    A results file keeps its name (the analysis id) for life but is rewritten in place when
+    expiry statuses are re-evaluated, and a folder's mtime moves whenever an analysis is
+    added or removed (the index version), so both go into the tag with the request's query
+    string and `extra` (the template version)."""
+    parts = [request.path, request.query_string.decode(), *extra]
+    newest = 0
+    for path in paths:
+        stat = os.stat(path)
+        parts += [os.path.basename(path), stat.st_mtime_ns, stat.st_size]
+        newest = max(newest, stat.st_mtime)
+    etag = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return etag, datetime.fromtimestamp(int(newest), timezone.utc)
+
+
+def not_modified(etag, last_modified):
+    """Whether the client's cached copy is current. Never while flash messages are pending,
+    since the cached page would not show them."""
+    if '_flashes' in session:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+
+def conditional_page(render, paths, extra=()):
+    """`render()`'s response with validators, or an empty 304 when the client already has it.
+
+    The tag is weak: the page may be sent gzip-compressed or not."""
+    try:
+        etag, last_modified = validators(paths, extra)
+    except OSError:
+        # removed while the request was in flight: render without validators
+        return make_response(render())
+    if not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+    if response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        # cached, but revalidated on every visit
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+    return response
+
+
+def cache_static(response, static_folder):
+    """Year-long caching for a fingerprinted static asset requested with its current hash
+    (a stale ?v= keeps the default revalidation)"""
+    if request.endpoint != 'static' or response.status_code not in (200, 304):
+        return response
+    version = request.args.get('v')
+    if version and version == asset_fingerprint(static_folder, (request.view_args or {}).get('filename', '')):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = FINGERPRINT_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def compress_response(response):
+    """Gzip a text response of COMPRESS_MIN_BYTES or more when the client accepts gzip"""
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    if response.direct_passthrough:
+        # static files are served straight from disk; small ones are read in to compress them
+        if request.endpoint != 'static' or (response.content_length or STATIC_COMPRESS_MAX_BYTES + 1) \
+                > STATIC_COMPRESS_MAX_BYTES:
+            return response
+        response.direct_passthrough = False
+    elif response.is_streamed:
+        # exports and progress events stream as they are produced
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, COMPRESS_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,285 @@
+import importlib.util
+import os
+import re
+
+from logs import get_logger
+from metrics import PARSE_FAILURES
+
+logger = get_logger('inventorypro.ingestion')
+
+# Canonical inventory schema handed to the analysis, with the header names each column
+# is recognised by (compared lower-case, with spaces and dashes read as underscores).
+# Where a file has several matching columns, the earliest alias wins.
+COLUMN_ALIASES = {
+    'product_id': ['product_id', 'sku', 'item_id', 'product_code', 'item_code', 'id'],
+    'product_name': ['product_name', 'name', 'item_name', 'product', 'item', 'description'],
+    'current_stock': ['current_stock', 'stock', 'quantity', 'qty', 'on_hand', 'stock_level'],
+    'ideal_stock_level': ['ideal_stock_level', 'ideal_stock', 'target_stock', 'par_level'],
+    'expiry_date': ['expiry_date', 'expiry', 'expiration_date', 'expiration', 'exp_date', 'best_before',
+                    'use_by'],
+    'store': ['store', 'store_id', 'location', 'branch', 'site'],
+    'lot': ['lot', 'lot_number', 'lot_no', 'batch', 'batch_number'],
+    'unit_cost': ['unit_cost', 'cost', 'unit_price', 'cost_price'],
+    'min_order_qty': ['min_order_qty', 'moq', 'min_order', 'minimum_order_quantity'],
+}
+CANONICAL_COLUMNS = list(COLUMN_ALIASES)
+ID_COLUMNS = ['product_id', 'product_name']
+STOCK_COLUMNS = ['current_stock', 'ideal_stock_level']
+NUMERIC_COLUMNS = STOCK_COLUMNS + ['unit_cost', 'min_order_qty']
+EXPIRY_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S']
+
+# Loading profile: ids, names, stores, lots and raw expiry dates repeat across rows, so they are
+# stored once per distinct value; stock, costs and order minimums fit in float32 (exact for whole
+# numbers up to 16 million)
+LOAD_DTYPES = {column: 'float32' if column in NUMERIC_COLUMNS else 'category' for column in CANONICAL_COLUMNS}
+
+# CSV and JSON Lines files are parsed this many rows at a time, so only one chunk of raw
+# strings is alive at once
+CSV_CHUNK_ROWS = 50000
+JSONL_CHUNK_ROWS = 50000
+# Text columns whose distinct values exceed this share of the rows (unique product ids) stay
+# plain strings: every value is stored anyway, and a dictionary would add codes and a hash table
+CATEGORY_MAX_SHARE = 0.9
+# ...judged once this many rows are in (the first rows of a file sorted by store are all distinct)
+PLAIN_TEXT_MIN_ROWS = 200000
+
+# file suffix -> reader(path, columns) returning the recognised columns under canonical names
+ADAPTERS = {}
+
+
+def adapter(*suffixes):
+    """Register a reader for files ending in any of `suffixes`"""
+    def register(reader):
+        for suffix in suffixes:
+            ADAPTERS[suffix] = reader
+        return reader
+    return register
+
+
+def supported_suffixes():
+    return sorted(ADAPTERS, key=len, reverse=True)
+
+
+def upload_extensions():
+    """Last extension of each supported suffix, for upload form validation"""
+    return sorted({suffix.rsplit('.', 1)[-1] for suffix in ADAPTERS})
+
+
+def adapter_for(filename):
+    name = filename.lower()
+    for suffix in supported_suffixes():
+        if name.endswith(suffix):
+            return ADAPTERS[suffix]
+    raise ValueError(f"Unsupported file type: {os.path.basename(filename)} "
+                     f"(supported: {', '.join(sorted(ADAPTERS))})")
+
+
+def _normalize_header(name):
+    return re.sub(r'[\s\-]+', '_', str(name).strip().lower())
+
+
+def resolve_columns(header, columns=None):
+    """{source column: canonical column} for a file's header, resolved once per file"""
+    by_name = {}
+    for source in header:
+        by_name.setdefault(_normalize_header(source), source)
+    mapping = {}
+    for canonical in columns or CANONICAL_COLUMNS:
+        for alias in COLUMN_ALIASES[canonical]:
+            if alias in by_name and by_name[alias] not in mapping:
+                mapping[by_name[alias]] = canonical
+                break
+    return mapping
+
+
+def canonical_frame(df, columns=None):
+    """`df` restricted to the recognised columns, renamed to the canonical schema"""
+    mapping = resolve_columns(df.columns, columns)
+    if all(source == canonical for source, canonical in mapping.items()) and len(mapping) == len(df.columns):
+        return df
+    return df[list(mapping)].rename(columns=mapping)
+
+
+class ColumnBuilder:
+    """Assembles one column from chunks. Text is dictionary-encoded into int32 codes over one
+    dictionary shared by all chunks (per-chunk categoricals would each repeat it), until the
+    rows so far show the column is nearly unique; then it is kept as plain strings."""
+
+    def __init__(self, text):
+        import pandas as pd
+
+        self.text = text
+        self.plain = not text
+        self.categories = pd.Index([], dtype=object)
+        self.parts = []
+        self.rows = 0
+
+    def add(self, values):
+        import numpy as np
+        import pandas as pd
+
+        self.rows += len(values)
+        if self.plain:
+            self.parts.append(np.asarray(values, dtype=object) if self.text else values.to_numpy())
+            return
+        codes, uniques = pd.factorize(values.to_numpy())
+        uniques = pd.Index(uniques, dtype=object)
+        new = uniques[~uniques.isin(self.categories)]
+        if len(new):
+            self.categories = self.categories.append(new)
+        to_shared = self.categories.get_indexer(uniques).astype(np.int32)
+        self.parts.append(np.where(codes >= 0, to_shared[codes], -1).astype(np.int32))
+        if self.rows >= PLAIN_TEXT_MIN_ROWS and len(self.categories) > CATEGORY_MAX_SHARE * self.rows:
+            # nearly unique: decode what was collected and keep the column plain from here on
+            categories = np.append(np.asarray(self.categories, dtype=object), None)
+            self.parts = [categories[part] for part in self.parts]
+            self.categories = pd.Index([], dtype=object)
+            self.plain = True
+
+    def build(self):
+        import numpy as np
+        import pandas as pd
+
+        values = np.concatenate(self.parts) if self.parts else np.array([], dtype=object)
+        self.parts = []
+        if self.plain:
+            return values
+        return pd.Categorical.from_codes(values, categories=self.categories)
+
+
+def combine_chunks(chunks, columns=None):
+    """One canonical frame from an iterator of canonical frames, built column by column so that
+    only one chunk's raw values are held at a time. Text columns must already be strings."""
+    import pandas as pd
+
+    builders = {}
+    for chunk in chunks:
+        for column in list(chunk.columns):
+            values = chunk.pop(column)
+            if column not in builders:
+                builders[column] = ColumnBuilder(LOAD_DTYPES.get(column) == 'category')
+            builders[column].add(values)
+    frame = pd.DataFrame({column: builder.build() for column, builder in builders.items()})
+    frame.attrs['plain_text'] = [column for column, builder in builders.items() if builder.text and builder.plain]
+    return frame
+
+
+def _text_chunk(chunk):
+    """JSON values as strings (ids may be numbers), missing values left missing"""
+    for column in chunk.columns:
+        if LOAD_DTYPES.get(column) == 'category':
+            values = chunk[column]
+            chunk[column] = values.where(values.isna(), values.astype(str)).astype(object)
+    return chunk
+
+
+@adapter('.csv', '.csv.gz')
+def read_csv_source(path, columns=None):
+    """CSV (optionally gzip-compressed), parsed in chunks and typed while parsing, so unused
+    columns cost nothing and text is held once per distinct value"""
+    import pandas as pd
+
+    mapping = resolve_columns(pd.read_csv(path, nrows=0).columns, columns)
+    # text is parsed as plain strings and dictionary-encoded by combine_chunks
+    dtypes = {source: object if LOAD_DTYPES[canonical] == 'category' else LOAD_DTYPES[canonical]
+              for source, canonical in mapping.items()}
+    try:
+        reader = pd.read_csv(path, usecols=list(mapping), dtype=dtypes, chunksize=CSV_CHUNK_ROWS)
+        with reader:
+            return combine_chunks(chunk.rename(columns=mapping) for chunk in reader)
+    except ValueError:
+        # a stock value is not a number: read stock as text, normalize_frame coerces it
+        dtypes = {source: object for source in dtypes}
+        reader = pd.read_csv(path, usecols=list(mapping), dtype=dtypes, chunksize=CSV_CHUNK_ROWS)
+        with reader:
+            return combine_chunks(chunk.rename(columns=mapping) for chunk in reader)
+
+
+@adapter('.xlsx')
+def read_excel_source(path, columns=None):
+    """First sheet of an Excel workbook (needs openpyxl)"""
+    if importlib.util.find_spec('openpyxl') is None:
+        raise ValueError("Excel (.xlsx) files need openpyxl, which is not installed: "
+                         "pip install openpyxl, or upload the sheet as CSV")
+    import pandas as pd
+
+    recognised = {alias for canonical in columns or CANONICAL_COLUMNS for alias in COLUMN_ALIASES[canonical]}
+    df = pd.read_excel(path, usecols=lambda name: _normalize_header(name) in recognised)
+    return canonical_frame(df, columns)
+
+
+@adapter('.jsonl', '.ndjson', '.jsonl.gz', '.ndjson.gz')
+def read_jsonl_source(path, columns=None):
+    """JSON Lines, one product object per line; pruned to the recognised keys chunk by chunk"""
+    import pandas as pd
+
+    with pd.read_json(path, lines=True, dtype=False, chunksize=JSONL_CHUNK_ROWS) as reader:
+        return combine_chunks(_text_chunk(canonical_frame(chunk, columns)) for chunk in reader)
+
+
+def parse_expiry_column(values, formats=EXPIRY_FORMATS):
+    """datetime64 column from a column of date strings, parsing each distinct value once.
+
+    Returns (dates, unparseable row count, sample of the unparseable values); missing and
+    unparseable dates become NaT."""
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, 0, []
+    values = values.astype('category')
+    text = pd.Series(values.cat.categories.astype(str), dtype=object).str.strip()
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    for fmt in formats:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors='coerce')
+
+    codes = values.cat.codes.to_numpy()
+    # code -1 (missing) picks the trailing NaT
+    lookup = np.append(parsed.to_numpy(), np.datetime64('NaT', 'ns'))
+    dates = pd.Series(lookup[codes], index=values.index)
+
+    unparsed = (parsed.isna() & ~text.isin(['', 'nan', 'None', 'NaT'])).to_numpy()
+    rows = np.bincount(codes[codes >= 0], minlength=len(text))
+    return dates, int(rows[unparsed].sum()), text[unparsed].head(10).tolist()
+
+
+def normalize_frame(df, source=''):
+    """Convert canonical columns to the loading profile in place (a no-op for columns
+    that were typed while parsing)"""
+    import pandas as pd
+
+    for column in df.columns:
+        values = df[column]
+        if column == 'expiry_date':
+            df[column], failed, samples = parse_expiry_column(values)
+            if failed:
+                PARSE_FAILURES.inc(failed, kind='expiry_date')
+                logger.warning("⚠️ %s: %d rows had unparseable expiry dates (first shown): %s",
+                               source, failed, ', '.join(samples))
+        elif LOAD_DTYPES[column] == 'float32':
+            if values.dtype != 'float32':
+                df[column] = pd.to_numeric(values, errors='coerce').astype('float32')
+        elif column in df.attrs.get('plain_text', ()):
+            # nearly unique text the chunked readers chose to keep as plain strings
+            continue
+        elif not isinstance(values.dtype, pd.CategoricalDtype):
+            text = values.where(values.isna(), values.astype(str))
+            codes, uniques = pd.factorize(text)
+            df[column] = text if len(uniques) > CATEGORY_MAX_SHARE * len(text) else \
+                pd.Categorical.from_codes(codes, categories=uniques)
+    return df
+
+
+def load_inventory(path, columns=None):
+    """Read an inventory file through the adapter for its type into a canonical frame.
+
+    Only `columns` (default: the whole canonical schema) are kept; ids, names, stores and lots
+    are categoricals (or plain strings when nearly every value is distinct), stock float32 and expiry_date datetime64 (NaT when missing or
+    unparseable). Non-numeric stock values become NaN, which the analysis skips.
+    """
+    df = adapter_for(path)(path, columns)
+    logger.debug("📋 %s: columns %s", path, list(df.columns))
+    return normalize_frame(df, path)
@@ -0,0 +1,353 @@
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# route name -> (method, path, statuses that count as success)
+ROUTES = {
+    'upload': ('POST', '/upload', {302}),
+    'results': ('GET', '/results', {200, 302, 304}),
+    'previous': ('GET', '/previous-analyses', {200, 304}),
+    'alert': ('POST', '/send-current-alert', {302}),
+}
+DEFAULT_MIX = 'upload=1,results=4,previous=2,alert=1'
+DEFAULT_SIZES = '50,500,5000'
+PERCENTILES = (50, 95, 99)
+PRODUCT_NAMES = ['Milk', 'Bread', 'Eggs', 'Yogurt', 'Rice', 'Oil', 'Sugar', 'Flour', 'Apples', 'Cheese',
+                 'Fish', 'Coffee', 'Tea', 'Pasta', 'Soap']
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+SERVE = "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False, use_reloader=False)"
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept and count messages (no TLS, no auth)"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 loadtest stub SMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 loadtest')
+            elif command == 'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                self.server.count()
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self.reply('250 ok')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, StubSMTPHandler)
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.messages += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def free_port():
+    with socketserver.TCPServer(('127.0.0.1', 0), None) as server:
+        return server.server_address[1]
+
+
+def start_app(workdir, port, smtp_port):
+    """Run app.py in `workdir` (its own uploads, results and state files) against the stub SMTP server"""
+    config = {
+        'receiver_email': 'loadtest@example.com',
+        'smtp': {'server': '127.0.0.1', 'port': smtp_port, 'use_tls': False, 'sender_email': 'app@example.com',
+                 'sender_password': '', 'rate_per_second': 1000.0, 'burst': 1000},
+    }
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    env = dict(os.environ, PYTHONPATH=REPO, INVENTORY_CONFIG=os.path.join(workdir, 'config.json'))
+    log = open(os.path.join(workdir, 'app.log'), 'w')
+    return subprocess.Popen([sys.executable, '-c', SERVE.format(port=port)], cwd=workdir, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(base_url, timeout=60, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"the app exited with status {process.returncode}")
+        try:
+            status, _, _ = Client(base_url).request('GET', '/')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not answer within {timeout}s")
+
+
+def synthetic_csv(rows, rng):
+    """Inventory CSV with repeating product ids (so trends build up) and fresh stock levels"""
+    today = date.today()
+    lines = ['product_id,product_name,current_stock,expiry_date,store']
+    for i in range(rows):
+        name = f"{PRODUCT_NAMES[i % len(PRODUCT_NAMES)]} {i}"
+        expiry = (today + timedelta(days=rng.randint(-5, 120))).isoformat() if rng.random() < 0.7 else ''
+        lines.append(f"P{i},{name},{rng.randint(0, 400)},{expiry},S{i % 5}")
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: text/csv\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    """One simulated browser: a keep-alive connection, its session cookie and cached ETags"""
+
+    def __init__(self, base_url, revalidate=True):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.revalidate = revalidate
+        self.cookies = {}
+        self.etags = {}
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {}, **{'Accept-Encoding': 'gzip'})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if method == 'GET' and self.revalidate and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # the server closed the keep-alive connection: retry once on a new one
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        if method == 'GET' and response.getheader('ETag'):
+            self.etags[path] = response.getheader('ETag')
+        return response.status, response.headers, data
+
+    def upload(self, rows, rng):
+        _, _, page = self.request('GET', '/upload')
+        token = CSRF_TOKEN.search(page.decode(errors='replace'))
+        fields = {'csrf_token': token.group(1)} if token else {}
+        body, content_type = multipart(fields, {'file': (f'loadtest_{rows}.csv', synthetic_csv(rows, rng))})
+        return self.request('POST', '/upload', body, {'Content-Type': content_type})
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def parse_weights(text, allowed):
+    weights = {}
+    for part in text.split(','):
+        name, _, value = part.partition('=')
+        name = name.strip()
+        if name not in allowed:
+            raise ValueError(f"unknown route '{name}' (known: {', '.join(allowed)})")
+        weights[name] = float(value or 1)
+    return weights
+
+
+def run_worker(base_url, mix, sizes, deadline, remaining, seed, samples, revalidate):
+    rng = random.Random(seed)
+    client = Client(base_url, revalidate)
+    routes, weights = list(mix), list(mix.values())
+    try:
+        while time.monotonic() < deadline and remaining():
+            route = rng.choices(routes, weights)[0]
+            method, path, expected = ROUTES[route]
+            started = time.perf_counter()
+            try:
+                if route == 'upload':
+                    status, _, _ = client.upload(rng.choice(sizes), rng)
+                else:
+                    status, _, _ = client.request(method, path)
+                ok = status in expected
+            except Exception:
+                status, ok = None, False
+            samples.append((route, time.perf_counter() - started, ok, status))
+    finally:
+        client.close()
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples, elapsed):
+    by_route = {}
+    for route, seconds, ok, status in samples:
+        by_route.setdefault(route, []).append((seconds, ok, status))
+    report = {}
+    for route, rows in sorted(by_route.items()) + [('all', [(s, o, st) for _, s, o, st in samples])]:
+        latencies = sorted(seconds for seconds, _, _ in rows)
+        errors = sum(1 for _, ok, _ in rows if not ok)
+        statuses = {}
+        for _, _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        report[route] = {
+            'requests': len(rows),
+            'errors': errors,
+            'error_rate': round(errors / len(rows), 4) if rows else 0.0,
+            'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            **{f'p{p}_ms': round(percentile(latencies, p) * 1000, 1) if latencies else None for p in PERCENTILES},
+            'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+            'statuses': statuses,
+        }
+    return report
+
+
+def print_report(report, meta):
+    print(f"{meta['concurrency']} clients for {meta['elapsed_seconds']}s against {meta['url']} "
+          f"(mix {meta['mix']}, upload rows {meta['sizes']})")
+    header = ['route', 'requests', 'errors', 'err%', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms']
+    print(''.join(f'{column:>10}' for column in header))
+    for route, row in report.items():
+        values = [route, row['requests'], row['errors'], f"{row['error_rate'] * 100:.1f}", row['throughput_rps'],
+                  row['p50_ms'], row['p95_ms'], row['p99_ms'], row['max_ms']]
+        print(''.join(f'{value!s:>10}' for value in values))
+    if meta.get('emails') is not None:
+        print(f"stub SMTP server accepted {meta['emails']} emails")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Load-test the web app: concurrent uploads, dashboard views and alert sends.')
+    parser.add_argument('--url', help='test an already running instance instead of starting one '
+                                      '(its uploads and emails are real)')
+    parser.add_argument('--concurrency', type=int, default=8, help='simulated users (default: 8)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run (default: 30)')
+    parser.add_argument('--requests', type=int, help='stop after this many requests instead')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'route weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'upload row counts (default: {DEFAULT_SIZES})')
+    parser.add_argument('--no-revalidate', action='store_true', help="don't send If-None-Match like a browser")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help="keep the started app's working directory")
+    parser.add_argument('--json', action='store_true', help='print the report as JSON (to compare releases)')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_weights(args.mix, ROUTES)
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    smtp, process, workdir = None, None, None
+    base_url = args.url
+    try:
+        if base_url is None:
+            smtp = StubSMTPServer().start()
+            workdir = tempfile.mkdtemp(prefix='inventory-loadtest-')
+            port = free_port()
+            process = start_app(workdir, port, smtp.server_address[1])
+            base_url = f'http://127.0.0.1:{port}'
+        wait_ready(base_url, process=process)
+        # one analysis up front, so the dashboard routes have something to show
+        Client(base_url).upload(sizes[0], random.Random(args.seed))
+
+        samples = []
+        budget = [args.requests]
+        budget_lock = threading.Lock()
+
+        def remaining():
+            if budget[0] is None:
+                return True
+            with budget_lock:
+                budget[0] -= 1
+                return budget[0] >= 0
+
+        deadline = time.monotonic() + (args.duration if args.requests is None else float('inf'))
+        started = time.perf_counter()
+        threads = [threading.Thread(target=run_worker, args=(base_url, mix, sizes, deadline, remaining,
+                                                             args.seed + i, samples, not args.no_revalidate))
+                   for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if smtp is not None:
+            smtp.shutdown()
+        if workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    meta = {'url': base_url, 'concurrency': args.concurrency, 'elapsed_seconds': round(elapsed, 2),
+            'mix': mix, 'sizes': sizes, 'emails': smtp.messages if smtp else None}
+    report = summarize(samples, elapsed)
+    if args.json:
+        print(json.dumps({'meta': meta, 'routes': report}, indent=2))
+    else:
+        print_report(report, meta)
+        if workdir and args.keep:
+            print(f"app working directory kept: {workdir}")
+    return 1 if report['all']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def configure_logging(level=None):
+    """Install the root handler once; level comes from INVENTORY_LOG_LEVEL (default INFO)"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        level = level or os.environ.get('INVENTORY_LOG_LEVEL', 'INFO').upper()
+        logging.basicConfig(level=level, format=LOG_FORMAT)
+        _configured = True
+
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(name)
+
+
+def smtp_debug_level():
+    """smtplib debug level; the SMTP conversation is only dumped when INVENTORY_SMTP_DEBUG is set"""
+    return 1 if _env_flag('INVENTORY_SMTP_DEBUG') else 0
+
+
+class SampledLog:
+    """Let the first `burst` messages per key through, then only every `every`-th one"""
+
+    def __init__(self, logger, burst=5, every=1000):
+        self.logger = logger
+        self.burst = burst
+        self.every = every
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def log(self, level, key, message, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        with self._lock:
+            count = self._seen.get(key, 0) + 1
+            self._seen[key] = count
+        if count <= self.burst:
+            self.logger.log(level, message, *args)
+        elif count % self.every == 0:
+            self.logger.log(level, message + ' (%d occurrences so far, sampled)', *args, count)
+
+    def warning(self, key, message, *args):
+        self.log(logging.WARNING, key, message, *args)
+
+    def debug(self, key, message, *args):
+        self.log(logging.DEBUG, key, message, *args)
+
+
+class Diagnostics:
+    """Aggregates repetitive per-row problems into one summary line per category"""
+
+    def __init__(self, sample_size=10):
+        self.sample_size = sample_size
+        self.counts = OrderedDict()
+        self.samples = {}
+
+    def record(self, category, sample):
+        count = self.counts.get(category, 0)
+        self.counts[category] = count + 1
+        if count < self.sample_size:
+            self.samples.setdefault(category, []).append(sample)
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def summary(self):
+        lines = []
+        for category, count in self.counts.items():
+            samples = self.samples.get(category, [])
+            shown = f'first {len(samples)} shown' if count > len(samples) else 'all shown'
+            lines.append(f"{count:,} rows had {category} ({shown}): {', '.join(map(str, samples))}")
+        return lines
+
+    def to_dict(self):
+        return {category: {'count': count, 'samples': [str(s) for s in self.samples.get(category, [])]}
+                for category, count in self.counts.items()}
+
+    def log_summary(self, logger, label):
+        for line in self.summary():
+            logger.warning('⚠️ %s: %s', label, line)
@@ -0,0 +1,153 @@
+import cProfile
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from logs import get_logger
+from storage import atomic_write, atomic_write_json, read_json, analysis_id_from_filename
+
+logger = get_logger('inventorypro.profiling')
+
+# Request header (admin requests only) that turns profiling on for one upload
+PROFILE_HEADER = 'X-Profile'
+# Sidecars written next to a profiled analysis: results_<id>.zip.profile.json and .pstats
+PROFILE_SUFFIX = '.profile.json'
+PSTATS_SUFFIX = '.pstats'
+PROFILE_SUFFIXES = (PROFILE_SUFFIX, PSTATS_SUFFIX)
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+
+# tracemalloc is process-wide, so profiled stages run one at a time
+_stage_lock = threading.Lock()
+_NO_STAGE = nullcontext()
+
+
+class NullProfiler:
+    """Profiler used when profiling is off: stages are a shared no-op context"""
+    enabled = False
+
+    def stage(self, name):
+        return _NO_STAGE
+
+    def save(self, results_file):
+        return None
+
+
+class JobProfiler(NullProfiler):
+    """cProfile and tracemalloc over the named stages of one upload or batch job.
+
+    cProfile only sees the thread it runs in, so profiled jobs should do their work in
+    the calling thread (see render_charts(serial=True))."""
+    enabled = True
+
+    def __init__(self, label=''):
+        self.label = label
+        self.profile = cProfile.Profile()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        with _stage_lock:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            before = tracemalloc.take_snapshot()
+            started = time.perf_counter()
+            self.profile.enable()
+            try:
+                yield
+            finally:
+                self.profile.disable()
+                seconds = time.perf_counter() - started
+                current, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+                self.stages.append({
+                    'stage': name,
+                    'seconds': round(seconds, 4),
+                    'peak_bytes': peak - baseline,
+                    'retained_bytes': current - baseline,
+                    'top_allocations': _allocation_sites(before, after),
+                })
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        stats = pstats.Stats(self.profile).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [{
+            'function': pstats.func_std_string(func),
+            'calls': calls,
+            'total_seconds': round(total, 4),
+            'cumulative_seconds': round(cumulative, 4),
+        } for func, (_, calls, total, cumulative, _) in rows]
+
+    def save(self, results_file):
+        """Write the summary and raw pstats next to `results_file`; returns the summary"""
+        if not results_file or not self.stages:
+            return None
+        summary = {
+            'label': self.label,
+            'analysis_id': analysis_id_from_filename(os.path.basename(results_file)),
+            'results_file': os.path.basename(results_file),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'seconds': round(sum(stage['seconds'] for stage in self.stages), 4),
+            'peak_bytes': max(stage['peak_bytes'] for stage in self.stages),
+            'stages': self.stages,
+            'top_functions': self.top_functions(),
+        }
+        try:
+            atomic_write(results_file + PSTATS_SUFFIX, marshal.dumps(pstats.Stats(self.profile).stats), mode='wb')
+            atomic_write_json(results_file + PROFILE_SUFFIX, summary, indent=2)
+        except Exception as e:
+            logger.error("❌ Error saving profile for %s: %s", results_file, e)
+            return None
+        logger.info("🔬 Profile saved for %s: %.2fs, peak %.1f MB", summary['results_file'], summary['seconds'],
+                    summary['peak_bytes'] / 1e6)
+        return summary
+
+
+def _allocation_sites(before, after, limit=TOP_ALLOCATIONS):
+    """Source lines that allocated the most memory still held at the end of a stage"""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen *>'),
+              tracemalloc.Filter(False, __file__)]
+    differences = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    sites = []
+    for difference in differences:
+        if difference.size_diff <= 0:
+            continue
+        frame = difference.traceback[0]
+        sites.append({'site': f"{frame.filename}:{frame.lineno}", 'size_bytes': difference.size_diff,
+                      'count': difference.count_diff})
+        if len(sites) == limit:
+            break
+    return sites
+
+
+def profiler_for(enabled, label=''):
+    return JobProfiler(label) if enabled else NullProfiler()
+
+
+def list_profiles(results_folder):
+    """Saved profile summaries, newest first"""
+    try:
+        names = sorted((name for name in os.listdir(results_folder) if name.endswith(PROFILE_SUFFIX)),
+                       key=lambda name: os.path.getmtime(os.path.join(results_folder, name)), reverse=True)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        summary = read_json(os.path.join(results_folder, name), None)
+        if summary:
+            profiles.append(summary)
+    return profiles
+
+
+def load_profile(results_file):
+    return read_json(results_file + PROFILE_SUFFIX, None)
+
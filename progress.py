@@ -0,0 +1,146 @@
+import json
+import os
+import re
+import secrets
+import time
+
+from logs import get_logger
+from storage import atomic_write_json, read_json
+
+logger = get_logger('inventorypro.progress')
+
+# Progress is kept in small JSON files so the SSE stream can be served by any worker process
+PROGRESS_FOLDER = 'progress'
+# The analysis loop reports once every this many rows
+PROGRESS_EVERY_ROWS = 1000
+POLL_SECONDS = 0.25
+HEARTBEAT_SECONDS = 15
+STREAM_TIMEOUT_SECONDS = 900
+STALE_SECONDS = 3600
+
+JOB_ID = re.compile(r'^[0-9a-f]{16}$')
+
+
+def new_job_id():
+    return secrets.token_hex(8)
+
+
+def progress_path(job_id):
+    return os.path.join(PROGRESS_FOLDER, f"{job_id}.json")
+
+
+def valid_job_id(job_id):
+    return bool(job_id and JOB_ID.match(job_id))
+
+
+class NullProgress:
+    """Progress reporter used when nobody is listening"""
+    every = PROGRESS_EVERY_ROWS
+
+    def start(self):
+        return True
+
+    def stage(self, stage, **data):
+        pass
+
+    def rows(self, stage, done, total):
+        pass
+
+    def finish(self, ok=True, **data):
+        pass
+
+
+class ProgressReporter(NullProgress):
+    """Records progress events for one upload in progress/<job_id>.json"""
+
+    def __init__(self, job_id, every=PROGRESS_EVERY_ROWS):
+        self.job_id = job_id
+        self.every = every
+        self.path = progress_path(job_id)
+        self.state = {'events': [], 'done': False}
+
+    def start(self):
+        """Claim the job id; False if it was already submitted (e.g. the form was re-posted)"""
+        os.makedirs(PROGRESS_FOLDER, exist_ok=True)
+        self._remove_stale()
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.state, f)
+        return True
+
+    def _write(self):
+        try:
+            atomic_write_json(self.path, self.state)
+        except Exception as e:
+            logger.error("Error writing progress for %s: %s", self.job_id, e)
+
+    def stage(self, stage, **data):
+        self.state['events'].append(dict(data, stage=stage, at=time.time()))
+        self._write()
+
+    def rows(self, stage, done, total):
+        event = {'stage': stage, 'done': done, 'total': total, 'at': time.time()}
+        events = self.state['events']
+        # row counts replace the previous count for the same stage instead of piling up
+        if events and events[-1]['stage'] == stage and 'done' in events[-1]:
+            events[-1] = event
+        else:
+            events.append(event)
+        self._write()
+
+    def finish(self, ok=True, **data):
+        self.state['events'].append(dict(data, stage='finished' if ok else 'failed', at=time.time()))
+        self.state['done'] = True
+        self._write()
+
+    @staticmethod
+    def _remove_stale():
+        now = time.time()
+        for entry in os.scandir(PROGRESS_FOLDER):
+            try:
+                if now - entry.stat().st_mtime > STALE_SECONDS:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def reporter_for(job_id):
+    return ProgressReporter(job_id) if valid_job_id(job_id) else NullProgress()
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(job_id, poll=POLL_SECONDS, timeout=STREAM_TIMEOUT_SECONDS):
+    """Yield Server-Sent Events for a job until it finishes (or the stream times out)"""
+    path = progress_path(job_id)
+    sent = {}
+    last_mtime = None
+    started = last_output = time.monotonic()
+    yield "retry: 1000\n\n"
+    while time.monotonic() - started < timeout:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            state = read_json(path, {'events': [], 'done': False})
+            for position, event in enumerate(state['events']):
+                # row-count events are updated in place, so resend them when they change
+                if sent.get(position) != event:
+                    sent[position] = event
+                    last_output = time.monotonic()
+                    yield _sse('progress', event)
+            if state['done']:
+                yield _sse('done', state['events'][-1] if state['events'] else {})
+                return
+        if time.monotonic() - last_output > HEARTBEAT_SECONDS:
+            last_output = time.monotonic()
+            yield ": keep-alive\n\n"
+        time.sleep(poll)
+    yield _sse('timeout', {})
@@ -0,0 +1,207 @@
+import math
+import time
+
+from config import get_config
+from logs import get_logger
+
+logger = get_logger('inventorypro.reorder')
+
+ORDER_STATUSES = ('critical_understock', 'understock')
+PLAN_COLUMNS = ['product_id', 'product_name', 'status', 'current_stock', 'ideal_stock_level', 'unit_cost',
+                'min_order_qty']
+# Relative slack when checking a solver solution against the budget/capacity
+FEASIBILITY_TOLERANCE = 1e-6
+
+
+def purchasing_settings(**overrides):
+    settings = dict(get_config()['purchasing'])
+    settings.update({key: value for key, value in overrides.items() if key in settings})
+    return settings
+
+
+def is_constrained(settings):
+    return settings['budget'] is not None or settings['capacity_units'] is not None
+
+
+def _candidates(recommendations, settings):
+    """Understocked products as (index, need, upper bound, minimum order, unit cost, weight).
+
+    The weight ranks products for the optimizer: the status priority weight times
+    (1 + shortage fraction), so critical items come first and, within a status, the
+    emptier shelf wins. An item whose minimum order exceeds its need may be ordered
+    at the minimum (upper bound = max(need, minimum))."""
+    weights = settings['priority_weights']
+    candidates = []
+    for index, item in enumerate(recommendations):
+        status = item.get('status')
+        if status not in ORDER_STATUSES:
+            continue
+        current, ideal = float(item.get('current_stock') or 0), float(item.get('ideal_stock_level') or 0)
+        need = int(ideal - current)
+        if need <= 0:
+            continue
+        minimum = item.get('min_order_qty')
+        minimum = int(math.ceil(settings['default_min_order_qty'] if minimum is None else minimum))
+        unit_cost = item.get('unit_cost')
+        unit_cost = float(settings['default_unit_cost'] if unit_cost is None else unit_cost)
+        shortage = need / ideal if ideal > 0 else 1.0
+        weight = float(weights.get(status, 1.0)) * (1 + shortage)
+        candidates.append((index, need, max(need, minimum), minimum, unit_cost, weight))
+    return candidates
+
+
+def _solve_milp(candidates, budget, capacity, time_limit):
+    """Order quantities maximising the weighted share of each shortage covered, or None
+    when the solver finds no feasible solution within the time limit"""
+    import numpy as np
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    from scipy.sparse import coo_matrix, csr_matrix
+
+    n = len(candidates)
+    upper = np.array([c[2] for c in candidates], dtype=float)
+    minimum = np.array([c[3] for c in candidates], dtype=float)
+    cost = np.array([c[4] for c in candidates], dtype=float)
+    weight = np.array([c[5] for c in candidates], dtype=float)
+
+    # q_i order quantities, then one on/off variable y_j per item with a minimum order > 1:
+    # minimum_j * y_j <= q_j <= upper_j * y_j
+    gated = np.flatnonzero(minimum > 1)
+    m = len(gated)
+    objective = np.concatenate([-weight / upper, np.zeros(m)])
+    constraints = []
+    resource_rows = [row for row, limit in ((cost, budget), (np.ones(n), capacity)) if limit is not None]
+    if resource_rows:
+        limits = [limit for limit in (budget, capacity) if limit is not None]
+        matrix = csr_matrix(np.hstack([np.vstack(resource_rows), np.zeros((len(resource_rows), m))]))
+        constraints.append(LinearConstraint(matrix, -np.inf, np.array(limits, dtype=float)))
+    if m:
+        rows = np.concatenate([np.arange(m), np.arange(m), m + np.arange(m), m + np.arange(m)])
+        cols = np.concatenate([gated, n + np.arange(m), gated, n + np.arange(m)])
+        values = np.concatenate([np.ones(m), -minimum[gated], np.ones(m), -upper[gated]])
+        gate = coo_matrix((values, (rows, cols)), shape=(2 * m, n + m)).tocsr()
+        constraints.append(LinearConstraint(gate, np.concatenate([np.zeros(m), np.full(m, -np.inf)]),
+                                            np.concatenate([np.full(m, np.inf), np.zeros(m)])))
+
+    # only the on/off variables need to be integer: with one or two resource rows at most two
+    # quantities come out fractional, and rounding every quantity down keeps the plan feasible
+    integrality = np.concatenate([np.zeros(n), np.ones(m)])
+    # HiGHS presolve is slow on one dense row over tens of thousands of columns and ignores the
+    # time limit while it runs; the model is already tight, so it is switched off
+    result = milp(objective, constraints=constraints, integrality=integrality,
+                  bounds=Bounds(np.zeros(n + m), np.concatenate([upper, np.ones(m)])),
+                  options={'time_limit': time_limit, 'presolve': False})
+    if result.x is None:
+        logger.warning("⚠️ Reorder optimizer found no solution (%s)", result.message)
+        return None
+    quantities = np.clip(np.floor(result.x[:n] + FEASIBILITY_TOLERANCE), 0, upper).astype(int)
+    if budget is not None and quantities @ cost > budget * (1 + FEASIBILITY_TOLERANCE) + FEASIBILITY_TOLERANCE:
+        return None
+    if capacity is not None and quantities.sum() > capacity:
+        return None
+    return quantities.tolist()
+
+
+def _solve_greedy(candidates, budget, capacity):
+    """Best value per unit of the limited resources first (cost against the budget, units
+    against the capacity), each ordered in full or as much as remains (never below its
+    minimum order)"""
+    quantities = [0] * len(candidates)
+    remaining_budget = math.inf if budget is None else budget
+    remaining_capacity = math.inf if capacity is None else capacity
+
+    def density(candidate):
+        _, _, upper, _, unit_cost, weight = candidate
+        usage = (unit_cost / budget if budget else 0) + (1 / capacity if capacity else 0)
+        return weight / upper / usage if usage > 0 else math.inf
+
+    for position in sorted(range(len(candidates)), key=lambda p: -density(candidates[p])):
+        _, _, upper, minimum, unit_cost, _ = candidates[position]
+        affordable = remaining_budget / unit_cost if unit_cost > 0 else math.inf
+        quantity = int(min(upper, affordable, remaining_capacity))
+        if quantity <= 0 or quantity < minimum:
+            continue
+        quantities[position] = quantity
+        remaining_budget -= quantity * unit_cost
+        remaining_capacity -= quantity
+    return quantities
+
+
+def _score(candidates, quantities):
+    """The optimizer's objective: weighted share of each shortage covered"""
+    return sum(quantity * weight / upper for (_, _, upper, _, _, weight), quantity in zip(candidates, quantities))
+
+
+def plan_orders(recommendations, **overrides):
+    """Allocate order quantities to understocked products under the purchasing budget and
+    capacity (config `purchasing`, or keyword overrides). Orders are listed by weight and
+    carry the `index` of their recommendation.
+
+    Solved as a mixed-integer program with scipy's HiGHS solver within time_limit_seconds;
+    if that fails, or stops at the time limit with a worse plan, the greedy allocation is used."""
+    settings = purchasing_settings(**overrides)
+    started = time.perf_counter()
+    candidates = _candidates(recommendations, settings)
+    budget, capacity = settings['budget'], settings['capacity_units']
+
+    if not is_constrained(settings):
+        solver = 'unconstrained'
+        quantities = [upper for _, _, upper, _, _, _ in candidates]
+    else:
+        solver = 'milp'
+        quantities = None
+        if candidates:
+            try:
+                quantities = _solve_milp(candidates, budget, capacity, float(settings['time_limit_seconds']))
+            except Exception as e:
+                logger.error("❌ Reorder optimizer failed: %s", e)
+        # a solver stopped by the time limit may hold a poor incumbent: keep whichever plan is better
+        greedy = _solve_greedy(candidates, budget, capacity)
+        if quantities is None or _score(candidates, greedy) > _score(candidates, quantities):
+            solver = 'greedy'
+            quantities = greedy
+
+    orders = []
+    for (index, need, _, minimum, unit_cost, weight), quantity in zip(candidates, quantities):
+        item = recommendations[index]
+        orders.append({
+            'index': index,
+            'product_id': item.get('product_id'),
+            'product_name': item.get('product_name'),
+            'status': item.get('status'),
+            'need': need,
+            'min_order_qty': minimum,
+            'order_quantity': int(quantity),
+            'unit_cost': unit_cost,
+            'cost': round(quantity * unit_cost, 2),
+            'weight': round(weight, 4),
+        })
+    orders.sort(key=lambda order: -order['weight'])
+
+    summary = {
+        'solver': solver,
+        'budget': budget,
+        'capacity_units': capacity,
+        'spent': round(sum(order['cost'] for order in orders), 2),
+        'units': sum(order['order_quantity'] for order in orders),
+        'products': len(orders),
+        'fully_covered': sum(1 for order in orders if order['order_quantity'] >= order['need']),
+        'unfunded': sum(1 for order in orders if order['order_quantity'] == 0),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    logger.info("🛒 Reorder plan (%s): %d units for %d products, %.2f spent in %.2fs",
+                solver, summary['units'], summary['products'], summary['spent'], summary['seconds'])
+    return {'summary': summary, 'orders': orders}
+
+
+def annotate_orders(recommendations):
+    """When a budget or capacity is configured, set each understocked recommendation's
+    order_quantity from the plan and return the plan summary; otherwise None"""
+    if not is_constrained(purchasing_settings()):
+        return None
+    plan = plan_orders(recommendations)
+    for item in recommendations:
+        if item.get('status') in ORDER_STATUSES:
+            item['order_quantity'] = 0
+    for order in plan['orders']:
+        recommendations[order['index']]['order_quantity'] = order['order_quantity']
+    return plan['summary']
@@ -0,0 +1,211 @@
+import io
+import json
+import re
+import zipfile
+
+from storage import atomic_write
+
+# Version 2 saved analyses: a zip archive holding meta.json, the chart, and the
+# recommendations stored column by column in chunks of CHUNK_ROWS rows:
+#   meta.json                     {"format": 2, "rows": n, "columns": {name: encoding}, ...}
+#   chart.txt                     base64 chart image
+#   gallery/<name>.txt            base64 images of the smaller charts (status, expiry, trend)
+#   columns/<name>/<chunk>.json   plain: [values]; dict: [codes]; template: [[code, number]]
+#   columns/<name>/dict.json      distinct values (or action templates) for dict/template columns
+# Version 1 is the original pretty-printed JSON document.
+FORMAT_VERSION = 2
+COLUMNAR_SUFFIX = '.zip'
+CHUNK_ROWS = 10000
+
+# Free-text columns with a number embedded ("Reorder 12 units soon") are stored as
+# a template dictionary plus the number
+TEMPLATE_COLUMNS = ('action',)
+PLAIN_COLUMNS = ('product_id', 'product_name', 'current_stock', 'ideal_stock_level')
+NUMBER = re.compile(r'-?\d+')
+PLACEHOLDER = '{}'
+
+
+def _key(value):
+    # hashable scalars are their own dictionary key; anything else is keyed by its JSON
+    # (typed, so that 1, 1.0 and True stay distinct)
+    if isinstance(value, (str, int, float, type(None))):
+        return type(value), value
+    return json.dumps(value)
+
+
+def _is_dict_column(values):
+    """Low-cardinality columns (status, priority, trend, days_left, ...) are dictionary-encoded"""
+    distinct = set()
+    limit = max(16, len(values) // 4)
+    for value in values:
+        distinct.add(_key(value))
+        if len(distinct) > limit:
+            return False
+    return True
+
+
+def _template(value):
+    if not isinstance(value, str):
+        return None, None
+    match = NUMBER.search(value)
+    if not match:
+        return value, None
+    template = value[:match.start()] + PLACEHOLDER + value[match.end():]
+    number = int(match.group())
+    if template.replace(PLACEHOLDER, str(number), 1) != value:
+        return value, None
+    return template, number
+
+
+def _encode_column(name, values):
+    """Returns (encoding, dictionary or None, encoded values)"""
+    if name in TEMPLATE_COLUMNS and all(isinstance(v, str) for v in values):
+        dictionary, codes, encoded = [], {}, []
+        for value in values:
+            template, number = _template(value)
+            code = codes.setdefault(template, len(dictionary))
+            if code == len(dictionary):
+                dictionary.append(template)
+            encoded.append([code, number])
+        return 'template', dictionary, encoded
+    if name not in PLAIN_COLUMNS and _is_dict_column(values):
+        dictionary, codes, encoded = [], {}, []
+        for value in values:
+            code = codes.setdefault(_key(value), len(dictionary))
+            if code == len(dictionary):
+                dictionary.append(value)
+            encoded.append(code)
+        return 'dict', dictionary, encoded
+    return 'plain', None, values
+
+
+def _decode_values(encoding, dictionary, encoded):
+    if encoding == 'dict':
+        return [dictionary[code] for code in encoded]
+    if encoding == 'template':
+        return [dictionary[code] if number is None else dictionary[code].replace(PLACEHOLDER, str(number), 1)
+                for code, number in encoded]
+    return encoded
+
+
+def encode_results(results, chunk_rows=CHUNK_ROWS):
+    """Serialize an analysis dict to the compressed columnar format (bytes)"""
+    recommendations = results.get('recommendations', [])
+    columns = []
+    for row in recommendations:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        encodings = {}
+        for name in columns:
+            encoding, dictionary, encoded = _encode_column(name, [row.get(name) for row in recommendations])
+            encodings[name] = encoding
+            if dictionary is not None:
+                archive.writestr(f'columns/{name}/dict.json', json.dumps(dictionary, separators=(',', ':')))
+            for chunk, start in enumerate(range(0, len(encoded), chunk_rows)):
+                archive.writestr(f'columns/{name}/{chunk}.json',
+                                 json.dumps(encoded[start:start + chunk_rows], separators=(',', ':')))
+        archive.writestr('chart.txt', results.get('chart') or '')
+        gallery = results.get('gallery') or {}
+        for name, image in gallery.items():
+            archive.writestr(f'gallery/{name}.txt', image)
+        meta = {key: value for key, value in results.items() if key not in ('recommendations', 'chart', 'gallery')}
+        meta.update({'format': FORMAT_VERSION, 'rows': len(recommendations), 'chunk_rows': chunk_rows,
+                     'columns': encodings, 'has_chart': results.get('chart') is not None,
+                     'gallery': list(gallery)})
+        archive.writestr('meta.json', json.dumps(meta))
+    return buffer.getvalue()
+
+
+class ResultsReader:
+    """Lazy reader for columnar results: decodes only the columns and row ranges asked for"""
+
+    def __init__(self, path):
+        self.path = path
+        self._archive = zipfile.ZipFile(path)
+        self.meta = json.loads(self._archive.read('meta.json'))
+        self.rows = self.meta['rows']
+        self.columns = list(self.meta['columns'])
+
+    def close(self):
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column(self, name, start=0, stop=None):
+        stop = self.rows if stop is None else min(stop, self.rows)
+        if start >= stop:
+            return []
+        encoding = self.meta['columns'][name]
+        chunk_rows = self.meta['chunk_rows']
+        dictionary = None
+        if encoding != 'plain':
+            dictionary = json.loads(self._archive.read(f'columns/{name}/dict.json'))
+        values = []
+        first, last = start // chunk_rows, (stop - 1) // chunk_rows
+        for chunk in range(first, last + 1):
+            encoded = json.loads(self._archive.read(f'columns/{name}/{chunk}.json'))
+            lo = start - chunk * chunk_rows if chunk == first else 0
+            hi = stop - chunk * chunk_rows if chunk == last else len(encoded)
+            values.extend(_decode_values(encoding, dictionary, encoded[lo:hi]))
+        return values
+
+    def records(self, columns=None, start=0, stop=None):
+        columns = self.columns if columns is None else [c for c in columns if c in self.meta['columns']]
+        decoded = [self.column(name, start, stop) for name in columns]
+        return [dict(zip(columns, values)) for values in zip(*decoded)] if decoded else []
+
+    def chart(self):
+        return self._archive.read('chart.txt').decode() if self.meta.get('has_chart') else None
+
+    def gallery(self):
+        return {name: self._archive.read(f'gallery/{name}.txt').decode() for name in self.meta.get('gallery', [])}
+
+    def load(self, columns=None, start=0, stop=None):
+        """The analysis dict in the same shape as a version 1 JSON document"""
+        results = {key: value for key, value in self.meta.items()
+                   if key not in ('format', 'rows', 'chunk_rows', 'columns', 'has_chart', 'gallery')}
+        results['recommendations'] = self.records(columns, start, stop)
+        results['chart'] = self.chart()
+        results['gallery'] = self.gallery()
+        return results
+
+
+def load_results_file(path, columns=None, start=0, stop=None):
+    """Load a saved analysis in either format, optionally only some columns / rows"""
+    if path.endswith(COLUMNAR_SUFFIX):
+        with ResultsReader(path) as reader:
+            return reader.load(columns, start, stop)
+    with open(path, 'r') as f:
+        results = json.load(f)
+    recommendations = results.get('recommendations', [])[start:stop]
+    if columns is not None:
+        recommendations = [{c: row[c] for c in columns if c in row} for row in recommendations]
+    results['recommendations'] = recommendations
+    return results
+
+
+def iter_records(path, columns=None):
+    """Yield recommendations one chunk at a time (version 1 JSON files are read whole)"""
+    if path.endswith(COLUMNAR_SUFFIX):
+        with ResultsReader(path) as reader:
+            chunk_rows = reader.meta['chunk_rows']
+            for start in range(0, reader.rows, chunk_rows):
+                yield from reader.records(columns, start, start + chunk_rows)
+    else:
+        yield from load_results_file(path, columns)['recommendations']
+
+
+def write_results_file(path, results):
+    """Atomically rewrite a saved analysis, keeping its format"""
+    if path.endswith(COLUMNAR_SUFFIX):
+        atomic_write(path, encode_results(results), mode='wb')
+    else:
+        atomic_write(path, json.dumps(results, indent=2))
@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+
+from config import get_config
+from logs import get_logger
+from profiling import PROFILE_SUFFIXES
+from storage import update_json, list_analysis_files, analysis_id_from_filename, parse_analysis_id, locked, try_lock
+
+logger = get_logger('inventorypro.retention')
+
+HASHES_FILE = 'file_hashes.json'
+
+# Seconds between retention passes
+RETENTION_INTERVAL = 600
+# Files deleted per batch; the thread sleeps BATCH_PAUSE seconds between batches
+BATCH_SIZE = 50
+BATCH_PAUSE = 0.05
+# Upload copies (<timestamp>_...) only live while their request is being analysed;
+# anything older is orphaned
+ORPHAN_GRACE_SECONDS = 3600
+# Leftover temp files from interrupted atomic writes
+TEMP_GRACE_SECONDS = 3600
+# Lock sidecars outlive their analysis by this long, so nothing can still be waiting on them
+LOCK_GRACE_SECONDS = 86400
+
+
+def _leading_timestamp(name):
+    prefix = name.split('_', 1)[0]
+    return int(prefix) if prefix.isdigit() else None
+
+
+def _analysis_time(name):
+    seconds, *rest = parse_analysis_id(analysis_id_from_filename(name))
+    return seconds + (rest[0] / 1_000_000 if rest else 0)
+
+
+def _entries(folder, names, timestamp_fn):
+    """[(path, created, size)] oldest first; `created` prefers the timestamp in the name"""
+    entries = []
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        created = timestamp_fn(name)
+        entries.append((path, min(created, stat.st_mtime) if created else stat.st_mtime, stat.st_size))
+    entries.sort(key=lambda entry: entry[1])
+    return entries
+
+
+def select_expired(entries, policy, now, keep=()):
+    """Paths to delete from oldest-first `entries` so that max_age_days, max_count and
+    max_bytes all hold; paths in `keep` are never selected"""
+    max_age_days = policy.get('max_age_days')
+    max_count = policy.get('max_count')
+    max_bytes = policy.get('max_bytes')
+    count = len(entries)
+    total = sum(size for _, _, size in entries)
+    victims = []
+    for path, created, size in entries:
+        too_old = max_age_days is not None and now - created > max_age_days * 86400
+        too_many = max_count is not None and count > max_count
+        too_big = max_bytes is not None and total > max_bytes
+        if not (too_old or too_many or too_big):
+            break
+        if path in keep:
+            continue
+        victims.append(path)
+        count -= 1
+        total -= size
+    return victims
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.error("Error removing %s: %s", path, e)
+        return False
+
+
+def remove_analyses(paths, hashes_file=HASHES_FILE):
+    """Delete analyses with their profile sidecars and drop the upload hashes that pointed at them,
+    so the same file can be uploaded (and analysed) again.
+
+    Each analysis is removed while holding its lock. The `.lock` sidecar itself stays (deleting it
+    would let a worker already waiting on it and a later one lock different files); its mtime marks
+    the removal, and remove_stale_locks() deletes it after LOCK_GRACE_SECONDS."""
+    removed = set()
+    for path in paths:
+        with locked(path):
+            if _remove(path):
+                removed.add(os.path.basename(path))
+                _touch(f"{path}.lock")
+            for suffix in PROFILE_SUFFIXES:
+                _remove(path + suffix)
+    if removed and os.path.exists(hashes_file):
+        def prune(hashes):
+            for file_hash in [h for h, entry in hashes.items() if entry.get('results_file') in removed]:
+                del hashes[file_hash]
+        try:
+            update_json(hashes_file, prune, default={})
+        except Exception as e:
+            logger.error("Error updating %s: %s", hashes_file, e)
+    return len(removed)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def remove_stale_locks(folder, now=None):
+    """Delete lock sidecars whose file has been gone for LOCK_GRACE_SECONDS; a lock still held
+    (or being waited on) by anyone is skipped"""
+    now = time.time() if now is None else now
+    removed = 0
+    for name in RetentionManager._lock_names(folder):
+        lock_path = os.path.join(folder, name)
+        try:
+            if os.path.exists(lock_path[:-len('.lock')]) or now - os.stat(lock_path).st_mtime < LOCK_GRACE_SECONDS:
+                continue
+        except OSError:
+            continue
+        lock_file = try_lock(lock_path)
+        if lock_file is None:
+            continue
+        with lock_file:
+            removed += _remove(lock_path)
+    return removed
+
+
+class RetentionManager:
+    """Background garbage collection for static/uploads and static/results.
+
+    Each pass applies the `retention` policies from config.json (max_age_days,
+    max_count, max_bytes per store), removes orphaned uploads and leftover temp
+    files, and deletes in small batches so no lock is held for long. The latest
+    analysis is never removed.
+    """
+
+    def __init__(self, upload_folder, results_folder, interval=RETENTION_INTERVAL):
+        self.upload_folder = upload_folder
+        self.results_folder = results_folder
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+            self._thread.start()
+
+    def trigger(self):
+        """Run a pass now instead of waiting for the interval"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("❌ Retention pass failed: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _in_batches(self, paths, remove):
+        removed = 0
+        for start in range(0, len(paths), BATCH_SIZE):
+            removed += remove(paths[start:start + BATCH_SIZE])
+            time.sleep(BATCH_PAUSE)
+        return removed
+
+    def run_once(self, now=None):
+        """One retention pass; returns {'uploads': n, 'results': n, 'temp': n} files removed
+        ('temp' includes stale lock sidecars)"""
+        now = time.time() if now is None else now
+        policies = get_config()['retention']
+
+        uploads = _entries(self.upload_folder, self._names(self.upload_folder), _leading_timestamp)
+        # upload copies still inside the grace period may belong to a request in flight
+        copies = [entry for entry in uploads if _leading_timestamp(os.path.basename(entry[0]))]
+        others = [entry for entry in uploads if not _leading_timestamp(os.path.basename(entry[0]))]
+        orphans = [path for path, created, _ in copies if now - created > ORPHAN_GRACE_SECONDS]
+        upload_victims = orphans + select_expired(others, policies.get('uploads', {}), now)
+
+        result_files = list_analysis_files(self.results_folder)
+        results = _entries(self.results_folder, result_files, _analysis_time)
+        keep = {os.path.join(self.results_folder, result_files[0])} if result_files else set()
+        result_victims = select_expired(results, policies.get('results', {}), now, keep)
+
+        temp_victims = [path for folder in (self.upload_folder, self.results_folder)
+                        for path, created, _ in _entries(folder, self._temp_names(folder), lambda name: None)
+                        if now - created > TEMP_GRACE_SECONDS]
+
+        removed = {
+            'uploads': self._in_batches(upload_victims, lambda paths: sum(_remove(p) for p in paths)),
+            'results': self._in_batches(result_victims, remove_analyses),
+            'temp': self._in_batches(temp_victims, lambda paths: sum(_remove(p) for p in paths)),
+        }
+        removed['temp'] += remove_stale_locks(self.results_folder, now)
+        if any(removed.values()):
+            logger.info("🧹 Retention removed %d uploads, %d analyses, %d temp files",
+                        removed['uploads'], removed['results'], removed['temp'])
+        return removed
+
+    @staticmethod
+    def _names(folder):
+        try:
+            return [entry.name for entry in os.scandir(folder)
+                    if entry.is_file() and not entry.name.startswith('.') and not entry.name.endswith('.lock')]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _lock_names(folder):
+        try:
+            return [entry.name for entry in os.scandir(folder) if entry.is_file() and entry.name.endswith('.lock')]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _temp_names(folder):
+        try:
+            return [entry.name for entry in os.scandir(folder)
+                    if entry.is_file() and entry.name.startswith('.') and entry.name.endswith('.tmp')]
+        except OSError:
+            return []
@@ -0,0 +1,99 @@
+from storage import read_json, update_json
+
+STATS_FILE = 'product_stats.json'
+# Raw per-upload stock records written before running statistics existed; replayed once
+LEGACY_HISTORY_FILE = 'inventory_history.json'
+
+# Snapshots kept in each product's ring buffer; the trend compares their mean with everything older
+RECENT_SIZE = 3
+EWMA_ALPHA = 0.3
+
+
+def new_stats():
+    return {'count': 0, 'mean': 0.0, 'm2': 0.0, 'ewma': None, 'recent': [], 'older_count': 0, 'older_sum': 0.0}
+
+
+def update_stats(stats, value):
+    """Fold one stock snapshot into a product's aggregates in O(1) (Welford's method for the variance)"""
+    value = float(value)
+    stats['count'] += 1
+    delta = value - stats['mean']
+    stats['mean'] += delta / stats['count']
+    stats['m2'] += delta * (value - stats['mean'])
+    stats['ewma'] = value if stats['ewma'] is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * stats['ewma']
+    recent = stats['recent']
+    recent.append(value)
+    if len(recent) > RECENT_SIZE:
+        # the oldest snapshot leaves the ring buffer and joins the "older" aggregate
+        stats['older_sum'] += recent.pop(0)
+        stats['older_count'] += 1
+    return stats
+
+
+def variance(stats):
+    return stats['m2'] / (stats['count'] - 1) if stats['count'] > 1 else 0.0
+
+
+def recent_mean(stats):
+    return sum(stats['recent']) / len(stats['recent']) if stats['recent'] else stats['mean']
+
+
+def older_mean(stats):
+    return stats['older_sum'] / stats['older_count'] if stats['older_count'] else stats['mean']
+
+
+def stock_trend(stats):
+    """(ideal stock, trend label) from a product's aggregates: recent snapshots more than 10%
+    above/below the older ones mean growing/declining demand"""
+    average = stats['mean']
+    recent, older = recent_mean(stats), older_mean(stats)
+    if recent > older * 1.1:
+        return int(average * 1.4), "Growing ↗"
+    if recent < older * 0.9:
+        return int(average * 1.1), "Declining ↘"
+    return int(average * 1.2), "Stable →"
+
+
+class ProductStatsStore:
+    """Per-product running statistics of uploaded stock levels.
+
+    Analyses read a snapshot when they start and record new stock levels as they go;
+    save() folds the recorded values into the file under lock, so concurrent uploads
+    from other workers are kept.
+    """
+
+    def __init__(self, path=STATS_FILE, legacy_history=LEGACY_HISTORY_FILE):
+        self.path = path
+        self.stats = read_json(self.path, None)
+        # first run after upgrading: seed the statistics from the old raw history
+        self._seed = None
+        if self.stats is None:
+            self.stats = self._seed = self._from_history(read_json(legacy_history, []))
+        self._pending = []
+
+    @staticmethod
+    def _from_history(history):
+        stats = {}
+        for record in history:
+            update_stats(stats.setdefault(str(record['product_id']), new_stats()), record['current_stock'])
+        return stats
+
+    def __len__(self):
+        return len(self.stats)
+
+    def get(self, product_id):
+        return self.stats.get(product_id)
+
+    def record(self, product_id, value):
+        self._pending.append((product_id, value))
+
+    def save(self):
+        def merge(stats):
+            if not stats and self._seed:
+                stats.update(self._seed)
+            for product_id, value in self._pending:
+                update_stats(stats.setdefault(product_id, new_stats()), value)
+
+        self.stats = update_json(self.path, merge, default={})
+        self._pending = []
+        self._seed = None
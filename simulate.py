@@ -0,0 +1,198 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+
+from analysis import days_left_number
+from config import get_config, validate_thresholds, ConfigError
+from results_format import load_results_file
+from storage import find_analysis_file, list_analysis_files
+
+THRESHOLD_KEYS = ['critical_understock', 'understock', 'overstock', 'critical_overstock',
+                  'expiry_alert_days', 'expiry_soon_days']
+STATUSES = ['critical_understock', 'understock', 'optimal', 'overstock', 'critical_overstock']
+# Largest grid evaluated in one request
+MAX_SETTINGS = 1000
+# Rows broadcast against all settings at once; bounds the (settings x rows) temporaries
+CHUNK_ROWS = 50000
+
+
+def expand_grid(grid, base=None):
+    """Every combination of the values in `grid` ({key: value or [values]}); keys not in
+    the grid keep their `base` (default: configured) value"""
+    base = dict(base or get_config()['thresholds'])
+    unknown = set(grid) - set(THRESHOLD_KEYS)
+    if unknown:
+        raise ValueError(f"unknown threshold keys: {', '.join(sorted(unknown))}")
+    keys = list(grid)
+    values = [grid[key] if isinstance(grid[key], (list, tuple)) else [grid[key]] for key in keys]
+    if math.prod(len(options) for options in values) > MAX_SETTINGS:
+        raise ValueError(f"the grid has more than {MAX_SETTINGS} settings")
+    settings = []
+    for combination in itertools.product(*values):
+        setting = dict(base)
+        setting.update(zip(keys, combination))
+        settings.append({key: setting[key] for key in THRESHOLD_KEYS})
+    return settings
+
+
+def load_inputs(results_file):
+    """(current stock, ideal stock, days to expiry) arrays from a saved analysis"""
+    import numpy as np
+
+    data = load_results_file(results_file, columns=['current_stock', 'ideal_stock_level', 'days_left'])
+    rows = data['recommendations']
+    current = np.fromiter((row.get('current_stock') or 0 for row in rows), dtype=np.float64, count=len(rows))
+    ideal = np.fromiter((row.get('ideal_stock_level') or 0 for row in rows), dtype=np.float64, count=len(rows))
+    # no expiry date (None) becomes NaN
+    days = np.array([days_left_number(row.get('days_left')) for row in rows], dtype=np.float64)
+    return current, ideal, days
+
+
+def simulate(current, ideal, days, settings, chunk_rows=CHUNK_ROWS):
+    """Status counts, order quantities and alert volume for every threshold setting.
+
+    All settings are evaluated together: each chunk of rows is compared against a column
+    vector of every setting's cut-offs in one broadcast, with the same precedence as
+    analyze_data (critical understock, understock, critical overstock, overstock, optimal)."""
+    import numpy as np
+
+    def column(key):
+        return np.array([float(setting[key]) for setting in settings])[:, None]
+
+    critical_under, under = column('critical_understock'), column('understock')
+    over, critical_over = column('overstock'), column('critical_overstock')
+    alert_days, soon_days = column('expiry_alert_days'), column('expiry_soon_days')
+
+    k = len(settings)
+    counts = {status: np.zeros(k, dtype=np.int64) for status in STATUSES}
+    reorder_units = np.zeros(k)
+    reduce_units = np.zeros(k)
+    expiry_alerts = np.zeros(k, dtype=np.int64)
+    expiry_urgent = np.zeros(k, dtype=np.int64)
+
+    for start in range(0, len(current), chunk_rows):
+        stock = current[start:start + chunk_rows]
+        target = ideal[start:start + chunk_rows]
+        left = days[start:start + chunk_rows]
+        ratio = np.divide(stock, target, out=np.zeros_like(stock), where=target > 0)[None, :]
+        shortage = np.trunc(target - stock)[None, :]
+        excess = np.trunc(stock - target)[None, :]
+
+        is_critical_under = ratio < critical_under
+        is_under = ~is_critical_under & (ratio < under)
+        is_critical_over = ~is_critical_under & ~is_under & (ratio > critical_over)
+        is_over = ~is_critical_under & ~is_under & ~is_critical_over & (ratio > over)
+        understocked = is_critical_under | is_under
+        overstocked = is_critical_over | is_over
+
+        counts['critical_understock'] += is_critical_under.sum(axis=1)
+        counts['understock'] += is_under.sum(axis=1)
+        counts['critical_overstock'] += is_critical_over.sum(axis=1)
+        counts['overstock'] += is_over.sum(axis=1)
+        counts['optimal'] += len(stock) - understocked.sum(axis=1) - overstocked.sum(axis=1)
+        reorder_units += np.where(understocked, shortage, 0).sum(axis=1)
+        reduce_units += np.where(overstocked, excess, 0).sum(axis=1)
+        # NaN (no expiry date) compares False
+        expiry_alerts += (left[None, :] <= alert_days).sum(axis=1)
+        expiry_urgent += (left[None, :] <= soon_days).sum(axis=1)
+
+    results = []
+    for i, setting in enumerate(settings):
+        status_counts = {status: int(counts[status][i]) for status in STATUSES}
+        results.append({
+            'thresholds': setting,
+            'status_counts': status_counts,
+            'reorder_units': int(reorder_units[i]),
+            'reduce_units': int(reduce_units[i]),
+            'stock_alerts': len(current) - status_counts['optimal'],
+            'expiry_alerts': int(expiry_alerts[i]),
+            'urgent_expiry_alerts': int(expiry_urgent[i]),
+        })
+    return results
+
+
+def check_settings(settings):
+    """Raise ValueError for an empty/oversized grid or inconsistently ordered thresholds"""
+    if not settings:
+        raise ValueError("no threshold settings given")
+    if len(settings) > MAX_SETTINGS:
+        raise ValueError(f"{len(settings)} settings exceed the limit of {MAX_SETTINGS}")
+    for setting in settings:
+        try:
+            validate_thresholds({key: float(value) for key, value in setting.items()})
+        except (ConfigError, TypeError) as e:
+            raise ValueError(f"{setting}: {e}")
+
+
+def simulate_analysis(results_file, settings):
+    check_settings(settings)
+    return simulate(*load_inputs(results_file), settings)
+
+
+def settings_from_request(body):
+    """Settings from a JSON body: {"grid": {key: [values]}} and/or {"settings": [{key: value}]};
+    ValueError when the body does not have that shape"""
+    if not isinstance(body, dict):
+        raise ValueError("the request body must be a JSON object")
+    base = get_config()['thresholds']
+    grid, explicit = body.get('grid'), body.get('settings') or []
+    if grid is not None and not isinstance(grid, dict):
+        raise ValueError('"grid" must be an object of {threshold: [values]}')
+    if not isinstance(explicit, list) or not all(isinstance(setting, dict) for setting in explicit):
+        raise ValueError('"settings" must be a list of {threshold: value} objects')
+    settings = [expanded for setting in explicit for expanded in expand_grid(setting, base)]
+    if grid or not explicit:
+        settings = expand_grid(grid or {}, base) + settings
+    return settings
+
+
+def _parse_set(option):
+    key, _, values = option.partition('=')
+    return key.strip(), [float(value) for value in values.split(',') if value.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate status/expiry thresholds against a saved analysis.')
+    parser.add_argument('analysis', nargs='?', default='latest', help="analysis id (default: latest)")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=V1,V2,...',
+                        help=f"values to try for a threshold ({', '.join(THRESHOLD_KEYS)}); repeatable")
+    parser.add_argument('--results-folder', default=os.path.join('static', 'results'))
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    if args.analysis == 'latest':
+        files = list_analysis_files(args.results_folder) if os.path.isdir(args.results_folder) else []
+        results_file = os.path.join(args.results_folder, files[0]) if files else None
+    else:
+        results_file = find_analysis_file(args.results_folder, args.analysis)
+    if not results_file:
+        print(f"Analysis not found: {args.analysis}", file=sys.stderr)
+        return 2
+    try:
+        settings = expand_grid(dict(_parse_set(option) for option in args.set))
+        results = simulate_analysis(results_file, settings)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    varied = [key for key in THRESHOLD_KEYS if len({s[key] for s in settings}) > 1] or THRESHOLD_KEYS[:4]
+    header = varied + ['crit_under', 'under', 'optimal', 'over', 'crit_over', 'reorder', 'reduce',
+                       'stock_alerts', 'expiry_alerts']
+    print('\t'.join(header))
+    for result in results:
+        counts = result['status_counts']
+        print('\t'.join(str(value) for value in [result['thresholds'][key] for key in varied] + [
+            counts['critical_understock'], counts['understock'], counts['optimal'], counts['overstock'],
+            counts['critical_overstock'], result['reorder_units'], result['reduce_units'],
+            result['stock_alerts'], result['expiry_alerts']]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
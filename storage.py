@@ -0,0 +1,185 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# mkstemp creates 0600 files; published files get the usual permissions
+FILE_MODE = 0o644
+
+RESULTS_PREFIX = 'results_'
+RESULTS_SUFFIX = '.json'
+# Saved analyses: version 1 JSON documents and version 2 columnar archives
+RESULTS_SUFFIXES = ('.json', '.zip')
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.RLock())
+
+
+@contextmanager
+def locked(path):
+    """Exclusive lock on `path` shared by threads and worker processes (via `path`.lock)"""
+    with _thread_lock(path):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def try_lock(lock_path):
+    """Non-blocking exclusive flock on `lock_path`, held until the returned file is closed
+    or the process exits; None if another process (or open file) already holds it"""
+    lock_file = open(lock_path, 'a')
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def atomic_write(path, data, mode='w'):
+    """Write to a temp file in the same directory, fsync, then rename over `path`"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    atomic_write(path, json.dumps(data, **dump_kwargs))
+
+
+def read_json(path, default=None):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def update_json(path, update, default=None, **dump_kwargs):
+    """Locked read-modify-write of a JSON file.
+
+    `update(data)` may mutate `data` in place or return a replacement; the result
+    is written atomically and returned.
+    """
+    with locked(path):
+        data = read_json(path, default)
+        result = update(data)
+        if result is not None:
+            data = result
+        atomic_write_json(path, data, **dump_kwargs)
+        return data
+
+
+def new_analysis_id(micros=None):
+    """Sortable analysis id: '<unix seconds>-<microseconds>'"""
+    micros = time.time_ns() // 1000 if micros is None else micros
+    return f"{micros // 1_000_000}-{micros % 1_000_000:06d}"
+
+
+def parse_analysis_id(analysis_id):
+    """Sort key for analysis ids; also accepts the older bare '<unix seconds>' ids"""
+    return tuple(int(part) for part in analysis_id.split('-'))
+
+
+def analysis_timestamp(analysis_id):
+    return parse_analysis_id(analysis_id)[0]
+
+
+def results_filename(analysis_id, suffix=RESULTS_SUFFIX):
+    return f"{RESULTS_PREFIX}{analysis_id}{suffix}"
+
+
+def analysis_id_from_filename(filename):
+    """Analysis id of a results file name, or None if it is not one"""
+    if not filename.startswith(RESULTS_PREFIX):
+        return None
+    stem, suffix = os.path.splitext(filename)
+    if suffix not in RESULTS_SUFFIXES:
+        return None
+    analysis_id = stem[len(RESULTS_PREFIX):]
+    try:
+        parse_analysis_id(analysis_id)
+    except ValueError:
+        return None
+    return analysis_id
+
+
+def list_analysis_files(folder):
+    """Results file names in `folder`, newest first"""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    files = [name for name in names if analysis_id_from_filename(name)]
+    files.sort(key=lambda name: parse_analysis_id(analysis_id_from_filename(name)), reverse=True)
+    return files
+
+
+def find_analysis_file(folder, analysis_id):
+    """Path of the saved analysis with this id, or None"""
+    try:
+        parse_analysis_id(analysis_id)
+    except ValueError:
+        return None
+    for suffix in RESULTS_SUFFIXES:
+        path = os.path.join(folder, results_filename(analysis_id, suffix))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def save_analysis(folder, payload, suffix=RESULTS_SUFFIX):
+    """Atomically publish `payload` bytes under a new, never-reused analysis id; returns (id, path).
+
+    The file is fully written to a temp file first and then hard-linked into place,
+    which fails instead of overwriting if another worker claimed the same id.
+    """
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.results.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, FILE_MODE)
+        micros = time.time_ns() // 1000
+        while True:
+            analysis_id = new_analysis_id(micros)
+            path = os.path.join(folder, results_filename(analysis_id, suffix))
+            try:
+                os.link(tmp_path, path)
+                return analysis_id, path
+            except FileExistsError:
+                micros += 1
+    finally:
+        os.remove(tmp_path)
@@ -0,0 +1,66 @@
+import pytest
+
+import alerts
+from alert_state import AlertStateStore
+
+SMTP = {'server': 'localhost', 'port': 25, 'use_tls': False, 'sender_email': 'stock@example.com',
+        'sender_password': ''}
+
+
+class FakeSMTP:
+    def __init__(self, sent, failing):
+        self.sent, self.failing = sent, failing
+
+    def sendmail(self, sender, to, raw):
+        if to[0] in self.failing:
+            raise OSError('relay refused')
+        self.sent.append(to[0])
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def relay(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(alerts, 'smtp_settings', lambda: SMTP)
+    sent, failing = [], set()
+    monkeypatch.setattr(alerts, 'smtp_connect', lambda: FakeSMTP(sent, failing))
+    return sent, failing
+
+
+def recipient(email, *stores):
+    return {'email': email, 'alerts': ('expiry', 'overstock', 'understock'), 'stores': stores}
+
+
+def item(product_id, store):
+    return {'product_id': product_id, 'product_name': product_id, 'store': store, 'status': 'understock',
+            'current_stock': 1, 'ideal_stock_level': 10, 'action': 'Reorder 9 units', 'priority': 'high'}
+
+
+def notified_stores():
+    return sorted(key.split('|')[1] for key in AlertStateStore().state)
+
+
+def test_only_delivered_items_are_marked_notified(relay):
+    sent, failing = relay
+    recommendations = [item('P001', 'north'), item('P002', 'south'), item('P003', 'west')]
+    recipients = [recipient('north@example.com', 'north'), recipient('south@example.com', 'south')]
+    failing.add('south@example.com')
+
+    assert alerts.send_combined_alerts(recommendations, recipients)
+    assert sent == ['north@example.com']
+    # south's send failed and no audience covers west: both stay due
+    assert notified_stores() == ['north']
+
+    failing.clear()
+    alerts.send_combined_alerts(recommendations, recipients)
+    assert sent == ['north@example.com', 'south@example.com']
+    assert notified_stores() == ['north', 'south']
+
+
+def test_nothing_is_marked_when_every_send_fails(relay):
+    sent, failing = relay
+    failing.add('all@example.com')
+    assert alerts.send_combined_alerts([item('P001', 'north')], [recipient('all@example.com')]) == []
+    assert notified_stores() == []
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from batch_analyze import EXIT_ALL_FAILED, EXIT_OK, main
+from analysis import HASHES_FILE, save_file_hash, release_file_hash, link_file_hash
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def hashes():
+    with open(HASHES_FILE) as f:
+        return json.load(f)
+
+
+def test_failed_file_is_retried_on_the_next_run(workdir):
+    (workdir / 'bad.csv').write_text('"unterminated\n')
+    (workdir / 'a.xlsx').write_bytes(b'not a workbook')
+
+    for _ in range(2):
+        assert main(['bad.csv', 'a.xlsx', '--workers', '1', '--json']) == EXIT_ALL_FAILED
+        assert hashes() == {}
+
+
+def test_analyzed_file_is_a_duplicate(workdir):
+    (workdir / 'stock.csv').write_text('product_id,product_name,current_stock,expiry_date\n'
+                                       'P001,Milk,5,2030-01-01\n')
+    assert main(['stock.csv', '--workers', '1', '--json']) == EXIT_OK
+    [entry] = hashes().values()
+    assert entry['results_file'] and 'pending' not in entry
+
+    assert main(['stock.csv', '--workers', '1', '--json']) == EXIT_OK
+    assert len(hashes()) == 1
+
+
+def test_unlinked_hash_entries_can_be_claimed_again(workdir):
+    assert save_file_hash('h', 'a.csv', 1000)
+    assert not save_file_hash('h', 'a.csv', 1001)  # another worker is still analyzing it
+    release_file_hash('h')
+    assert save_file_hash('h', 'a.csv', 1002)
+    link_file_hash('h', 'static/results/results_1-1.zip')
+    release_file_hash('h')
+    assert not save_file_hash('h', 'a.csv', 10 ** 10)
+
+    # entries written before analyses were linked to their results
+    with open(HASHES_FILE, 'w') as f:
+        json.dump({'old': {'filename': 'a.csv', 'timestamp': 1000}}, f)
+    assert save_file_hash('old', 'a.csv', 1001)
@@ -0,0 +1,152 @@
+import heapq
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from expiry_scheduler import ExpiryScheduler, next_crossing, stored_bucket, threshold_bucket
+from results_format import load_results_file
+
+
+@pytest.fixture
+def results_file(tmp_path, monkeypatch):
+    # default thresholds: no config.json in the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / 'results_1.json'
+
+
+def write(path, rows):
+    path.write_text(json.dumps({'recommendations': rows}))
+    return str(path)
+
+
+def row(product_id, store, expiry, days_left):
+    return {'product_id': product_id, 'store': store, 'expiry_date': expiry.isoformat(), 'days_left': days_left}
+
+
+def run_due(scheduler, path, today):
+    """Process every tracked entry due by `today`, as the worker thread would"""
+    due = []
+    while scheduler._heap and scheduler._heap[0][0] <= today:
+        due.append(heapq.heappop(scheduler._heap))
+    scheduler._process(path, scheduler._generation, due, today)
+
+
+def test_duplicate_product_ids_are_updated_per_row(results_file):
+    today = date.today()
+    path = write(results_file, [
+        row('P001', 'north', today, '1'),  # stale: expires today
+        row('P001', 'south', today + timedelta(days=5), '5'),
+    ])
+    alerted = []
+    scheduler = ExpiryScheduler(alerted.extend)
+    scheduler.track(path, load_results_file(path)['recommendations'])
+    run_due(scheduler, path, today)
+
+    rows = load_results_file(path)['recommendations']
+    assert [r['days_left'] for r in rows] == ['Expires Today', '5']
+    assert [r['store'] for r in alerted] == ['north']
+
+
+def test_later_crossing_of_same_product_only_touches_its_row(results_file):
+    today = date.today()
+    path = write(results_file, [
+        row('P001', 'north', today + timedelta(days=1), '1'),
+        row('P001', 'south', today + timedelta(days=8), '8'),
+    ])
+    alerted = []
+    scheduler = ExpiryScheduler(alerted.extend)
+    scheduler.track(path, load_results_file(path)['recommendations'])
+    # tomorrow north expires and south enters the 7-day window
+    run_due(scheduler, path, today + timedelta(days=1))
+
+    rows = load_results_file(path)['recommendations']
+    assert [r['days_left'] for r in rows] == ['Expires Today', '7']
+    assert sorted(r['store'] for r in alerted) == ['north', 'south']
+
+
+def test_threshold_crossings(results_file):
+    today = date.today()
+    assert [threshold_bucket(days) for days in (31, 30, 8, 7, 1, 0, -1)] == [0, 1, 1, 2, 2, 3, 4]
+    assert [stored_bucket(days_left) for days_left in ('Expired', 'Expires Today', '12', 'n/a')] == [4, 3, 1, None]
+    assert next_crossing(today + timedelta(days=40), today) == today + timedelta(days=10)
+    assert next_crossing(today + timedelta(days=10), today) == today + timedelta(days=3)
+    assert next_crossing(today, today) == today + timedelta(days=1)
+    assert next_crossing(today - timedelta(days=1), today) is None
+
+
+def test_track_schedules_next_crossing_and_skips_bad_dates(results_file):
+    today = date.today()
+    path = write(results_file, [
+        row('P001', 'north', today + timedelta(days=40), '40'),
+        row('P002', 'north', today - timedelta(days=3), 'Expired'),  # nothing left to cross
+        {'product_id': 'P003', 'expiry_date': 'soon', 'days_left': '4'},
+        row('P004', 'north', today + timedelta(days=3), '3'),
+    ])
+    scheduler = ExpiryScheduler(lambda rows: None)
+    scheduler.track(path, load_results_file(path)['recommendations'])
+    assert sorted((crossing, product_id) for crossing, _, product_id, _ in scheduler._heap) == [
+        (today + timedelta(days=3), 'P004'), (today + timedelta(days=10), 'P001')]
+
+
+def test_crossing_reschedules_until_expired(results_file):
+    today = date.today()
+    expiry = today + timedelta(days=8)
+    path = write(results_file, [row('P001', 'north', expiry, '8')])
+    alerted = []
+    scheduler = ExpiryScheduler(alerted.extend)
+    scheduler.track(path, load_results_file(path)['recommendations'])
+
+    seen = []
+    while scheduler._heap:
+        day = scheduler._heap[0][0]
+        run_due(scheduler, path, day)
+        seen.append((day - today).days)
+        seen.append(load_results_file(path)['recommendations'][0]['days_left'])
+    assert seen == [1, '7', 8, 'Expires Today', 9, 'Expired']
+    assert len(alerted) == 3
+
+
+def test_retracking_drops_pending_crossings(results_file):
+    today = date.today()
+    path = write(results_file, [row('P001', 'north', today + timedelta(days=1), '1')])
+    alerted = []
+    scheduler = ExpiryScheduler(alerted.extend)
+    scheduler.track(path, load_results_file(path)['recommendations'])
+    due = [heapq.heappop(scheduler._heap)]
+    generation = scheduler._generation
+    scheduler.track(path, [])  # a newer analysis replaced the old one
+    scheduler._process(path, generation, due, today + timedelta(days=1))
+    assert scheduler._heap == []
+    assert alerted == []
+    assert load_results_file(path)['recommendations'][0]['days_left'] == '1'
+
+
+def test_refresh_follows_the_latest_analysis(results_file, tmp_path):
+    today = date.today()
+    first = write(results_file, [row('P001', 'north', today + timedelta(days=3), '3')])
+    second = write(tmp_path / 'results_2.json', [row('P002', 'north', today + timedelta(days=40), '40'),
+                                                 row('P003', 'north', today + timedelta(days=2), '2')])
+    latest = [first]
+    scheduler = ExpiryScheduler(lambda rows: None, latest=lambda: latest[0])
+
+    scheduler.refresh()
+    generation = scheduler._generation
+    assert [entry[2] for entry in scheduler._heap] == ['P001']
+    scheduler.refresh()  # unchanged: nothing is reloaded
+    assert scheduler._generation == generation
+
+    latest[0] = second  # saved by another worker
+    scheduler.refresh()
+    assert sorted(entry[2] for entry in scheduler._heap) == ['P002', 'P003']
+
+
+def test_one_scheduler_per_host_leads(results_file):
+    first = ExpiryScheduler(lambda rows: None)
+    second = ExpiryScheduler(lambda rows: None)
+    assert first.lead()
+    assert first.lead()
+    assert not second.lead()
+
+    first._leader_lock.close()  # the leading worker exits
+    assert second.lead()
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds a worker may spend importing the app (override with INVENTORY_IMPORT_BUDGET on slow machines)
+IMPORT_BUDGET = float(os.environ.get('INVENTORY_IMPORT_BUDGET', '1.5'))
+# Modules that must only be loaded on first use
+HEAVY_MODULES = ['pandas', 'numpy', 'matplotlib', 'openpyxl', 'smtplib', 'email.mime']
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def import_module(module, cwd):
+    """Import `module` in a fresh interpreter; returns (seconds, loaded module names)"""
+    env = dict(os.environ, PYTHONPATH=REPO, INVENTORY_EXPIRY_SCHEDULER='0', INVENTORY_RETENTION='0')
+    out = subprocess.run([sys.executable, '-c', PROBE.format(module=module)], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    probe = json.loads(out.strip().splitlines()[-1])
+    return probe['seconds'], probe['modules']
+
+
+def loaded_heavy(modules):
+    return [name for name in HEAVY_MODULES if any(m == name or m.startswith(name + '.') for m in modules)]
+
+
+@pytest.mark.parametrize('module', ['app', 'batch_analyze', 'inventory_system'])
+def test_heavy_modules_load_lazily(module, tmp_path):
+    _, modules = import_module(module, tmp_path)
+    assert loaded_heavy(modules) == []
+
+
+def test_batch_analyzer_does_not_load_flask(tmp_path):
+    _, modules = import_module('batch_analyze', tmp_path)
+    assert 'flask' not in modules
+
+
+def test_app_import_within_budget(tmp_path):
+    # best of three, so one slow run on a busy machine does not fail the suite
+    seconds = min(import_module('app', tmp_path)[0] for _ in range(3))
+    assert seconds < IMPORT_BUDGET, f"importing app took {seconds:.2f}s (budget {IMPORT_BUDGET}s)"
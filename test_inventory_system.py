@@ -0,0 +1,81 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from inventory_system import CSVExpirationManager, EmailNotificationSystem, ExpiryIndex, days_until
+
+TODAY = date(2026, 3, 10)
+
+
+def on(days):
+    return (TODAY + timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def index():
+    # positions:     0        1       2       3        4     5          6        7
+    values = [on(31), on(30), on(0), on(-1), None, 'soon', on(1), pd.NaT]
+    return ExpiryIndex.from_series(pd.Series(values, dtype=object), formats=['%Y-%m-%d'])
+
+
+def test_unparseable_and_missing_dates_are_left_out(index):
+    assert len(index) == 5
+    assert sorted(index.between(today=TODAY).tolist()) == [0, 1, 2, 3, 6]
+
+
+def test_window_edges_are_inclusive(index):
+    assert index.expiring_within(30, today=TODAY).tolist() == [2, 6, 1]
+    assert index.count(31, 31, today=TODAY) == 1
+    assert index.expiring_within(0, today=TODAY).tolist() == [2]
+
+
+def test_expired_excludes_today(index):
+    assert index.expired(today=TODAY).tolist() == [3]
+    # days_ahead=0: expired plus expiring today
+    assert index.between(None, 0, today=TODAY).tolist() == [3, 2]
+
+
+def test_window_reports_days_and_dates(index):
+    positions, days, dates = index.window(-1, 1, today=TODAY)
+    assert positions.tolist() == [3, 2, 6]
+    assert days.tolist() == [-1, 0, 1]
+    assert dates.tolist() == [on(-1), on(0), on(1)]
+
+
+def test_late_timestamps_count_by_calendar_day():
+    late = datetime.combine(TODAY, datetime.max.time())
+    assert days_until(late, TODAY) == 0
+    assert days_until(pd.Timestamp(late), TODAY) == 0
+    assert days_until(late - timedelta(days=1), TODAY) == -1
+    assert days_until(datetime.combine(TODAY + timedelta(days=1), datetime.min.time()), TODAY) == 1
+    index = ExpiryIndex.from_series(pd.Series([pd.Timestamp(late), pd.Timestamp(late) - timedelta(days=1)]))
+    assert index.window(today=TODAY)[1].tolist() == [-1, 0]
+
+
+def test_report_row_counts_any_time_today_as_today():
+    late = datetime.combine(date.today(), datetime.max.time())
+    for expiry in (date.today().isoformat(), late):  # midnight and just before the next one
+        row = EmailNotificationSystem()._report_row({'product_name': 'Milk', 'expiration_date': expiry})
+        assert (row['expiry_status'], row['days_to_expire']) == ('EXPIRES TODAY', 'Today')
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    row = EmailNotificationSystem()._report_row({'product_name': 'Milk', 'expiration_date': yesterday})
+    assert row['expiry_status'] == 'EXPIRED (1 days ago)'
+
+
+def test_check_expiring_products_days_ahead(tmp_path):
+    today = date.today()
+    path = tmp_path / 'stock.csv'
+    path.write_text('product_id,product_name,current_stock,ideal_stock_level,expiry_date\n'
+                    + ''.join(f'P{days},Item,5,10,{(today + timedelta(days=days)).isoformat()}\n'
+                              for days in (-2, 0, 1, 30, 31))
+                    + 'P9,Item,5,10,\n')
+    manager = CSVExpirationManager()
+    assert manager.load_csv_file(str(path))
+
+    def expiring(days_ahead):
+        return [(p['product_id'], p['days_to_expire']) for p in manager.check_expiring_products_from_csv(days_ahead)]
+
+    assert expiring(0) == [('P-2', -2), ('P0', 0)]
+    assert expiring(30) == [('P-2', -2), ('P0', 0), ('P1', 1), ('P30', 30)]
+    assert [p['product_id'] for p in manager.get_expired_products_from_csv()] == ['P-2']
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import reorder
+from reorder import _candidates, _score, _solve_greedy, _solve_milp, plan_orders, purchasing_settings
+
+
+def product(product_id, current, ideal, unit_cost=1.0, min_order_qty=None, status='understock'):
+    return {'product_id': product_id, 'product_name': product_id, 'status': status, 'current_stock': current,
+            'ideal_stock_level': ideal, 'unit_cost': unit_cost, 'min_order_qty': min_order_qty}
+
+
+def random_products(seed, count=40):
+    rng = random.Random(seed)
+    return [product(f'P{i:03d}', rng.randint(0, 20), rng.randint(21, 120), round(rng.uniform(0.5, 25), 2),
+                    rng.choice([None, 0, 5, 12, 30]), rng.choice(reorder.ORDER_STATUSES))
+            for i in range(count)]
+
+
+def candidates(products, **overrides):
+    return _candidates(products, purchasing_settings(**overrides))
+
+
+def assert_within_limits(candidates, quantities, budget, capacity):
+    for (_, _, upper, minimum, _, _), quantity in zip(candidates, quantities):
+        assert quantity == 0 or minimum <= quantity <= upper
+    if budget is not None:
+        assert sum(q * c[4] for c, q in zip(candidates, quantities)) <= budget + 1e-6
+    if capacity is not None:
+        assert sum(quantities) <= capacity
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('budget, capacity', [(500.0, None), (None, 300), (800.0, 250)])
+def test_limits_are_never_exceeded(seed, budget, capacity):
+    products = random_products(seed)
+    found = candidates(products)
+    milp = _solve_milp(found, budget, capacity, 5.0)
+    assert milp is not None
+    assert_within_limits(found, milp, budget, capacity)
+    assert_within_limits(found, _solve_greedy(found, budget, capacity), budget, capacity)
+
+    plan = plan_orders(products, budget=budget, capacity_units=capacity)
+    assert budget is None or plan['summary']['spent'] <= budget + 0.01
+    assert capacity is None or plan['summary']['units'] <= capacity
+
+
+def test_milp_beats_greedy_on_minimum_orders():
+    # greedy takes the densest item first and then cannot afford either minimum order; the
+    # optimizer skips it and fills the capacity with the other two
+    products = [product('A', 0, 6, min_order_qty=6), product('B', 5, 10, min_order_qty=5),
+                product('C', 5, 10, min_order_qty=5)]
+    found = candidates(products)
+    greedy = _solve_greedy(found, None, 10)
+    milp = _solve_milp(found, None, 10, 5.0)
+    assert greedy == [6, 0, 0]
+    assert milp == [0, 5, 5]
+    assert _score(found, milp) > _score(found, greedy)
+    assert plan_orders(products, capacity_units=10)['summary']['solver'] == 'milp'
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_milp_is_at_least_as_good_as_greedy(seed):
+    products = random_products(seed, count=12)
+    found = candidates(products)
+    milp = _solve_milp(found, 400.0, 150, 5.0)
+    # rounding the continuous quantities down costs at most a couple of units' worth
+    slack = 2 * max(weight / upper for _, _, upper, _, _, weight in found)
+    assert _score(found, milp) >= _score(found, _solve_greedy(found, 400.0, 150)) - slack
+
+
+@pytest.mark.parametrize('failure', [lambda *args: None, lambda *args: 1 / 0])
+def test_greedy_fallback_when_the_optimizer_fails(monkeypatch, failure):
+    # None is what _solve_milp returns on a time limit without a solution, or an infeasible model
+    monkeypatch.setattr(reorder, '_solve_milp', failure)
+    products = random_products(0)
+    plan = plan_orders(products, budget=500.0)
+    assert plan['summary']['solver'] == 'greedy'
+    assert [order['order_quantity'] for order in sorted(plan['orders'], key=lambda o: o['index'])] == \
+        _solve_greedy(candidates(products), 500.0, None)
+
+
+def test_greedy_replaces_a_poor_incumbent(monkeypatch):
+    # a solver stopped by the time limit may return a feasible but weak plan
+    monkeypatch.setattr(reorder, '_solve_milp', lambda found, *args: [0] * len(found))
+    assert plan_orders(random_products(1), capacity_units=100)['summary']['solver'] == 'greedy'
+
+
+def test_unconstrained_orders_every_shortage_in_full():
+    plan = plan_orders([product('A', 2, 10), product('B', 0, 4, min_order_qty=6), product('C', 9, 5)])
+    assert plan['summary']['solver'] == 'unconstrained'
+    assert {order['product_id']: order['order_quantity'] for order in plan['orders']} == {'A': 8, 'B': 6}
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from results_format import (CHUNK_ROWS, ResultsReader, encode_results, iter_records, load_results_file,
+                            write_results_file)
+
+
+def recommendation(i):
+    return {
+        'product_id': f'P{i:05d}',
+        'product_name': f'Product {i}',
+        'status': ('Low Stock', 'OK', 'Overstock')[i % 3],
+        'days_left': ('Expired', 'Expires Today', str(i % 30))[i % 3],
+        'action': f'Reorder {i % 50} units',
+        'current_stock': i,
+        'score': i / 4,
+        'tags': ['a', 'b'] if i % 2 else None,
+    }
+
+
+def analysis(rows):
+    return {
+        'recommendations': [recommendation(i) for i in range(rows)],
+        'chart': 'Y2hhcnQ=',
+        'gallery': {'status': 'c3RhdHVz', 'trend': 'dHJlbmQ='},
+        'summary': {'total': rows},
+    }
+
+
+@pytest.fixture
+def results(tmp_path):
+    data = analysis(2 * CHUNK_ROWS + 7)
+    path = tmp_path / 'results_1-1.zip'
+    path.write_bytes(encode_results(data))
+    return str(path), data
+
+
+def test_columnar_round_trip(results):
+    path, data = results
+    assert load_results_file(path) == data
+
+
+def test_columnar_reads_columns_and_row_ranges(results):
+    path, data = results
+    start, stop = CHUNK_ROWS - 3, CHUNK_ROWS + 3  # spans a chunk boundary
+    loaded = load_results_file(path, columns=['product_id', 'action', 'missing'], start=start, stop=stop)
+    assert loaded['recommendations'] == [{'product_id': r['product_id'], 'action': r['action']}
+                                         for r in data['recommendations'][start:stop]]
+    assert loaded['summary'] == data['summary']
+    with ResultsReader(path) as reader:
+        assert reader.column('status', start=reader.rows - 1, stop=reader.rows + 10) == ['Overstock']
+        assert reader.column('status', start=5, stop=5) == []
+
+
+def test_iter_records_streams_every_row(results):
+    path, data = results
+    assert list(iter_records(path, ['product_id'])) == [{'product_id': r['product_id']}
+                                                         for r in data['recommendations']]
+
+
+def test_legacy_json_fallback(tmp_path):
+    data = analysis(25)
+    path = tmp_path / 'results_1.json'
+    path.write_text(json.dumps(data, indent=2))
+    path = str(path)
+
+    assert load_results_file(path) == data
+    assert load_results_file(path, columns=['status'], start=3, stop=5)['recommendations'] == [
+        {'status': r['status']} for r in data['recommendations'][3:5]]
+    assert list(iter_records(path)) == data['recommendations']
+
+
+def test_write_results_file_keeps_format(tmp_path):
+    data = analysis(10)
+    json_path, zip_path = str(tmp_path / 'results_1.json'), str(tmp_path / 'results_1-1.zip')
+    write_results_file(json_path, data)
+    write_results_file(zip_path, data)
+
+    assert json.loads((tmp_path / 'results_1.json').read_text()) == data
+    with ResultsReader(zip_path) as reader:
+        assert reader.rows == 10
+    assert load_results_file(zip_path) == data
+
+
+def test_empty_analysis_round_trip(tmp_path):
+    path = tmp_path / 'results_1-1.zip'
+    path.write_bytes(encode_results({'recommendations': []}))
+    assert load_results_file(str(path)) == {'recommendations': [], 'chart': None, 'gallery': {}}
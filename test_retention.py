@@ -0,0 +1,47 @@
+import json
+import os
+import threading
+import time
+
+from retention import LOCK_GRACE_SECONDS, remove_analyses, remove_stale_locks
+from storage import locked, try_lock
+
+
+def analysis(folder, name='results_1-1.zip'):
+    path = folder / name
+    path.write_bytes(b'results')
+    (folder / f'{name}.profile.json').write_text('{}')
+    return str(path)
+
+
+def test_remove_waits_for_the_analysis_lock_and_keeps_it(tmp_path):
+    path = analysis(tmp_path)
+    hashes = tmp_path / 'file_hashes.json'
+    hashes.write_text(json.dumps({'h': {'filename': 'a.csv', 'results_file': 'results_1-1.zip'}}))
+    removed = []
+    with locked(path):
+        worker = threading.Thread(target=lambda: removed.append(remove_analyses([path], str(hashes))))
+        worker.start()
+        time.sleep(0.2)
+        assert os.path.exists(path)  # an export or the scheduler still holds it
+    worker.join()
+
+    assert removed == [1]
+    assert sorted(os.listdir(tmp_path)) == ['file_hashes.json', 'file_hashes.json.lock', 'results_1-1.zip.lock']
+    assert json.loads(hashes.read_text()) == {}
+
+
+def test_stale_locks_are_removed_after_the_grace_period(tmp_path):
+    now = time.time()
+    live = analysis(tmp_path, 'results_1-1.zip')
+    for name in ('results_1-1.zip.lock', 'results_2-1.zip.lock', 'results_3-1.zip.lock', 'results_4-1.zip.lock'):
+        (tmp_path / name).touch()
+        os.utime(tmp_path / name, (now - LOCK_GRACE_SECONDS - 1,) * 2)
+    os.utime(tmp_path / 'results_3-1.zip.lock')  # its analysis was only just removed
+    held = try_lock(str(tmp_path / 'results_4-1.zip.lock'))
+
+    assert remove_stale_locks(str(tmp_path), now) == 1
+    held.close()
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.lock')) == [
+        'results_1-1.zip.lock', 'results_3-1.zip.lock', 'results_4-1.zip.lock']
+    assert os.path.exists(live)
@@ -0,0 +1,48 @@
+import importlib
+
+import pytest
+
+from results_format import encode_results
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('INVENTORY_EXPIRY_SCHEDULER', '0')
+    monkeypatch.setenv('INVENTORY_RETENTION', '0')
+    monkeypatch.chdir(tmp_path)
+    results = tmp_path / 'static' / 'results'
+    results.mkdir(parents=True)
+    (results / 'results_1-1.zip').write_bytes(encode_results({'recommendations': [
+        {'product_id': 'P001', 'current_stock': 2, 'ideal_stock_level': 10, 'days_left': '3'},
+        {'product_id': 'P002', 'current_stock': 30, 'ideal_stock_level': 10, 'days_left': 'Expired'},
+    ]}))
+    web = importlib.import_module('app')
+    return web.app.test_client()
+
+
+def simulate(client, body):
+    return client.post('/api/analyses/1-1/simulate', json=body)
+
+
+@pytest.mark.parametrize('body', [
+    [{'understock': 0.3}],
+    'understock',
+    42,
+    {'settings': {'understock': 0.3}},
+    {'settings': ['understock']},
+    {'settings': [None]},
+    {'grid': ['understock']},
+    {'grid': {'nonsense': [1]}},
+    {'settings': [{'understock': 'low'}]},
+])
+def test_malformed_bodies_are_rejected(client, body):
+    response = simulate(client, body)
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def test_simulates_a_grid(client):
+    response = simulate(client, {'grid': {'critical_understock': [0.1, 0.2]}})
+    assert response.status_code == 200
+    assert len(response.get_json()['results']) == 2
+    assert simulate(client, None).status_code == 200
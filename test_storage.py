@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import threading
+
+from storage import analysis_id_from_filename, read_json, save_analysis, update_json
+
+WORKERS = 8
+INCREMENTS = 25
+
+
+def increment(path, times=INCREMENTS):
+    def bump(data):
+        data['count'] += 1
+    for _ in range(times):
+        update_json(path, bump, default={'count': 0})
+
+
+def save_many(folder, times=INCREMENTS):
+    for i in range(times):
+        save_analysis(folder, f'payload {os.getpid()} {i}'.encode())
+
+
+def run_threads(target, *args):
+    threads = [threading.Thread(target=target, args=args) for _ in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_processes(target, *args):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=target, args=args) for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+
+def test_update_json_loses_no_updates_across_threads(tmp_path):
+    path = str(tmp_path / 'counter.json')
+    run_threads(increment, path)
+    assert read_json(path) == {'count': WORKERS * INCREMENTS}
+
+
+def test_update_json_loses_no_updates_across_processes(tmp_path):
+    path = str(tmp_path / 'counter.json')
+    run_processes(increment, path)
+    assert read_json(path) == {'count': WORKERS * INCREMENTS}
+
+
+def test_save_analysis_never_reuses_an_id(tmp_path):
+    folder = str(tmp_path)
+    run_threads(save_many, folder)
+    run_processes(save_many, folder)
+
+    names = os.listdir(folder)
+    assert len(names) == 2 * WORKERS * INCREMENTS
+    assert not [name for name in names if name.endswith('.tmp')]
+    ids = {analysis_id_from_filename(name) for name in names}
+    assert len(ids) == len(names)
+
+
+def test_save_analysis_returns_the_published_file(tmp_path):
+    analysis_id, path = save_analysis(str(tmp_path), b'{"recommendations": []}')
+    assert os.path.dirname(path) == str(tmp_path)
+    assert analysis_id_from_filename(os.path.basename(path)) == analysis_id
+    with open(path, 'rb') as f:
+        assert f.read() == b'{"recommendations": []}'
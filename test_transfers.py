@@ -0,0 +1,92 @@
+import random
+from collections import Counter
+
+import pytest
+
+import transfers
+from transfers import _pairs, _sides, match_transfers, transfer_settings
+
+STORES = ['north', 'south', 'east', 'west', 'central']
+
+
+def row(product_id, store, current, ideal, days_left=''):
+    ratio = current / ideal
+    status = 'overstock' if ratio > 1.5 else 'understock' if ratio < 0.8 else 'optimal'
+    return {'product_id': product_id, 'product_name': product_id, 'store': store, 'status': status,
+            'current_stock': current, 'ideal_stock_level': ideal, 'days_left': days_left}
+
+
+def random_recommendations(seed, products=30):
+    rng = random.Random(seed)
+    rows = []
+    for p in range(products):
+        for store in rng.sample(STORES, rng.randint(2, len(STORES))):
+            ideal = rng.randint(10, 60)
+            current = rng.choice([rng.randint(0, ideal // 2), rng.randint(2 * ideal, 4 * ideal)])
+            rows.append(row(f'P{p:03d}', store, current, ideal, rng.choice(['', 'Expired', '2', '12', '90'])))
+    return rows
+
+
+def random_costs(seed):
+    rng = random.Random(seed)
+    return {a: {b: round(rng.uniform(0.5, 9), 2) for b in STORES if b > a} for a in STORES}
+
+
+def units_by_row(recommendations, statuses):
+    return Counter({(r['product_id'], r['store']): abs(r['current_stock'] - r['ideal_stock_level'])
+                    for r in recommendations if r['status'] in statuses})
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_transfers_stay_within_surplus_and_deficit(seed):
+    recommendations = random_recommendations(seed)
+    plan = match_transfers(recommendations, costs=random_costs(seed))
+    surplus = units_by_row(recommendations, transfers.SURPLUS_STATUSES)
+    deficit = units_by_row(recommendations, transfers.DEFICIT_STATUSES)
+    sent, received = Counter(), Counter()
+    for t in plan['transfers']:
+        sent[(t['product_id'], t['from_store'])] += t['quantity']
+        received[(t['product_id'], t['to_store'])] += t['quantity']
+    assert plan['transfers']
+    assert all(quantity <= surplus[key] for key, quantity in sent.items())
+    assert all(quantity <= deficit[key] for key, quantity in received.items())
+    assert plan['summary']['units'] <= min(plan['summary']['surplus_units'], plan['summary']['deficit_units'])
+
+
+def test_products_are_never_matched_across_ids():
+    recommendations = [row('P001', 'north', 50, 10), row('P002', 'south', 0, 10), row('P003', 'east', 40, 10),
+                       row('P001', 'west', 2, 10), row('P002', 'east', 45, 10)]
+    for product_id, source, destination, _, _ in _pairs(_sides(recommendations), transfer_settings(), 30.0):
+        assert recommendations[source[0]]['product_id'] == recommendations[destination[0]]['product_id'] \
+            == product_id
+    moves = {(t['product_id'], t['from_store'], t['to_store']) for t in match_transfers(recommendations)['transfers']}
+    assert moves == {('P001', 'north', 'west'), ('P002', 'east', 'south')}
+
+
+def test_expired_surplus_stays_put():
+    recommendations = [row('P001', 'north', 50, 10, 'Expired'), row('P001', 'south', 0, 10)]
+    assert match_transfers(recommendations)['transfers'] == []
+
+
+def test_short_dated_lots_move_first():
+    # the fresh lot is five times cheaper to move, but the lot expiring in 3 days goes
+    recommendations = [row('P001', 'north', 40, 10, '3'), row('P001', 'south', 40, 10, '90'),
+                       row('P001', 'east', 0, 10)]
+    plan = match_transfers(recommendations, costs={'north': {'east': 5.0}, 'south': {'east': 1.0}})
+    assert [(t['from_store'], t['quantity']) for t in plan['transfers']] == [('north', 10)]
+
+    # with equal costs, the sooner of two expiring lots goes first
+    recommendations[1]['days_left'] = '20'
+    plan = match_transfers(recommendations)
+    assert [(t['from_store'], t['quantity']) for t in plan['transfers']] == [('north', 10)]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_chunking_matches_a_single_solve(monkeypatch, seed):
+    recommendations = random_recommendations(seed)
+    costs = random_costs(seed)
+    whole = match_transfers(recommendations, costs=costs)['summary']
+    monkeypatch.setattr(transfers, 'CHUNK_PAIRS', 3)
+    chunked = match_transfers(recommendations, costs=costs)['summary']
+    for key in ('units', 'cost', 'expiring_units'):
+        assert chunked[key] == pytest.approx(whole[key])
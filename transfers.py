@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from analysis import days_left_number
+from config import get_config
+from logs import get_logger
+from results_format import load_results_file
+from storage import find_analysis_file, list_analysis_files
+
+logger = get_logger('inventorypro.transfers')
+
+SURPLUS_STATUSES = ('critical_overstock', 'overstock')
+DEFICIT_STATUSES = ('critical_understock', 'understock')
+TRANSFER_COLUMNS = ['product_id', 'product_name', 'status', 'current_stock', 'ideal_stock_level', 'days_left',
+                    'store']
+# Source/destination pairs solved together in one linear program
+CHUNK_PAIRS = 20000
+
+
+def transfer_settings(**overrides):
+    settings = dict(get_config()['transfers'])
+    settings.update({key: value for key, value in overrides.items() if key in settings})
+    return settings
+
+
+def pair_cost(costs, default_cost, source, destination):
+    """Cost of moving one unit between two stores, or None when the pair is not allowed"""
+    if source == destination:
+        return None
+    cost = costs.get(source, {}).get(destination)
+    if cost is None:
+        cost = costs.get(destination, {}).get(source)
+    return default_cost if cost is None else cost
+
+
+def _sides(recommendations):
+    """{product_id: ([surplus rows], [deficit rows])}; each row is (index, store, units, days left)"""
+    products = {}
+    for index, item in enumerate(recommendations):
+        status, store = item.get('status'), item.get('store')
+        if store in (None, '') or status not in SURPLUS_STATUSES + DEFICIT_STATUSES:
+            continue
+        units = int(abs(float(item.get('current_stock') or 0) - float(item.get('ideal_stock_level') or 0)))
+        if units <= 0:
+            continue
+        surplus, deficit = products.setdefault(str(item.get('product_id')), ([], []))
+        if status in DEFICIT_STATUSES:
+            deficit.append((index, str(store), units, None))
+            continue
+        days = days_left_number(item.get('days_left'))
+        # expired stock is written off, not moved
+        if days is None or days >= 0:
+            surplus.append((index, str(store), units, days))
+    return {product_id: sides for product_id, sides in products.items() if sides[0] and sides[1]}
+
+
+def _pairs(products, settings, horizon):
+    """Allowed (product, source row, destination row, unit cost, effective cost) pairs.
+
+    The effective cost is what the solver minimises: the transfer cost, lowered for surplus
+    that expires within `horizon` days by between one and two times expiry_weight x (the
+    product's dearest pair + 1), the sooner the more. With the default weight, expiring
+    lots are always moved before fresh ones, and the soonest first where costs allow."""
+    costs, default_cost = settings['costs'], settings['default_cost']
+    weight = float(settings['expiry_weight'])
+    pairs = []
+    for product_id, (surplus, deficit) in products.items():
+        allowed = []
+        for source in surplus:
+            for destination in deficit:
+                cost = pair_cost(costs, default_cost, source[1], destination[1])
+                if cost is not None and (settings['max_cost'] is None or cost <= settings['max_cost']):
+                    allowed.append((source, destination, float(cost)))
+        if not allowed:
+            continue
+        bonus = weight * (max(cost for _, _, cost in allowed) + 1)
+        for source, destination, cost in allowed:
+            days = source[3]
+            urgency = 2 - days / horizon if days is not None and days <= horizon and horizon > 0 else 0.0
+            pairs.append((product_id, source, destination, cost, cost - bonus * urgency))
+    return pairs
+
+
+def _solve_chunk(pairs):
+    """Units per pair for one chunk: as many units moved as possible, then the lowest effective cost.
+
+    Every source and destination is a row of a transport problem; products share no rows, so
+    one sparse LP covers the whole chunk. Transport LPs with whole-unit supplies have whole-unit
+    optimal vertices, so the result only needs rounding off float noise."""
+    import numpy as np
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+
+    rows = {}
+    limits = []
+
+    def row(node):
+        if node not in rows:
+            rows[node] = len(limits)
+            limits.append(node[1][2])
+        return rows[node]
+
+    n = len(pairs)
+    source_rows = np.fromiter((row(('s', pair[1])) for pair in pairs), dtype=np.int64, count=n)
+    destination_rows = np.fromiter((row(('d', pair[2])) for pair in pairs), dtype=np.int64, count=n)
+    effective = np.array([pair[4] for pair in pairs])
+    # each unit moved is worth more than any rerouting of the other units can save, so the
+    # solver first maximises units moved and only then minimises the cost
+    largest, nodes = {}, {}
+    for pair, value in zip(pairs, np.abs(effective)):
+        largest[pair[0]] = max(largest.get(pair[0], 0.0), value)
+        nodes.setdefault(pair[0], set()).update((('s', pair[1][0]), ('d', pair[2][0])))
+    reward = np.array([(len(nodes[pair[0]]) + 1) * largest[pair[0]] + 1 for pair in pairs])
+
+    matrix = coo_matrix((np.ones(2 * n), (np.concatenate([source_rows, destination_rows]),
+                                          np.tile(np.arange(n), 2))), shape=(len(limits), n)).tocsr()
+    upper = np.minimum([pair[1][2] for pair in pairs], [pair[2][2] for pair in pairs])
+    result = linprog(effective - reward, A_ub=matrix, b_ub=np.array(limits, dtype=float),
+                     bounds=np.column_stack([np.zeros(n), upper]), method='highs')
+    if result.x is None:
+        raise RuntimeError(result.message)
+    return np.round(result.x).astype(int).tolist()
+
+
+def match_transfers(recommendations, **overrides):
+    """Transfers that move surplus stock to stores short of the same product.
+
+    Overstocked rows (surplus above their ideal level) are paired with understocked rows of
+    the same product_id at another store, moving as many units as possible at the lowest
+    cost from the `transfers` cost matrix; surplus close to expiry goes first and expired
+    stock stays put. Rows need a `store`."""
+    settings = transfer_settings(**overrides)
+    started = time.perf_counter()
+    products = _sides(recommendations)
+    horizon = float(get_config()['thresholds']['expiry_alert_days'])
+    pairs = _pairs(products, settings, horizon)
+
+    # chunks end on product boundaries, so each chunk is a complete set of transport problems
+    quantities = []
+    chunk = []
+    for position, pair in enumerate(pairs):
+        chunk.append(pair)
+        last_of_product = position + 1 == len(pairs) or pairs[position + 1][0] != pair[0]
+        if last_of_product and len(chunk) >= CHUNK_PAIRS or position + 1 == len(pairs):
+            quantities.extend(_solve_chunk(chunk))
+            chunk = []
+
+    transfers = []
+    for (product_id, source, destination, cost, _), quantity in zip(pairs, quantities):
+        if quantity <= 0:
+            continue
+        item = recommendations[source[0]]
+        transfers.append({
+            'product_id': product_id,
+            'product_name': item.get('product_name'),
+            'from_store': source[1],
+            'to_store': destination[1],
+            'quantity': quantity,
+            'unit_cost': cost,
+            'cost': round(quantity * cost, 2),
+            'days_left': item.get('days_left') or '',
+            'from_status': item.get('status'),
+            'to_status': recommendations[destination[0]].get('status'),
+        })
+    # expiring stock first, then the biggest moves
+    transfers.sort(key=lambda t: (days_left_number(t['days_left']) is None, days_left_number(t['days_left']) or 0,
+                                  -t['quantity']))
+
+    surplus_units = sum(units for surplus, _ in products.values() for _, _, units, _ in surplus)
+    deficit_units = sum(units for _, deficit in products.values() for _, _, units, _ in deficit)
+    moved = sum(t['quantity'] for t in transfers)
+    summary = {
+        'transfers': len(transfers),
+        'units': moved,
+        'cost': round(sum(t['cost'] for t in transfers), 2),
+        'products': len({t['product_id'] for t in transfers}),
+        'surplus_units': surplus_units,
+        'deficit_units': deficit_units,
+        'expiring_units': sum(t['quantity'] for t in transfers if days_left_number(t['days_left']) is not None
+                              and days_left_number(t['days_left']) <= horizon),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    logger.info("🚚 %d transfers move %d of %d surplus units across %d products in %.2fs",
+                summary['transfers'], moved, surplus_units, summary['products'], summary['seconds'])
+    return {'summary': summary, 'transfers': transfers}
+
+
+def load_locations(results_file):
+    """Recommendations of a saved analysis; rows without a store are placed at the
+    uploaded file's name, so one analysis per store can be matched together"""
+    data = load_results_file(results_file, columns=TRANSFER_COLUMNS + ['filename'])
+    location = os.path.splitext(data.get('filename') or os.path.basename(results_file))[0]
+    for item in data['recommendations']:
+        if item.get('store') in (None, ''):
+            item['store'] = location
+    return data['recommendations']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Match surplus stock with shortages at other stores.')
+    parser.add_argument('analyses', nargs='*', default=['latest'],
+                        help="analysis ids (default: latest); several are matched together, one store each")
+    parser.add_argument('--results-folder', default=os.path.join('static', 'results'))
+    parser.add_argument('--max-cost', type=float, help='skip store pairs dearer than this per unit')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    recommendations = []
+    for analysis in args.analyses:
+        if analysis == 'latest':
+            files = list_analysis_files(args.results_folder) if os.path.isdir(args.results_folder) else []
+            results_file = os.path.join(args.results_folder, files[0]) if files else None
+        else:
+            results_file = find_analysis_file(args.results_folder, analysis)
+        if not results_file:
+            print(f"Analysis not found: {analysis}", file=sys.stderr)
+            return 2
+        recommendations.extend(load_locations(results_file))
+
+    overrides = {} if args.max_cost is None else {'max_cost': args.max_cost}
+    plan = match_transfers(recommendations, **overrides)
+    if args.json:
+        print(json.dumps(plan, indent=2))
+        return 0
+    print('\t'.join(['product_id', 'from', 'to', 'quantity', 'cost', 'days_left']))
+    for t in plan['transfers']:
+        print('\t'.join(str(t[key]) for key in ('product_id', 'from_store', 'to_store', 'quantity', 'cost',
+                                                 'days_left')))
+    summary = plan['summary']
+    print(f"{summary['units']} of {summary['surplus_units']} surplus units moved "
+          f"({summary['transfers']} transfers, cost {summary['cost']})", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())